@@ -1,13 +1,21 @@
 # app.py
+# Seuls les modules légers sont importés ici : pandas, plotly, pyarrow et le
+# modèle sont importés par les pages qui s'en servent, pour qu'un démarrage à
+# froid sur la page Présentation ne paie pas leur chargement.
+from __future__ import annotations
+
 import streamlit as st
-import pandas as pd
-import numpy as np
-import altair as alt
-import joblib
 from pathlib import Path
-import os
-import plotly.express as px
-import random
+import time
+
+from dpe import instrumentation, profiling
+
+profiling.install()
+
+from dpe.assets import image
+from dpe.classes import CLASSES, COULEURS, classe_dpe
+from dpe.etiquette import render_label_svg
+from dpe.schema import VOCABULAIRE
 
 # ----------------------------
 # CONFIG
@@ -22,15 +30,73 @@ st.set_page_config(
 # ----------------------------
 # UTILS: chargements en cache
 # ----------------------------
+# Diagnostics (DPE_DIAGNOSTICS=1) : le chronomètre au-dessus du cache compte les
+# appels, celui du dessous les calculs effectifs ; inactifs, ils n'existent pas.
+@instrumentation.chronometre("load_viz_data")
 @st.cache_data(show_spinner=False)
-def load_viz_data(path: Path) -> pd.DataFrame:
-    df = pd.read_csv(path)
+@instrumentation.chronometre("load_viz_data.calcul")
+def load_viz_data(path: Path, columns: tuple = None):
+    # Un CSV ADEME est ingéré une fois par blocs vers un cache Parquet,
+    # puis on ne relit que les colonnes demandées.
+    from dpe.ingest import read_dataset
+
+    df = read_dataset(path, columns=columns)
     return df
 
+@instrumentation.chronometre("load_dataviz_cube")
 @st.cache_resource(show_spinner=False)
-def load_model(path: Path):
-    # idéalement: un Pipeline sklearn qui inclut preprocessing + modèle
-    return joblib.load(path)
+@instrumentation.chronometre("load_dataviz_cube.calcul")
+def load_dataviz_cube(path: Path):
+    # Cube d'agrégats et ses histogrammes : la page Dataviz ne touche jamais la base brute.
+    # Partagés sans copie (cache_resource) : la page ne fait que les lire à travers des masques
+    from dpe.cube import histogrammes_path, load_cube, load_histogrammes
+
+    return load_cube(path), load_histogrammes(histogrammes_path(path))
+
+@instrumentation.chronometre("load_model")
+@st.cache_resource(show_spinner=False, max_entries=2)
+@instrumentation.chronometre("load_model.calcul")
+def load_model(path: Path, empreinte: str = None):
+    # Pipeline sklearn + vocabulaire d'entraînement : l'encodeur et la forêt
+    # compilée sont construits une seule fois par processus, et de nouveau
+    # quand l'artefact est réécrit (l'empreinte fait partie de la clé)
+    from dpe.model import ModeleDPE
+
+    return ModeleDPE.load(path)
+
+def _ferme_file(file):
+    # File évincée du cache (artefact réécrit, ou cache vidé) : son collecteur, ses
+    # workers et le modèle qu'elle référence sont libérés au lieu de vivre jusqu'à la
+    # fin du processus. Une session qui la tenait encore reçoit FileFermee.
+    file.fermer()
+
+@instrumentation.chronometre("load_file_inference")
+@st.cache_resource(show_spinner=False, max_entries=1, on_release=_ferme_file)
+@instrumentation.chronometre("load_file_inference.calcul")
+def load_file_inference(path: Path, empreinte: str = None):
+    # Une file par processus, pour le seul artefact courant : les prédictions des
+    # sessions simultanées partent en un seul lot
+    from dpe.batching import FileInference
+
+    return FileInference(load_model(path, empreinte).predict)
+
+@instrumentation.chronometre("load_quantiles")
+@st.cache_resource(show_spinner=False, max_entries=2)
+@instrumentation.chronometre("load_quantiles.calcul")
+def load_quantiles(path: Path, empreinte: str = None):
+    # Esquisses de quantiles par segment (quelques centaines de Ko, mappées en mémoire)
+    from dpe.quantiles import Esquisses
+
+    return Esquisses.open(path)
+
+@instrumentation.chronometre("load_comparables")
+@st.cache_resource(show_spinner=False, max_entries=2)
+@instrumentation.chronometre("load_comparables.calcul")
+def load_comparables(path: Path, empreinte: str = None):
+    # Index des DPE réels mappé en mémoire : la base brute n'est jamais relue
+    from dpe.comparables import IndexComparables
+
+    return IndexComparables.open(path)
 
 # ----------------------------
 # UI: Sidebar navigation
@@ -43,7 +109,7 @@ page = st.sidebar.radio(
         "📊 Dataviz",
         "📈 Résultats d'entraînement",
         "🧮 Simulateur DPE",
-    ],
+    ] + (["🩺 Diagnostics"] if instrumentation.ACTIF else []),
 )
 
 st.sidebar.markdown("---")
@@ -176,13 +242,172 @@ def page_presentation():
 # ----------------------------
 
 
-def display_img(filename, caption=""):
-    """Fonction utilitaire pour gérer l'affichage sécurisé des images"""
-    path = f"img/{filename}"
-    if os.path.exists(path):
-        st.image(path, caption=caption, use_container_width=True)
+def display_img(filename, caption="", largeur="pleine"):
+    """Affiche une image de `img/` dans la variante adaptée à sa colonne ("pleine" ou "demi").
+
+    Les octets viennent du cache partagé de dpe.assets : pas d'accès disque après le premier affichage.
+    """
+    with instrumentation.chrono("image"):
+        donnees = image(filename, largeur)
+        if donnees is not None:
+            st.image(donnees, caption=caption, use_container_width=True)
+        else:
+            instrumentation.compte("images manquantes")
+            st.warning(f"⚠️ Image manquante : img/{filename}")
+
+def fig_etiquettes(valeurs, titre):
+    """Barres A à G aux couleurs officielles ; `valeurs` est indexé par lettre."""
+    import plotly.graph_objects as go
+
+    valeurs = valeurs.reindex(list(CLASSES), fill_value=0)
+    fig = go.Figure(go.Bar(x=valeurs.index, y=valeurs.to_numpy(), marker_color=[COULEURS[l] for l in valeurs.index]))
+    return fig.update_layout(title=titre, showlegend=False)
+
+def fig_repartition(cube, dim, titre, ges=False, masque=None):
+    """Barres empilées à 100 % : répartition des étiquettes DPE (ou GES) pour chaque modalité de `dim`."""
+    import plotly.graph_objects as go
+    from dpe.cube import COLONNES_GES, crosstab, rollup
+
+    if ges:
+        effectifs = rollup(cube, dim, COLONNES_GES, masque).set_index(dim)
+        effectifs.columns = list(CLASSES)
     else:
-        st.warning(f"⚠️ Image manquante : {path}")
+        effectifs = crosstab(cube, dim, masque)
+    parts = 100 * effectifs.div(effectifs.sum(axis=1), axis=0)
+    fig = go.Figure([
+        go.Bar(name=lettre, x=parts.index.astype(str), y=parts[lettre], marker_color=COULEURS[lettre])
+        for lettre in CLASSES if lettre in parts.columns
+    ])
+    return fig.update_layout(title=titre, barmode="stack", yaxis_title="Part (%)")
+
+def fig_part_departements(par_dept, lettres, titre, top=20):
+    """Part des étiquettes `lettres` par département (les `top` départements les plus concernés)."""
+    import plotly.graph_objects as go
+
+    part = (100 * par_dept[lettres].sum(axis=1) / par_dept.sum(axis=1)).sort_values(ascending=False).head(top)
+    fig = go.Figure(go.Bar(x=part.index.astype(str), y=part.to_numpy()))
+    return fig.update_layout(title=titre, yaxis_title="Part (%)", xaxis_type="category")
+
+def fig_histogramme(effectifs, bornes, titre, axe):
+    """
+    Histogramme tiré des tranches du cube : `effectifs` est une Series indexée par
+    borne, ou un DataFrame étiquettes x bornes (barres empilées aux couleurs officielles).
+    La dernière tranche, ouverte, n'est pas tracée.
+    """
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    pas = bornes[1] - bornes[0]
+    x = [b + pas / 2 for b in bornes[:-1]]
+    if isinstance(effectifs, pd.Series):
+        barres = [go.Bar(x=x, y=effectifs.to_numpy()[:-1], width=pas)]
+    else:
+        barres = [go.Bar(name=lettre, x=x, y=effectifs.loc[lettre].to_numpy()[:-1], width=pas, marker_color=COULEURS[lettre])
+                  for lettre in CLASSES if lettre in effectifs.index]
+    fig = go.Figure(barres)
+    return fig.update_layout(title=titre, barmode="stack", bargap=0, xaxis_title=axe, yaxis_title="Nombre de DPE")
+
+def fig_boites(effectifs, bornes, titre, axe):
+    """Boîtes à moustaches par étiquette, à partir des quantiles approchés des tranches (moustaches à 1,5 écart interquartile)."""
+    import numpy as np
+    import plotly.graph_objects as go
+    from dpe.cube import quantiles
+
+    fig = go.Figure()
+    pas = bornes[-1] - bornes[-2]
+    for lettre in CLASSES:
+        if lettre not in effectifs.index or effectifs.loc[lettre].sum() == 0:
+            continue
+        tranches = effectifs.loc[lettre].to_numpy()
+        q1, mediane, q3 = quantiles(tranches, bornes)
+        remplies = np.flatnonzero(tranches)
+        bas, haut = bornes[remplies[0]], bornes[remplies[-1]] + pas
+        fig.add_trace(go.Box(
+            name=lettre, x=[lettre], q1=[q1], median=[mediane], q3=[q3],
+            lowerfence=[max(bas, q1 - 1.5 * (q3 - q1))], upperfence=[min(haut, q3 + 1.5 * (q3 - q1))],
+            marker_color=COULEURS[lettre],
+        ))
+    return fig.update_layout(title=titre, showlegend=False, yaxis_title=axe)
+
+def dataviz_cube(cube, histogrammes):
+    """
+    Version interactive de la page Dataviz, calculée à la volée sur le cube d'agrégats.
+    Seule la vue choisie est calculée à chaque interaction (contrairement à st.tabs qui rend tout).
+    Les filtres sont des masques sur le cube et les histogrammes, jamais des copies.
+    """
+    import plotly.graph_objects as go
+    from dpe.cube import BORNES_CONSO, BORNES_SURFACE, COLONNES_GES, crosstab, histogramme, masque_filtres, rollup
+
+    with st.expander("🎛️ Filtres", expanded=True):
+        f1, f2, f3 = st.columns(3)
+        filtres = {
+            "departement": f1.multiselect("Département", sorted(cube["departement"].cat.categories)),
+            "zone_clim": f1.multiselect("Zone Climatique", list(cube["zone_clim"].cat.categories)),
+            "periode": f2.multiselect("Période de construction", list(cube["periode"].cat.categories)),
+            "type_bat": f2.multiselect("Type de bâtiment", list(cube["type_bat"].cat.categories)),
+            "energie_chauff": f3.multiselect("Énergie chauffage principale", list(cube["energie_chauff"].cat.categories)),
+            "altitude": f3.multiselect("Classe d'altitude", list(cube["altitude"].cat.categories)),
+        }
+    vue_choisie = st.radio("Vue", [
+        "🌍 Panorama National",
+        "🗺️ Géographie & Climat",
+        "🏗️ Caractéristiques Bâti",
+        "⏳ Temps & Surface"
+    ], horizontal=True, label_visibility="collapsed")
+
+    t0 = time.perf_counter()
+    vue = masque_filtres(cube, filtres)
+    vue_histogrammes = masque_filtres(histogrammes, filtres)
+    n_dpe = int(cube["n"].to_numpy()[vue].sum())
+    if n_dpe == 0:
+        st.warning("Aucun DPE ne correspond à ces filtres.")
+        return
+
+    if vue_choisie == "🌍 Panorama National":
+        col1, col2 = st.columns(2)
+        dpe = rollup(cube, "etiquette_dpe", ["n"] + list(COLONNES_GES), vue).set_index("etiquette_dpe")
+        col1.plotly_chart(fig_etiquettes(dpe["n"], "Répartition des DPE"), use_container_width=True)
+        ges = dpe[list(COLONNES_GES)].sum().set_axis(list(CLASSES))
+        col2.plotly_chart(fig_etiquettes(ges, "Répartition des GES"), use_container_width=True)
+        conso = histogramme(histogrammes, "conso", by="etiquette_dpe", masque=vue_histogrammes)
+        st.plotly_chart(fig_histogramme(conso, BORNES_CONSO, "Répartition des DPE selon la consommation (5 usages)",
+                                        "Consommation (kWh/m²/an), tranches de 10"), use_container_width=True)
+
+    elif vue_choisie == "🗺️ Géographie & Climat":
+        c1, c2 = st.columns(2)
+        par_dept = crosstab(cube, "departement", vue)
+        c1.plotly_chart(fig_part_departements(par_dept, ["F", "G"], "Part des passoires (F & G)"), use_container_width=True)
+        c2.plotly_chart(fig_part_departements(par_dept, ["A", "B"], "Part des bâtiments performants (A & B)"), use_container_width=True)
+        c3, c4 = st.columns(2)
+        c3.plotly_chart(fig_repartition(cube, "region", "DPE par Région administrative", masque=vue), use_container_width=True)
+        c4.plotly_chart(fig_repartition(cube, "zone_clim", "DPE par Zone Climatique", masque=vue), use_container_width=True)
+        st.plotly_chart(fig_repartition(cube, "altitude", "DPE selon l'altitude", masque=vue), use_container_width=True)
+
+    elif vue_choisie == "🏗️ Caractéristiques Bâti":
+        c1, c2 = st.columns(2)
+        c1.plotly_chart(fig_repartition(cube, "type_bat", "DPE selon le type de logement", masque=vue), use_container_width=True)
+        c2.plotly_chart(fig_repartition(cube, "type_bat", "GES selon le type de logement", ges=True, masque=vue),
+                        use_container_width=True)
+        st.plotly_chart(fig_repartition(cube, "energie_chauff", "DPE par énergie de chauffage", masque=vue), use_container_width=True)
+        st.plotly_chart(fig_repartition(cube, "inertie", "DPE selon l'inertie", masque=vue), use_container_width=True)
+
+    else:
+        c1, c2 = st.columns(2)
+        c1.plotly_chart(fig_repartition(cube, "periode", "Étiquettes par période de construction", masque=vue),
+                        use_container_width=True)
+        periodes = crosstab(cube, "periode", vue).T
+        parts = 100 * periodes.div(periodes.sum(axis=1), axis=0).fillna(0)
+        c2.plotly_chart(go.Figure([go.Bar(name=str(periode), x=parts.index, y=parts[periode]) for periode in parts.columns])
+                        .update_layout(title="Périodes de construction par étiquette", barmode="stack", yaxis_title="Part (%)"),
+                        use_container_width=True)
+        surface = histogramme(histogrammes, "surface", by="etiquette_dpe", masque=vue_histogrammes)
+        st.plotly_chart(fig_boites(surface, BORNES_SURFACE, "Surface habitable selon l'étiquette DPE", "Surface habitable (m²)"),
+                        use_container_width=True)
+        with st.expander("🔎 Distribution des surfaces"):
+            st.plotly_chart(fig_histogramme(surface.sum(), BORNES_SURFACE, "Distribution des surfaces habitables",
+                                            "Surface habitable (m²), tranches de 10"), use_container_width=True)
+
+    st.caption(f"{n_dpe:,} DPE, {int(vue.sum()):,} cellules du cube — vue calculée en {(time.perf_counter() - t0) * 1000:.0f} ms")
 
 def page_dataviz():
     st.title("📊 Visualisation des Données DPE")
@@ -191,6 +416,13 @@ def page_dataviz():
     avec les caractéristiques physiques et géographiques des logements.
     """)
 
+    # Mode interactif : disponible dès que le cube d'agrégats a été construit (python -m dpe.cube)
+    from dpe.cube import CUBE_PATH, HISTOGRAMMES_PATH
+
+    if CUBE_PATH.exists() and HISTOGRAMMES_PATH.exists() and st.toggle("Mode interactif (filtres)", value=False):
+        dataviz_cube(*load_dataviz_cube(CUBE_PATH))
+        return
+
     # Création d'onglets pour organiser la navigation
     tab1, tab2, tab3, tab4 = st.tabs([
         "🌍 Panorama National", 
@@ -207,10 +439,10 @@ def page_dataviz():
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("**Étiquette Énergie (DPE)**")
-            display_img("repartition_etiquette_DPE_France.png", "Répartition nationale des DPE")
+            display_img("repartition_etiquette_DPE_France.png", "Répartition nationale des DPE", largeur="demi")
         with col2:
             st.markdown("**Étiquette Climat (GES)**")
-            display_img("repartition_etiquette_GES_France.png", "Répartition nationale des GES")
+            display_img("repartition_etiquette_GES_France.png", "Répartition nationale des GES", largeur="demi")
             
         st.info("💡 **Note :** On observe souvent une corrélation entre les étiquettes DPE et GES, bien que le mode de chauffage influence fortement le GES.")
 
@@ -224,9 +456,9 @@ def page_dataviz():
         st.markdown("### 1. La France des passoires vs bâtiments écolos")
         c1, c2 = st.columns(2)
         with c1:
-            display_img("part_passoires_thermiques_par_departement.png", "Part des passoires (F & G)")
+            display_img("part_passoires_thermiques_par_departement.png", "Part des passoires (F & G)", largeur="demi")
         with c2:
-            display_img("part_batiments_ecolo_par_departements.png", "Part des bâtiments performants (A & B)")
+            display_img("part_batiments_ecolo_par_departements.png", "Part des bâtiments performants (A & B)", largeur="demi")
 
         st.markdown("---")
         
@@ -234,10 +466,10 @@ def page_dataviz():
         c3, c4 = st.columns(2)
         with c3:
             st.subheader("Par Région")
-            display_img("repartition_DPE_regions.png", "DPE par Région administrative")
+            display_img("repartition_DPE_regions.png", "DPE par Région administrative", largeur="demi")
         with c4:
             st.subheader("Par Zone Climatique")
-            display_img("repartition_zone_climatique.png", "Impact du climat local")
+            display_img("repartition_zone_climatique.png", "Impact du climat local", largeur="demi")
             
         st.markdown("#### Focus Altitude")
         display_img("repartition_classe_altitude.png", "Répartition des classes selon l'altitude")
@@ -250,9 +482,9 @@ def page_dataviz():
         # Comparaison Maison vs Appartement (DPE & GES)
         c1, c2 = st.columns(2)
         with c1:
-            display_img("etiquette_DPE_type_bat.png", "DPE selon le type de logement")
+            display_img("etiquette_DPE_type_bat.png", "DPE selon le type de logement", largeur="demi")
         with c2:
-            display_img("etiquette_GES_type_bat.png", "GES selon le type de logement")
+            display_img("etiquette_GES_type_bat.png", "GES selon le type de logement", largeur="demi")
             
         st.markdown("#### Source d'énergie principale")
         display_img("repartition_type_energie_n1.png", "Répartition par type d'énergie")
@@ -271,9 +503,9 @@ def page_dataviz():
         
         c1, c2 = st.columns(2)
         with c1:
-            display_img("repartition_etiquette_periode.png", "Étiquettes par période de construction")
+            display_img("repartition_etiquette_periode.png", "Étiquettes par période de construction", largeur="demi")
         with c2:
-            display_img("repartition_periode_etiquette.png", "Périodes de construction par étiquette")
+            display_img("repartition_periode_etiquette.png", "Périodes de construction par étiquette", largeur="demi")
 
         st.markdown("---")
 
@@ -286,23 +518,68 @@ def page_dataviz():
             st.write("Analyse de la distribution des surfaces avant et après traitement des valeurs aberrantes.")
             col_a, col_b = st.columns(2)
             with col_a:
-                display_img("surface_without_outliers.png", "Surface sans outliers")
+                display_img("surface_without_outliers.png", "Surface sans outliers", largeur="demi")
             with col_b:
-                display_img("surface_without_outliers_dist.png", "Distribution nettoyée")               
+                display_img("surface_without_outliers_dist.png", "Distribution nettoyée", largeur="demi")
                 
 # ----------------------------
 # PAGE 3: Résultats d'entraînement
 # ----------------------------
+@instrumentation.chronometre("load_metriques")
+@st.cache_data(show_spinner=False)
+@instrumentation.chronometre("load_metriques.calcul")
+def load_metriques(path: Path, empreinte: str = None) -> dict:
+    # Métriques du modèle déployé (python -m dpe.evaluation) ; relues quand le fichier change
+    from dpe.evaluation import load_metriques as lire
+
+    return lire(path)
+
+def metriques_deployees():
+    """Métriques du modèle déployé, ou None (la page affiche alors les chiffres de l'étude initiale)."""
+    from dpe.evaluation import METRIQUES_PATH
+    from dpe.model import MODEL_PATH, empreinte_artefact
+
+    if not METRIQUES_PATH.exists():
+        st.caption(f"Chiffres de l'étude initiale : {METRIQUES_PATH} introuvable "
+                   "(évaluation du modèle déployé : python -m dpe.evaluation <jeu de test>).")
+        return None
+    etat = METRIQUES_PATH.stat()
+    metriques = load_metriques(METRIQUES_PATH, f"{etat.st_size}:{etat.st_mtime_ns}")
+    if (MODEL_PATH / "modele.json").exists() and metriques["empreinte"] != empreinte_artefact(MODEL_PATH):
+        st.warning("Ces métriques ont été calculées sur une version précédente du modèle : relancer python -m dpe.evaluation.")
+    # Jeu de test vide ou sans cible exploitable : métriques à None, rien à afficher
+    regression = [v for reg in metriques["regression"].values() for v in (reg["mae"], reg["rmse"], reg["r2"])]
+    if metriques["classification"]["n"] == 0 or None in regression:
+        st.caption(f"Chiffres de l'étude initiale : {METRIQUES_PATH} ne contient pas de métriques exploitables "
+                   "(jeu de test vide ou cible constante).")
+        return None
+    return metriques
+
 def page_results():
+    import pandas as pd
+    import plotly.express as px
+
     st.title("🤖 Modélisation & Résultats")
     st.markdown("""
     Nous avons testé deux approches pour prédire la performance énergétique :
     1.  **Classification** : Prédire l'étiquette DPE (A à G).
     2.  **Régression** : Prédire la consommation d'énergie primaire ($kWh/m^2/an$).
-    
-    *Contrainte : Utilisation d'une baseline à 16 colonnes pour gérer la charge mémoire.*
     """)
 
+    metriques = metriques_deployees()
+    if metriques is None:
+        st.markdown("*Contrainte de l'étude : utilisation d'une baseline à 16 colonnes pour gérer la charge mémoire.*")
+    else:
+        from dpe.model import FEATURES
+
+        # Le modèle du simulateur ne voit que les champs du formulaire, non les colonnes de la base ADEME
+        origine = " du formulaire du simulateur" if set(metriques["features"]) <= set(FEATURES) else ""
+        st.markdown(f"*Modèle déployé : {len(metriques['features'])} variables{origine} en entrée "
+                    f"({', '.join(metriques['features'])}).*")
+        n_test = f"{metriques['classification']['n']:,}".replace(",", " ")
+        st.caption(f"Modèle déployé ({metriques['n_trees']} arbres, {len(metriques['features'])} variables) évalué le "
+                   f"{metriques['date'][:10]} sur {n_test} logements du jeu de test.")
+
     tab_classif, tab_reg = st.tabs(["🔠 Approche Classification", "📈 Approche Régression"])
 
     # --- ONGLET 1 : CLASSIFICATION ---
@@ -332,26 +609,54 @@ def page_results():
         st.markdown("Après optimisation des hyperparamètres (GridSearch), les gains sont marginaux, suggérant une limite intrinsèque aux données d'entrée.")
 
         met1, met2, met3 = st.columns(3)
-        met1.metric("Accuracy Test", "58.3%", delta="+0.6% vs Baseline")
-        met2.metric("F1-Score Weighted", "0.575")
-        met3.metric("Meilleur params", "500 arbres, Max Depth 20")
+        if metriques is None:
+            met1.metric("Accuracy Test", "58.3%", delta="+0.6% vs Baseline")
+            met2.metric("F1-Score Weighted", "0.575")
+            met3.metric("Meilleur params", "500 arbres, Max Depth 20")
+        else:
+            classif = metriques["classification"]
+            baseline = float(df_classif.loc[df_classif["Modèle"] == "Random Forest", "Accuracy"].iat[0])
+            met1.metric("Accuracy Test", f"{classif['exactitude']:.1%}", delta=f"{classif['exactitude'] - baseline:+.1%} vs Baseline")
+            met2.metric("F1-Score Weighted", f"{classif['f1_pondere']:.3f}")
+            met3.metric("Modèle déployé", f"{metriques['n_trees']} arbres")
 
         # Analyse des erreurs
         with st.expander("🔎 Analyse détaillée (Matrice de Confusion & Rapport)"):
-            st.markdown("#### Pourquoi plafonne-t-on à 58% ?")
+            st.markdown(f"#### Pourquoi plafonne-t-on à {classif['exactitude']:.0%} ?" if metriques else "#### Pourquoi plafonne-t-on à 58% ?")
             st.markdown("""
             L'analyse de la matrice de confusion montre que les erreurs sont principalement **"à une classe près"** :
             * Le modèle confond souvent **C et D** (les classes majoritaires).
             * Difficulté sur les extrêmes (A/B et F/G) à cause du déséquilibre de classe.
             """)
-            
+            if metriques is not None:
+                erreurs = 1 - classif["exactitude"]
+                part = f" ({classif['erreurs_une_classe'] / erreurs:.0%} des erreurs)" if erreurs > 0 else ""
+                st.markdown(f"Sur le jeu de test, **{classif['erreurs_une_classe']:.1%}** des logements sont classés "
+                            f"à une classe près{part} : "
+                            f"l'étiquette est juste à une classe près dans **{classif['a_une_classe_pres']:.1%}** des cas.")
+                confusion = pd.DataFrame(classif["confusion"], index=classif["classes"], columns=classif["classes"])
+                fig_confusion = px.imshow(confusion.div(confusion.sum(axis=1).clip(lower=1), axis=0), text_auto=".0%",
+                                          color_continuous_scale="Blues", labels=dict(x="Prédite", y="Réelle", color="Part"),
+                                          title="Matrice de confusion (part de chaque classe réelle)")
+                st.plotly_chart(fig_confusion, use_container_width=True)
+
             st.markdown("#### Rapport de Classification (Optimisé)")
-            report_data = {
-                "Classe": ["A", "B", "C", "D", "E", "F", "G"],
-                "Precision": [0.65, 0.60, 0.72, 0.56, 0.46, 0.39, 0.53],
-                "Recall": [0.52, 0.33, 0.72, 0.65, 0.48, 0.18, 0.52],
-                "F1-Score": [0.58, 0.43, 0.72, 0.60, 0.47, 0.25, 0.52]
-            }
+            if metriques is None:
+                report_data = {
+                    "Classe": ["A", "B", "C", "D", "E", "F", "G"],
+                    "Precision": [0.65, 0.60, 0.72, 0.56, 0.46, 0.39, 0.53],
+                    "Recall": [0.52, 0.33, 0.72, 0.65, 0.48, 0.18, 0.52],
+                    "F1-Score": [0.58, 0.43, 0.72, 0.60, 0.47, 0.25, 0.52]
+                }
+            else:
+                rapport = classif["rapport"]
+                report_data = {
+                    "Classe": list(rapport),
+                    "Precision": [round(r["precision"], 2) for r in rapport.values()],
+                    "Recall": [round(r["rappel"], 2) for r in rapport.values()],
+                    "F1-Score": [round(r["f1"], 2) for r in rapport.values()],
+                    "Support": [r["support"] for r in rapport.values()],
+                }
             st.dataframe(pd.DataFrame(report_data).set_index("Classe").style.background_gradient(cmap="Reds", subset=["F1-Score"]))
 
     # --- ONGLET 2 : REGRESSION ---
@@ -371,6 +676,18 @@ def page_results():
         st.dataframe(df_reg.style.highlight_max(subset=["R²"], color="#d1e7dd").highlight_min(subset=["MAE"], color="#d1e7dd"), use_container_width=True)
         st.caption("Le Random Forest domine largement les modèles linéaires classiques.")
 
+        delta_mae, delta_r2 = "-7 kWh vs RF", "+0.05 vs RF"
+        if metriques is not None:
+            st.markdown("#### Modèle déployé (jeu de test)")
+            for cible, unite in (("conso", "kWh/m²"), ("ges", "kgCO₂/m²")):
+                reg = metriques["regression"][cible]
+                c1, c2, c3 = st.columns(3)
+                c1.metric(f"MAE {cible}", f"{reg['mae']:.1f} {unite}")
+                c2.metric(f"RMSE {cible}", f"{reg['rmse']:.1f}")
+                c3.metric(f"R² {cible}", f"{reg['r2']:.3f}")
+            delta_mae = f"{36.6 - metriques['regression']['conso']['mae']:+.0f} kWh vs RF"
+            delta_r2 = f"{0.69 - metriques['regression']['conso']['r2']:+.2f} vs RF"
+
         st.divider()
 
         # 2. Deep Learning vs Random Forest
@@ -381,20 +698,17 @@ def page_results():
         """)
 
         col_res1, col_res2, col_res3 = st.columns(3)
-        col_res1.metric("MAE (Erreur Moyenne)", "36.6 kWh/m²", delta="-7 kWh vs RF", delta_color="normal")
+        col_res1.metric("MAE (Erreur Moyenne)", "36.6 kWh/m²", delta=delta_mae, delta_color="normal")
         col_res2.metric("RMSE", "49.6")
-        col_res3.metric("R² (Score)", "0.69", delta="+0.05 vs RF")
+        col_res3.metric("R² (Score)", "0.69", delta=delta_r2)
 
         # 3. Image d'analyse Deep Learning
         st.markdown("#### Analyse de l'entraînement (Validation Loss)")
         st.markdown("Comparaison de la convergence selon la taille du batch (Batch Size).")
         
         # Affichage de l'image fournie
-        try:
-            st.image("img/loss_batch_size.png", caption="Comparaison du Val Loss par Batch Size", use_container_width=True)
-            st.info("On remarque qu'un Batch Size plus grand (8192 - courbe verte) converge plus vite et offre une courbe plus stable.")
-        except:
-            st.warning("⚠️ Image 'img/loss_batch_size.png' introuvable.")
+        display_img("loss_batch_size.png", "Comparaison du Val Loss par Batch Size")
+        st.info("On remarque qu'un Batch Size plus grand (8192 - courbe verte) converge plus vite et offre une courbe plus stable.")
 
 # ----------------------------
 # PAGE 4: Simulateur (Formulaire + Modèle)
@@ -404,38 +718,167 @@ def get_classe_dpe(conso, ges):
     """
     Calcule l'étiquette DPE selon la méthode du double seuil (2021).
     On prend la pire note entre la Conso et le GES.
+    Les seuils sont partagés avec la version vectorisée `dpe.classes.classes_dpe`.
     """
-    # Seuils officiels DPE [Conso, GES]
-    seuils = {
-        'A': [70, 6],
-        'B': [110, 11],
-        'C': [180, 30],
-        'D': [250, 50],
-        'E': [330, 70],
-        'F': [420, 100],
-        'G': [float('inf'), float('inf')]
-    }
-    
-    def get_letter(val, type_val):
-        idx = 0 if type_val == 'conso' else 1
-        for letter, limits in seuils.items():
-            if val < limits[idx]:
-                return letter
-        return 'G'
-
-    letter_c = get_letter(conso, 'conso')
-    letter_g = get_letter(ges, 'ges')
-    
-    # Ordre de grandeur pour comparer les lettres (A=1, B=2...)
-    order = "ABCDEFG"
-    return letter_c if order.index(letter_c) > order.index(letter_g) else letter_g
+    return classe_dpe(conso, ges)
 
 # --- PAGE STREAMLIT ---
+def afficher_renovation(modele, valeurs, classe_finale):
+    """Bouquets de travaux les moins chers pour atteindre chaque classe meilleure que l'actuelle."""
+    from dpe.renovation import evalue, meilleurs_parcours
+
+    st.divider()
+    st.header("🔧 Scénarios de rénovation")
+    if classe_finale == "A":
+        st.info("Le logement est déjà en classe A.")
+        return
+
+    # Toutes les combinaisons de travaux évaluées en un seul appel au modèle
+    t0 = time.perf_counter()
+    scenarios, durees = evalue(modele, valeurs)
+    parcours = meilleurs_parcours(scenarios)
+    total_ms = (time.perf_counter() - t0) * 1000
+    instrumentation.enregistre("renovation", total_ms / 1000)
+
+    if parcours.empty:
+        st.warning("Aucune combinaison de travaux envisagée ne fait gagner de classe à ce logement.")
+    for _, p in parcours.iterrows():
+        titre = f"Classe {p['classe_visee']}" + (f" (obtient {p['classe_obtenue']})" if p["classe_obtenue"] != p["classe_visee"] else "")
+        with st.expander(f"{titre} — environ {p['cout']:,.0f} €".replace(",", " "), expanded=p["classe_visee"] == parcours["classe_visee"].iat[0]):
+            st.markdown("\n".join(f"- {t}" for t in p["travaux"]))
+            st.caption(f"Après travaux : {p['conso']:.0f} kWh/m²/an, {p['ges']:.0f} kgCO₂/m²/an")
+
+    if classe_finale in "FG" and not parcours.empty:
+        sortie = parcours[parcours["classe_obtenue"] < "F"]
+        if not sortie.empty:
+            st.success(f"Sortie du statut de passoire thermique dès {sortie['cout'].iat[0]:,.0f} € de travaux (estimation).".replace(",", " "))
+
+    st.caption(
+        f"{len(scenarios):,} scénarios évalués en {total_ms:.0f} ms "
+        f"(énumération {durees['enumeration_ms']:.0f} ms, modèle {durees['prediction_ms']:.0f} ms, "
+        f"étiquetage {durees['etiquetage_ms']:.1f} ms). Coûts indicatifs, hors aides."
+    )
+
+
+def fig_contributions(parts, libelles, unite, top=8, signe=True):
+    """Barres horizontales des `top` plus grandes valeurs de `parts` ; en rouge ce qui augmente l'estimation."""
+    import plotly.graph_objects as go
+
+    noms = sorted(parts, key=lambda nom: abs(parts[nom]))[-top:]
+    couleurs = [COULEURS["G"] if parts[nom] > 0 else COULEURS["A"] for nom in noms] if signe else None
+    fig = go.Figure(go.Bar(x=[parts[nom] for nom in noms], y=[libelles[nom] for nom in noms],
+                           orientation="h", marker_color=couleurs))
+    return fig.update_layout(xaxis_title=unite, height=80 + 30 * len(noms), margin=dict(l=0, r=0, t=10, b=0))
+
+def afficher_explication(zone, modele, valeurs, explication):
+    """
+    Contributions de chaque caractéristique (TreeSHAP), affichées au fil du calcul : les
+    premières versions portent sur les premiers arbres, la dernière sur toute la forêt.
+    """
+    from dpe.schema import LIBELLES
+
+    with zone:
+        st.divider()
+        st.header("🔍 Pourquoi cette estimation ?")
+        if explication is None:
+            st.info("Explications indisponibles : le modèle a été exporté sans table d'explication "
+                    "(réexporter : python -m dpe.model export).")
+            return
+        st.markdown("Écart à la moyenne du modèle expliqué caractéristique par caractéristique "
+                    "(valeurs de Shapley) : en rouge ce qui augmente l'estimation, en vert ce qui la diminue.")
+        rendu = st.empty()
+        if modele.importances:
+            with st.expander(f"Importance globale des caractéristiques ({modele.importances_n} logements)"):
+                st.plotly_chart(fig_contributions(modele.importances["conso"], LIBELLES, "kWh/m²/an (moyenne des |contributions|)",
+                                                  top=len(modele.features), signe=False), use_container_width=True)
+
+    libelles = {nom: f"{LIBELLES[nom]} : {valeurs[nom]:g}" if isinstance(valeurs[nom], float) else f"{LIBELLES[nom]} : {valeurs[nom]}"
+                for nom in modele.features}
+    affiche = None
+    while True:
+        termine = explication.termine
+        arbres, base, contributions = explication.etat()
+        if contributions is not None and arbres != affiche:
+            affiche = arbres
+            with rendu.container():
+                colonnes = st.columns(2)
+                for k, (col, titre, unite) in enumerate(zip(colonnes, ("Consommation", "Émissions"), ("kWh/m²/an", "kgCO₂/m²/an"))):
+                    parts = dict(zip(modele.features, contributions[:, k].tolist()))
+                    col.markdown(f"**{titre}** : moyenne {base[k]:.0f} {unite}, "
+                                 f"{'+' if contributions[:, k].sum() >= 0 else '−'} {abs(contributions[:, k].sum()):.0f} "
+                                 f"pour ce logement")
+                    col.plotly_chart(fig_contributions(parts, libelles, unite), use_container_width=True, key=f"shap_{k}_{arbres}")
+                if termine:
+                    st.caption(f"Valeurs exactes sur les {explication.n_arbres} arbres (TreeSHAP, {explication.duree_ms:.0f} ms).")
+                else:
+                    st.caption(f"Calcul en cours : {arbres} arbres sur {explication.n_arbres}…")
+        if termine:
+            break
+        time.sleep(0.15)
+    if explication.erreur is not None:
+        rendu.warning(f"Explication impossible : {explication.erreur}")
+
+def afficher_rang(valeurs, conso_simulee, ges_simule):
+    """Rang du logement simulé parmi les DPE de son segment (zone, type, période)."""
+    from dpe.quantiles import QUANTILES_PATH, empreinte
+
+    if not (QUANTILES_PATH / "quantiles.json").exists():
+        st.caption(f"Rang parmi les logements similaires indisponible : {QUANTILES_PATH} "
+                   "(construction : python -m dpe.quantiles <données>)")
+        return
+    esquisses = load_quantiles(QUANTILES_PATH, empreinte(QUANTILES_PATH))
+    for mesure, valeur, verbe in (("conso", conso_simulee, "consomme"), ("ges", ges_simule, "émet")):
+        with instrumentation.chrono("rang"):
+            rang = esquisses.rang_logement(valeurs, mesure, valeur)
+        if not rang["n"]:
+            continue
+        segment = rang["segment"]
+        description = ", ".join(filter(None, [
+            f"zone {segment['zone_clim']}" if "zone_clim" in segment else None,
+            segment.get("type_bat"),
+            f"construction {segment['periode']}" if "periode" in segment else None,
+        ])) or "France entière"
+        effectif = f"{rang['n']:,}".replace(",", " ")
+        st.markdown(f"Ce logement {verbe} plus que **{rang['part']:.0%}** des logements similaires "
+                    f"({description} : {effectif} DPE, ± {rang['erreur']:.1%}).")
+
+def afficher_comparables(valeurs, conso_simulee):
+    """DPE réels les plus proches du logement simulé (même zone, type et période)."""
+    from dpe.comparables import COMPARABLES_PATH, empreinte
+
+    st.divider()
+    st.header("🏘️ Logements comparables")
+    if not (COMPARABLES_PATH / "comparables.json").exists():
+        st.info(f"Index des logements comparables introuvable : {COMPARABLES_PATH} "
+                "(construction : python -m dpe.comparables <données>)")
+        return
+    index = load_comparables(COMPARABLES_PATH, empreinte(COMPARABLES_PATH))
+    with instrumentation.chrono("comparables"):
+        voisins = index.voisins(valeurs)
+    if voisins.empty:
+        st.info("Aucun DPE réel de même zone climatique, type de bâtiment et période dans la base.")
+        return
+    st.markdown(f"DPE réels de même zone climatique, type de bâtiment et période, aux systèmes et à la surface "
+                f"les plus proches : consommation médiane **{voisins['conso'].median():.0f} kWh/m²/an** "
+                f"(estimation : {conso_simulee} kWh/m²/an).")
+    tableau = voisins.assign(date_reception=voisins["date_reception"].dt.strftime("%m/%Y")).rename(columns={
+        "numero_dpe": "N° DPE", "date_reception": "Reçu", "departement": "Dépt", "surface": "Surface (m²)",
+        "generateur_chauff": "Générateur", "energie_chauff": "Énergie", "iso_env": "Isolation",
+        "conso": "Conso (kWh/m²/an)", "ges": "GES (kgCO₂/m²/an)", "etiquette_dpe": "DPE", "etiquette_ges": "GES",
+    })
+    st.dataframe(tableau[["N° DPE", "Reçu", "Dépt", "Surface (m²)", "Générateur", "Énergie", "Isolation",
+                          "Conso (kWh/m²/an)", "GES (kgCO₂/m²/an)", "DPE", "GES"]],
+                 hide_index=True, use_container_width=True)
+
 def page_simulator():
+    from dpe.batching import FileFermee
+    from dpe.explication import EXPLICATIONS
+    from dpe.model import MODEL_PATH, empreinte_artefact
+    from dpe.predictions import PREDICTIONS
+
     st.title("🏗️ Simulateur de Performance Énergétique")
     st.markdown("""
     Remplissez les caractéristiques du logement pour estimer sa consommation et son étiquette DPE.
-    *Note : Ceci est une maquette, les résultats sont simulés.*
     """)
 
     with st.form("form_simulation"):
@@ -445,46 +888,71 @@ def page_simulator():
         c1, c2, c3 = st.columns(3)
         
         with c1:
-            type_bat = st.selectbox("Type de bâtiment", ["Maison", "Appartement", "Immeuble"])
+            type_bat = st.selectbox("Type de bâtiment", VOCABULAIRE["type_bat"])
             surface = st.number_input("Surface habitable (m²)", min_value=9.0, max_value=500.0, value=70.0, step=1.0)
-            periode = st.selectbox("Période de construction", ["Avant 1948", "1949-1974", "1975-1988", "1989-1999", "2000-2005", "2006-2012", "Après 2013"])
-            altitude = st.selectbox("Classe d'altitude", ["< 400m", "400-800m", "> 800m"])
-            zone_clim = st.selectbox("Zone Climatique", ["H1", "H2", "H3"])
+            periode = st.selectbox("Période de construction", VOCABULAIRE["periode"])
+            altitude = st.selectbox("Classe d'altitude", VOCABULAIRE["altitude"])
+            zone_clim = st.selectbox("Zone Climatique", VOCABULAIRE["zone_clim"])
 
         with c2:
-            inertie = st.selectbox("Inertie du bâtiment", ["Très légère", "Légère", "Moyenne", "Lourde", "Très lourde"])
-            iso_mur = st.selectbox("Isolation Murs", ["Inconnue", "Non isolé", "Moyenne", "Bonne", "Très bonne"])
-            iso_toit = st.selectbox("Isolation Plancher Haut", ["Inconnue", "Non isolé", "Moyenne", "Bonne", "Très bonne"])
-            iso_env = st.selectbox("Qualité Isolation Enveloppe", ["Insuffisante", "Moyenne", "Bonne", "Très bonne"])
+            inertie = st.selectbox("Inertie du bâtiment", VOCABULAIRE["inertie"])
+            iso_mur = st.selectbox("Isolation Murs", VOCABULAIRE["iso_mur"])
+            iso_toit = st.selectbox("Isolation Plancher Haut", VOCABULAIRE["iso_toit"])
+            iso_env = st.selectbox("Qualité Isolation Enveloppe", VOCABULAIRE["iso_env"])
 
         with c3:
-            # Placeholders pour les systèmes (à remplacer par tes listes complètes plus tard)
-            chauffage_type = st.selectbox("Type installation chauffage", ["Individuel", "Collectif"])
-            generateur_chauff = st.selectbox("Générateur chauffage principal", ["Chaudière gaz standard", "Chaudière condensation", "PAC air/eau", "Radiateur élec", "Poêle bois"])
-            energie_chauff = st.selectbox("Énergie chauffage principale", ["Électricité", "Gaz naturel", "Fioul", "Bois", "Réseau de chaleur"])
-            emetteur = st.selectbox("Type émetteur", ["Radiateur bitube", "Radiateur monotube", "Plancher chauffant"])
-            ecs_type = st.selectbox("Type installation ECS", ["Individuel", "Collectif"])
-            energie_ecs = st.selectbox("Énergie ECS", ["Électricité", "Gaz", "Fioul"])
+            chauffage_type = st.selectbox("Type installation chauffage", VOCABULAIRE["chauffage_type"])
+            generateur_chauff = st.selectbox("Générateur chauffage principal", VOCABULAIRE["generateur_chauff"])
+            energie_chauff = st.selectbox("Énergie chauffage principale", VOCABULAIRE["energie_chauff"])
+            emetteur = st.selectbox("Type émetteur", VOCABULAIRE["emetteur"])
+            ecs_type = st.selectbox("Type installation ECS", VOCABULAIRE["ecs_type"])
+            energie_ecs = st.selectbox("Énergie ECS", VOCABULAIRE["energie_ecs"])
 
         # Champs techniques supplémentaires (Repliés pour ne pas surcharger si moins importants)
         with st.expander("Paramètres avancés (Énergies secondaires)"):
             sc1, sc2 = st.columns(2)
             with sc1:
-                st.selectbox("Type énergie n°1", ["Aucune", "Électricité", "Gaz"], key="e1")
-                st.selectbox("Type énergie générateur n°1 ECS", ["Aucune", "Électricité", "Gaz"], key="e1_ecs")
+                e1 = st.selectbox("Type énergie n°1", VOCABULAIRE["e1"], key="e1")
+                e1_ecs = st.selectbox("Type énergie générateur n°1 ECS", VOCABULAIRE["e1_ecs"], key="e1_ecs")
             with sc2:
-                st.selectbox("Type énergie n°2", ["Aucune", "Bois", "Solaire"], key="e2")
-                st.selectbox("Générateur chauffage principal ECS", ["Indépendant", "Combiné"], key="gen_ecs")
+                e2 = st.selectbox("Type énergie n°2", VOCABULAIRE["e2"], key="e2")
+                gen_ecs = st.selectbox("Générateur chauffage principal ECS", VOCABULAIRE["gen_ecs"], key="gen_ecs")
+
+        renovation = st.checkbox("🔧 Explorer les scénarios de rénovation", value=False)
 
         # Bouton de soumission centré
         submitted = st.form_submit_button("🚀 Lancer la simulation", use_container_width=True)
 
     # --- RÉSULTATS ---
     if submitted:
-        # Simulation Aléatoire (Mock)
-        conso_simulee = random.randint(5, 398)
-        ges_simule = random.randint(2, 68)
-        classe_finale = get_classe_dpe(conso_simulee, ges_simule)
+        if not MODEL_PATH.exists():
+            st.error(f"⚠️ Modèle introuvable : {MODEL_PATH} (entraînement : python -m dpe.model train <données>)")
+            return
+
+        # Prédiction par le modèle (chargé une fois par processus)
+        valeurs = {
+            "type_bat": type_bat, "surface": surface, "periode": periode, "altitude": altitude,
+            "zone_clim": zone_clim, "inertie": inertie, "iso_mur": iso_mur, "iso_toit": iso_toit,
+            "iso_env": iso_env, "chauffage_type": chauffage_type, "generateur_chauff": generateur_chauff,
+            "energie_chauff": energie_chauff, "emetteur": emetteur, "ecs_type": ecs_type,
+            "energie_ecs": energie_ecs, "e1": e1, "e1_ecs": e1_ecs, "e2": e2, "gen_ecs": gen_ecs,
+        }
+        # Les formulaires déjà vus (toutes sessions confondues) sont servis par le cache de prédictions
+        empreinte = empreinte_artefact(MODEL_PATH)
+        modele = load_model(MODEL_PATH, empreinte)
+        # Les autres passent par la file d'inférence, qui regroupe les sessions simultanées en lots
+        file_inference = load_file_inference(MODEL_PATH, empreinte)
+        with instrumentation.chrono("prediction"):
+            try:
+                conso, ges, classe_finale = PREDICTIONS.predict_one(modele, valeurs, empreinte, file_inference.predict)
+            except FileFermee:
+                # File remplacée entre-temps par celle d'un nouvel artefact : appel direct au modèle
+                conso, ges, classe_finale = PREDICTIONS.predict_one(modele, valeurs, empreinte)
+        # L'explication part en arrière-plan : l'étiquette s'affiche sans l'attendre
+        explication = EXPLICATIONS.explique(modele, valeurs, empreinte) if modele.explicateur is not None else None
+        # Classe des valeurs arrondies affichées (dpe.classes.classe_prediction)
+        conso_simulee = round(conso)
+        ges_simule = round(ges)
 
         st.divider()
         st.header("Résultats de l'estimation")
@@ -498,35 +966,115 @@ def page_simulator():
             st.metric("Émissions (GES)", f"{ges_simule} kgCO₂/m²/an")
             
             # Affichage de la lettre en gros (CSS hack rapide pour le style)
-            color_map = {'A': '#009036', 'B': '#53af31', 'C': '#c6d300', 'D': '#fce600', 'E': '#fbba00', 'F': '#eb6105', 'G': '#d40f14'}
+            color_map = COULEURS
             st.markdown(f"""
             <div style="text-align: center; background-color: {color_map[classe_finale]}; padding: 10px; border-radius: 10px;">
                 <h1 style="color: white; margin:0;">CLASSE {classe_finale}</h1>
             </div>
             """, unsafe_allow_html=True)
+            afficher_rang(valeurs, conso_simulee, ges_simule)
 
         with col_res2:
             st.markdown("### Étiquette Officielle")
-            # Construction de l'URL pour l'image dynamique
-            base_url = "https://www.outils.immo/outils-immo.php"
-            params = f"?type=dpe&modele=2021&valeur={conso_simulee}&lettre={classe_finale}&valeurges={ges_simule}"
-            full_url = base_url + params
-            
-            # Affichage de l'image
-            st.image(full_url, caption=f"DPE généré pour {conso_simulee} kWh et {ges_simule} kgCO₂", use_container_width=True)
+            # Étiquette dessinée localement (SVG, en cache) : pas de requête vers un service externe
+            with instrumentation.chrono("etiquette"):
+                etiquette = render_label_svg(conso_simulee, ges_simule, classe_finale)
+            st.image(etiquette, caption=f"DPE généré pour {conso_simulee} kWh et {ges_simule} kgCO₂", use_container_width=True)
+
+        st.success("Simulation terminée avec succès.")
+        afficher_comparables(valeurs, conso_simulee)
+
+        # Emplacement réservé : l'explication est remplie en dernier, au fil de son calcul
+        zone_explication = st.container()
+        if renovation:
+            afficher_renovation(modele, valeurs, classe_finale)
+        afficher_explication(zone_explication, modele, valeurs, explication)
 
-        st.success("Simulation terminée avec succès (Données aléatoires).")
 
 
+# ----------------------------
+# PAGE 5: Diagnostics (DPE_DIAGNOSTICS=1)
+# ----------------------------
+def page_diagnostics():
+    import json
+
+    st.title("🩺 Diagnostics")
+    resume = instrumentation.resume()
+    memoire = resume["memoire"]
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Mémoire résidente", f"{memoire['rss_mo']:.0f} Mo" if memoire["rss_mo"] is not None else "n/d")
+    c2.metric("Pic de mémoire", f"{memoire['pic_rss_mo']:.0f} Mo")
+    c3.metric("Mesures depuis", f"{resume['depuis_s'] / 60:.0f} min")
+    st.caption(f"Percentiles sur les {instrumentation.FENETRE} dernières mesures de chaque opération, "
+               "tous utilisateurs du processus confondus.")
+
+    operations = resume["operations"]
+    colonnes = ["n", "p50_ms", "p95_ms", "p99_ms", "max_ms", "total_s", "erreurs"]
+    pages = [{"page": nom.removeprefix("page "), **{c: s[c] for c in colonnes}}
+             for nom, s in operations.items() if nom.startswith("page ")]
+    st.subheader("Rendu des pages")
+    st.dataframe(pages, hide_index=True, use_container_width=True)
+
+    st.subheader("Chargements en cache")
+    chargeurs = []
+    for nom, s in operations.items():
+        if nom.startswith("load_") and not nom.endswith(".calcul"):
+            calcul = operations.get(f"{nom}.calcul", {"n": 0, "p50_ms": None})
+            chargeurs.append({"chargeur": nom, "appels": s["n"], "calculs": calcul["n"],
+                              "hits": f"{1 - calcul['n'] / s['n']:.0%}", "p50_ms": s["p50_ms"],
+                              "p99_ms": s["p99_ms"], "calcul_p50_ms": calcul["p50_ms"]})
+    st.dataframe(chargeurs, hide_index=True, use_container_width=True)
+
+    st.subheader("Opérations")
+    autres = [{"operation": nom, **{c: s[c] for c in colonnes}}
+              for nom, s in operations.items() if not nom.startswith(("page ", "load_"))]
+    st.dataframe(autres, hide_index=True, use_container_width=True)
+
+    from dpe.explication import EXPLICATIONS
+    from dpe.predictions import PREDICTIONS
+
+    caches = {"prédictions": PREDICTIONS.stats(), "explications": EXPLICATIONS.stats()}
+    st.markdown(" — ".join(f"**Cache de {nom}** : {c['hits']} hits, {c['misses']} misses, {c['entrees']} entrées"
+                           for nom, c in caches.items()))
+    if resume["compteurs"]:
+        st.json(resume["compteurs"])
+
+    if len(memoire["releves"]) > 1:
+        st.subheader("Mémoire résidente (Mo), un relevé par rerun")
+        st.line_chart([rss for _, rss in memoire["releves"]])
+
+    st.download_button("Exporter les mesures (JSON)", json.dumps({**resume, "caches": caches}, ensure_ascii=False),
+                       file_name="diagnostics_dpe.json", mime="application/json")
+    if instrumentation.EXPORT:
+        st.caption(f"Chaque mesure est aussi ajoutée à {instrumentation.EXPORT} (une ligne JSON par mesure).")
+
 
 # ----------------------------
 # ROUTER
 # ----------------------------
-if page == "🏁 Présentation":
-    page_presentation()
-elif page == "📊 Dataviz":
-    page_dataviz()
-elif page == "📈 Résultats d'entraînement":
-    page_results()
-elif page == "🧮 Simulateur DPE":
-    page_simulator()
+with profiling.page(page), instrumentation.chrono(f"page {page}"):
+    if page == "🏁 Présentation":
+        page_presentation()
+    elif page == "📊 Dataviz":
+        page_dataviz()
+    elif page == "📈 Résultats d'entraînement":
+        page_results()
+    elif page == "🧮 Simulateur DPE":
+        page_simulator()
+    elif page == "🩺 Diagnostics":
+        page_diagnostics()
+instrumentation.releve_memoire()
+
+# Mode profilage (DPE_PROFILE=1) : temps d'import et de rendu dans la barre latérale
+if profiling.ACTIF:
+    with st.sidebar.expander("⏱️ Profilage du démarrage"):
+        st.markdown(profiling.rapport_markdown())
+        from dpe.predictions import PREDICTIONS
+
+        cache = PREDICTIONS.stats()
+        st.markdown(f"**Cache de prédictions** : {cache['hits']} hits, {cache['misses']} misses "
+                    f"({cache['taux_hits']:.0%}), {cache['entrees']} entrées, {cache['invalidations']} invalidations")
+        from dpe.explication import EXPLICATIONS
+
+        cache = EXPLICATIONS.stats()
+        st.markdown(f"**Cache d'explications** : {cache['hits']} hits, {cache['misses']} misses, {cache['entrees']} entrées")
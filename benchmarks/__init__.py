@@ -0,0 +1 @@
+"""Benchmarks hors-ligne des chemins critiques de l'application (python -m benchmarks.<module>)."""
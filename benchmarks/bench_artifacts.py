@@ -0,0 +1,137 @@
+"""
+Formats d'artefact du modèle : démarrage à froid, mémoire par processus et compromis
+précision / taille / latence des variantes allégées.
+
+Chaque format est chargé par plusieurs processus simultanés (comme les réplicas
+Streamlit d'une même machine) pour mesurer ce qui est réellement partagé.
+
+    python -m benchmarks.bench_artifacts --train-rows 50000 --processes 4
+
+Le joblib d'une forêt de 500 arbres pèse environ 1 Go par processus : sur une
+machine modeste, réduire --trees et --processes (les variantes allégées gardent
+200, 100 et 50 arbres).
+"""
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.outils import memoire_partagee_mo, rss_mo
+from benchmarks.synthetic import ademe_frame, formulaire, modele_synthetique
+
+ARBRES_ALLEGES = (200, 100, 50)
+
+
+def _taille_mo(chemin: Path):
+    fichiers = chemin.rglob("*") if chemin.is_dir() else [chemin]
+    return sum(f.stat().st_size for f in fichiers if f.is_file()) / 2**20
+
+
+def _worker(chemin, barriere, file):
+    t0 = time.perf_counter()
+    from dpe.model import ModeleDPE
+
+    modele = ModeleDPE.load(chemin)
+    modele.predict_one(formulaire())
+    demarrage = time.perf_counter() - t0
+    # Tous les processus ont chargé le modèle : la mesure voit le partage effectif
+    barriere.wait()
+    file.put({"demarrage_s": demarrage, "rss_mo": rss_mo(), **memoire_partagee_mo()})
+    barriere.wait()
+
+
+def _charge_concurrente(chemin, processus):
+    ctx = mp.get_context("spawn")
+    barriere, file = ctx.Barrier(processus), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(str(chemin), barriere, file)) for _ in range(processus)]
+    for p in procs:
+        p.start()
+    mesures = [file.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return {
+        "demarrage_s": float(np.median([m["demarrage_s"] for m in mesures])),
+        "rss_par_processus_mo": float(np.median([m["rss_mo"] for m in mesures])),
+        "privee_par_processus_mo": float(np.median([m.get("privee", np.nan) for m in mesures])),
+        "pss_total_mo": float(sum(m.get("pss", np.nan) for m in mesures)),
+    }
+
+
+def _latence_p95_ms(modele, repeat=200):
+    rng = np.random.default_rng(1)
+    entrees = [formulaire(rng) for _ in range(repeat)]
+    durees = []
+    for valeurs in entrees:
+        t0 = time.perf_counter()
+        modele.predict_one(valeurs)
+        durees.append(time.perf_counter() - t0)
+    return float(np.percentile(durees, 95) * 1000)
+
+
+def run(train_rows=50_000, processus=4, test_rows=20_000, arbres=500):
+    import joblib
+
+    from dpe.classes import classes_dpe_codes
+    from dpe.model import ModeleDPE
+
+    modele = modele_synthetique(train_rows, n_estimators=arbres)
+    test = ademe_frame(test_rows, seed=7, noms_ademe=False)
+    X = modele.encoder.encode_frame(test)
+    reference = modele.forest.predict(X)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        formats = {
+            "joblib": modele.save(tmp / "modele.joblib"),
+            "joblib_compresse": Path(joblib.dump(
+                {"pipeline": modele.pipeline, "vocabulaire": modele.vocabulaire,
+                 "features": modele.features, "cibles": modele.cibles},
+                tmp / "modele_z.joblib", compress=3)[0]),
+            "mmap_complet": modele.export(tmp / "complet"),
+        }
+        for n in ARBRES_ALLEGES:
+            formats[f"mmap_float32_{n}_arbres"] = modele.export(tmp / f"leger_{n}", float32=True, n_trees=n)
+
+        resultats = {"lignes_entrainement": train_rows, "processus": processus, "formats": {}}
+        for nom, chemin in formats.items():
+            mesure = {"taille_mo": _taille_mo(chemin), **_charge_concurrente(chemin, processus)}
+            if nom.startswith("mmap"):
+                variante = ModeleDPE.load(chemin)
+                pred = variante.forest.predict(X)
+                mesure.update({
+                    "ecart_conso_vs_complet": float(np.abs(pred[:, 0] - reference[:, 0]).mean()),
+                    "mae_conso": float(np.abs(pred[:, 0] - test["conso"].to_numpy()).mean()),
+                    "classes_identiques_pct": float(100 * np.mean(
+                        classes_dpe_codes(pred[:, 0], pred[:, 1]) == classes_dpe_codes(reference[:, 0], reference[:, 1]))),
+                    "latence_p95_ms": _latence_p95_ms(variante),
+                })
+            resultats["formats"][nom] = mesure
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-rows", type=int, default=50_000)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--trees", type=int, default=500, help="arbres du modèle complet")
+    args = parser.parse_args()
+
+    res = run(args.train_rows, args.processes, arbres=args.trees)
+    print(f"{res['processus']} processus par format, modèle de {args.trees} arbres entraîné sur "
+          f"{res['lignes_entrainement']:,} lignes")
+    print(f"{'format':<24} {'taille':>8} {'démarrage':>10} {'RSS/proc':>9} {'privée/proc':>12} {'PSS total':>10}"
+          f" {'écart conso':>12} {'MAE':>7} {'classes=':>9} {'p95':>8}")
+    for nom, m in res["formats"].items():
+        ligne = (f"{nom:<24} {m['taille_mo']:>6.1f}Mo {m['demarrage_s']:>9.2f}s {m['rss_par_processus_mo']:>7.0f}Mo"
+                 f" {m['privee_par_processus_mo']:>10.0f}Mo {m['pss_total_mo']:>8.0f}Mo")
+        if "mae_conso" in m:
+            ligne += (f" {m['ecart_conso_vs_complet']:>12.2f} {m['mae_conso']:>7.2f}"
+                      f" {m['classes_identiques_pct']:>8.1f}% {m['latence_p95_ms']:>6.2f}ms")
+        print(ligne)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Images de la page Dataviz : octets transmis et temps serveur par rendu,
+avant (chemins PNG pleine résolution) et après (variantes dpe.assets servies
+depuis le cache d'octets).
+
+La liste des images est relevée sur un vrai rendu de la page Dataviz (AppTest).
+Les deux variantes sont ensuite rendues par un script qui n'affiche que ces
+images, pour comparer uniquement leur coût ; les octets sont ceux remis au
+gestionnaire de médias de Streamlit, c'est-à-dire ce que le navigateur télécharge.
+
+    python -m dpe.assets && python -m benchmarks.bench_assets --renders 20
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+
+import dpe.assets
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+
+AVANT = '''
+import os
+import streamlit as st
+
+for nom, _ in IMAGES:
+    path = f"img/{nom}"
+    if os.path.exists(path):
+        st.image(path, use_container_width=True)
+'''
+
+APRES = '''
+import streamlit as st
+from dpe.assets import image
+
+for nom, largeur in IMAGES:
+    st.image(image(nom, largeur), use_container_width=True)
+'''
+
+
+def images_dataviz():
+    """(nom, largeur) des images affichées par la page Dataviz, dans l'ordre."""
+    appels, original = [], dpe.assets.image
+    dpe.assets.image = lambda nom, largeur="pleine", **kw: appels.append((nom, largeur)) or original(nom, largeur, **kw)
+    try:
+        at = AppTest.from_file(str(APP), default_timeout=60).run()
+        at.sidebar.radio[0].set_value("📊 Dataviz").run()
+    finally:
+        dpe.assets.image = original
+    assert not at.exception, at.exception
+    return list(dict.fromkeys(appels))
+
+
+def _rendus(script, images, renders):
+    """Temps de chaque rendu et octets remis au gestionnaire de médias au dernier rendu."""
+    octets = []
+    charge = MemoryMediaFileStorage.load_and_get_id
+    MemoryMediaFileStorage.load_and_get_id = lambda self, data, *a, **kw: (
+        octets.append(len(data) if isinstance(data, bytes) else 0) or charge(self, data, *a, **kw))
+    try:
+        at = AppTest.from_string(f"IMAGES = {images!r}\n{script}", default_timeout=60)
+        durees = []
+        for _ in range(renders):
+            del octets[:]
+            t0 = time.perf_counter()
+            at.run()
+            durees.append(time.perf_counter() - t0)
+    finally:
+        MemoryMediaFileStorage.load_and_get_id = charge
+    return np.asarray(durees) * 1000, sum(octets)
+
+
+def run(renders=20):
+    images = images_dataviz()
+    dpe.assets.CACHE.clear()
+    resultats = {"images": len(images)}
+    for nom, script in (("avant", AVANT), ("apres", APRES)):
+        ms, octets = _rendus(script, images, renders)
+        resultats[nom] = {"octets": octets, "premier_ms": float(ms[0]),
+                          "p50_ms": float(np.percentile(ms[1:], 50)), "p95_ms": float(np.percentile(ms[1:], 95))}
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=20)
+    args = parser.parse_args()
+
+    r = run(args.renders)
+    print(f"{r['images']} images sur la page Dataviz")
+    print(f"{'':<7}{'octets':>12}{'1er rendu (ms)':>16}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for nom in ("avant", "apres"):
+        m = r[nom]
+        print(f"{nom:<7}{m['octets']:>12,}{m['premier_ms']:>16.1f}{m['p50_ms']:>10.1f}{m['p95_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
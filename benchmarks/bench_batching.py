@@ -0,0 +1,84 @@
+"""
+Test de charge : N utilisateurs simultanés du simulateur, chacun soumettant des
+formulaires à la suite pendant une durée fixe. Compare le chemin actuel (chaque
+session appelle `predict` sur sa ligne) à la file d'inférence par micro-lots :
+débit, latences p50/p99 et taille moyenne des lots.
+
+Le cache de prédictions est volontairement contourné : tous les formulaires
+sont distincts, c'est le coût de l'inférence qui est mesuré.
+
+    python -m benchmarks.bench_batching --users 1 8 32 64 --duree 5
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import formulaire, modele_synthetique
+from dpe.batching import ATTENTE_MAX_MS, MAX_LOT, WORKERS, FileInference
+
+
+def _charge(predict, entrees, users, duree):
+    """Chaque utilisateur enchaîne les soumissions pendant `duree` s ; renvoie débit et latences."""
+    latences = [[] for _ in range(users)]
+    depart = threading.Barrier(users + 1)
+    fin = [0.0]
+
+    def utilisateur(i):
+        rng = np.random.default_rng(i)
+        depart.wait()
+        while time.perf_counter() < fin[0]:
+            X = entrees[rng.integers(len(entrees))]
+            t0 = time.perf_counter()
+            predict(X)
+            latences[i].append(time.perf_counter() - t0)
+
+    fils = [threading.Thread(target=utilisateur, args=(i,)) for i in range(users)]
+    for f in fils:
+        f.start()
+    fin[0] = time.perf_counter() + duree
+    depart.wait()
+    for f in fils:
+        f.join()
+    ms = np.concatenate([np.asarray(l) for l in latences]) * 1000
+    return {"requetes_par_s": len(ms) / duree, "p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99))}
+
+
+def run(users=(1, 8, 32, 64), duree=5.0, train_rows=20_000, max_lot=MAX_LOT, attente_max_ms=ATTENTE_MAX_MS, workers=WORKERS):
+    modele = modele_synthetique(train_rows)
+    rng = np.random.default_rng(0)
+    entrees = [modele.encoder.encode_one(formulaire(rng)) for _ in range(2000)]
+    modele.predict(entrees[0])
+
+    resultats = {}
+    for n in users:
+        par_ligne = _charge(modele.predict, entrees, n, duree)
+        file = FileInference(modele.predict, max_lot, attente_max_ms, workers)
+        micro_lots = _charge(file.predict, entrees, n, duree)
+        file.fermer()
+        micro_lots["taille_moyenne_lot"] = file.stats()["taille_moyenne"]
+        resultats[n] = {"par_ligne": par_ligne, "micro_lots": micro_lots}
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--duree", type=float, default=5.0)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    parser.add_argument("--max-lot", type=int, default=MAX_LOT)
+    parser.add_argument("--attente-max-ms", type=float, default=ATTENTE_MAX_MS)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    r = run(args.users, args.duree, args.train_rows, args.max_lot, args.attente_max_ms, args.workers)
+    print(f"{'users':>5}  {'chemin':<11}{'req/s':>9}{'p50 (ms)':>10}{'p99 (ms)':>10}{'lot moyen':>11}")
+    for n, m in r.items():
+        for chemin, v in m.items():
+            lot = f"{v['taille_moyenne_lot']:.1f}" if "taille_moyenne_lot" in v else "1"
+            print(f"{n:>5}  {chemin:<11}{v['requetes_par_s']:>9,.0f}{v['p50_ms']:>10.2f}{v['p99_ms']:>10.2f}{lot:>11}")
+
+
+if __name__ == "__main__":
+    main()
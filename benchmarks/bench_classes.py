@@ -0,0 +1,84 @@
+"""
+Débit de l'étiquetage DPE : boucle scalaire historique vs version vectorisée.
+
+    python -m benchmarks.bench_classes --rows 10000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import conso_ges
+from dpe.classes import CLASSES, classe_dpe, classes_dpe, classes_dpe_codes
+
+
+def get_classe_dpe_historique(conso, ges):
+    """Implémentation d'origine de app.py, conservée comme référence de mesure."""
+    seuils = {
+        'A': [70, 6],
+        'B': [110, 11],
+        'C': [180, 30],
+        'D': [250, 50],
+        'E': [330, 70],
+        'F': [420, 100],
+        'G': [float('inf'), float('inf')]
+    }
+
+    def get_letter(val, type_val):
+        idx = 0 if type_val == 'conso' else 1
+        for letter, limits in seuils.items():
+            if val < limits[idx]:
+                return letter
+        return 'G'
+
+    letter_c = get_letter(conso, 'conso')
+    letter_g = get_letter(ges, 'ges')
+    order = "ABCDEFG"
+    return letter_c if order.index(letter_c) > order.index(letter_g) else letter_g
+
+
+def _debit(fn, n):
+    t0 = time.perf_counter()
+    fn()
+    duree = time.perf_counter() - t0
+    return {"secondes": duree, "lignes_par_s": n / duree}
+
+
+def run(rows=10_000_000, scalar_rows=1_000_000, seed=0):
+    conso, ges = conso_ges(rows, seed)
+    # La boucle Python est mesurée sur un sous-échantillon puis ramenée en lignes/s.
+    m = min(scalar_rows, rows)
+    conso_l, ges_l = conso[:m].tolist(), ges[:m].tolist()
+
+    # Premier appel hors mesure : la version vectorisée importe NumPy/pandas à la demande
+    classes_dpe(conso[:10], ges[:10])
+    resultats = {
+        "lignes": rows,
+        "scalaire_historique": _debit(lambda: [get_classe_dpe_historique(c, g) for c, g in zip(conso_l, ges_l)], m),
+        "scalaire_bisect": _debit(lambda: [classe_dpe(c, g) for c, g in zip(conso_l, ges_l)], m),
+        "vectorise_codes": _debit(lambda: classes_dpe_codes(conso, ges), rows),
+        "vectorise_categoriel": _debit(lambda: classes_dpe(conso, ges), rows),
+    }
+
+    # Contrôle de cohérence entre les deux chemins sur le sous-échantillon.
+    attendu = np.array([CLASSES.index(get_classe_dpe_historique(c, g)) for c, g in zip(conso_l, ges_l)])
+    assert np.array_equal(attendu, classes_dpe_codes(conso[:m], ges[:m])), "écart scalaire / vectorisé"
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--scalar-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    res = run(args.rows, args.scalar_rows)
+    ref = res["scalaire_historique"]["lignes_par_s"]
+    print(f"{res['lignes']:,} lignes synthétiques")
+    for nom in ("scalaire_historique", "scalaire_bisect", "vectorise_codes", "vectorise_categoriel"):
+        r = res[nom]
+        print(f"{nom:<22} {r['lignes_par_s']:>14,.0f} lignes/s  (x{r['lignes_par_s'] / ref:,.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Logements comparables du simulateur : temps de construction de l'index, taille
+sur disque (comparée à la base Parquet), ouverture, latence d'une recherche
+(première recherche puis p50/p95/p99) et exactitude comparée à une recherche
+exhaustive sur la base chargée en mémoire.
+
+    python -m benchmarks.bench_comparables --lignes 2000000 --requetes 500 --k 5
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import ademe_frame, formulaire
+from dpe.comparables import PARTITION, POIDS, POIDS_SURFACE, SYSTEMES, IndexComparables, build_index
+
+
+def _exhaustive(df, valeurs, k):
+    """Distances des k plus proches voisins par balayage complet de la base (référence)."""
+    masque = np.logical_and.reduce([(df[nom] == valeurs[nom]).to_numpy() for nom in PARTITION])
+    partie = df[masque]
+    d = sum(POIDS[nom] * (partie[nom] != valeurs[nom]).to_numpy() for nom in SYSTEMES)
+    surface = partie["surface"].to_numpy(dtype=np.float32)
+    d = d + POIDS_SURFACE * np.abs(np.log(surface) - np.log(valeurs["surface"]))
+    return np.sort(d)[:k]
+
+
+def run(lignes=2_000_000, requetes=500, k=5, verifications=50):
+    df = ademe_frame(lignes, seed=0, noms_ademe=False)
+    rng = np.random.default_rng(1)
+    formulaires = [formulaire(rng) for _ in range(requetes)]
+    with tempfile.TemporaryDirectory() as tmp:
+        source, dossier = Path(tmp) / "dpe.parquet", Path(tmp) / "comparables"
+        df.to_parquet(source)
+        t0 = time.perf_counter()
+        meta = build_index(source, dossier)
+        resultats = {
+            "construction_s": time.perf_counter() - t0,
+            "groupes": meta["n_groupes"],
+            "index_mo": sum(f.stat().st_size for f in dossier.glob("*.npy")) / 1e6,
+            "source_mo": source.stat().st_size / 1e6,
+        }
+
+        t0 = time.perf_counter()
+        index = IndexComparables.open(dossier)
+        resultats["ouverture_ms"] = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        index.voisins(formulaires[0], k)
+        resultats["premiere_ms"] = (time.perf_counter() - t0) * 1000
+
+        durees = []
+        for valeurs in formulaires:
+            t0 = time.perf_counter()
+            index.voisins(valeurs, k)
+            durees.append((time.perf_counter() - t0) * 1000)
+        resultats.update({f"p{q}_ms": float(np.percentile(durees, q)) for q in (50, 95, 99)})
+
+        ecarts, durees = [], []
+        for valeurs in formulaires[:verifications]:
+            t0 = time.perf_counter()
+            reference = _exhaustive(df, valeurs, k)
+            durees.append((time.perf_counter() - t0) * 1000)
+            trouvees = index.voisins(valeurs, k)["distance"].to_numpy()
+            ecarts.append(float(np.max(np.abs(trouvees - reference), initial=0.0)))
+        resultats["exhaustive_p50_ms"] = float(np.median(durees))
+        resultats["ecart_max"] = max(ecarts)
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lignes", type=int, default=2_000_000)
+    parser.add_argument("--requetes", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    r = run(args.lignes, args.requetes, args.k)
+    print(f"Construction ({args.lignes:,} DPE, {r['groupes']:,} groupes) : {r['construction_s']:.1f} s")
+    print(f"Index {r['index_mo']:.0f} Mo (base Parquet {r['source_mo']:.0f} Mo), ouverture {r['ouverture_ms']:.1f} ms")
+    print(f"Recherche des {args.k} comparables : première {r['premiere_ms']:.1f} ms, "
+          f"p50 {r['p50_ms']:.1f} ms  p95 {r['p95_ms']:.1f} ms  p99 {r['p99_ms']:.1f} ms")
+    print(f"Balayage exhaustif : p50 {r['exhaustive_p50_ms']:.0f} ms, écart max des distances {r['ecart_max']:.1e}")
+
+
+if __name__ == "__main__":
+    main()
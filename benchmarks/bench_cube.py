@@ -0,0 +1,79 @@
+"""
+Cube d'agrégats de la page Dataviz : temps de construction, taille (cube et
+histogrammes), et latence des interactions (masques + agrégations des vues)
+sur des filtres tirés au hasard.
+
+    python -m benchmarks.bench_cube --rows 2000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import ademe_frame
+from dpe.cube import (BORNES_SURFACE, COLONNES_GES, DIMENSIONS_FILTRES, build_cube, crosstab, histogramme,
+                      histogrammes_path, load_cube, load_histogrammes, masque_filtres, quantiles, rollup)
+
+
+def _vues(cube, histogrammes, filtres):
+    """Mêmes masques et agrégations que les quatre vues de la page Dataviz."""
+    vue, vue_histogrammes = masque_filtres(cube, filtres), masque_filtres(histogrammes, filtres)
+    rollup(cube, "etiquette_dpe", ["n"] + list(COLONNES_GES), vue)
+    histogramme(histogrammes, "conso", by="etiquette_dpe", masque=vue_histogrammes)
+    for tranches in histogramme(histogrammes, "surface", by="etiquette_dpe", masque=vue_histogrammes).to_numpy():
+        quantiles(tranches, BORNES_SURFACE)
+    for dim in ("departement", "region", "zone_clim", "altitude", "type_bat", "energie_chauff", "inertie", "periode"):
+        crosstab(cube, dim, vue)
+    rollup(cube, "type_bat", COLONNES_GES, vue)
+
+
+def run(rows=2_000_000, interactions=200, seed=0):
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "dpe.parquet"
+        ademe_frame(rows, noms_ademe=False).to_parquet(source)
+        t0 = time.perf_counter()
+        build_cube(source, Path(tmp) / "cube.parquet")
+        construction = time.perf_counter() - t0
+        fichiers = (Path(tmp) / "cube.parquet", histogrammes_path(Path(tmp) / "cube.parquet"))
+        taille = sum(path.stat().st_size for path in fichiers) / 2**20
+        cube, histogrammes = load_cube(fichiers[0]), load_histogrammes(fichiers[1])
+
+    durees = []
+    for _ in range(interactions):
+        filtres = {}
+        for dim in rng.choice(DIMENSIONS_FILTRES, size=rng.integers(0, 3), replace=False):
+            modalites = cube[dim].cat.categories
+            filtres[dim] = list(rng.choice(modalites, size=rng.integers(1, min(4, len(modalites)) + 1), replace=False))
+        t0 = time.perf_counter()
+        _vues(cube, histogrammes, filtres)
+        durees.append(time.perf_counter() - t0)
+    ms = np.asarray(durees) * 1000
+    return {
+        "lignes": rows,
+        "construction_s": construction,
+        "cellules": len(cube),
+        "lignes_histogrammes": len(histogrammes),
+        "taille_fichier_mo": taille,
+        "memoire_mo": (cube.memory_usage(deep=True).sum() + histogrammes.memory_usage(deep=True).sum()) / 2**20,
+        "interaction_p50_ms": float(np.percentile(ms, 50)),
+        "interaction_p95_ms": float(np.percentile(ms, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--interactions", type=int, default=200)
+    args = parser.parse_args()
+
+    r = run(args.rows, args.interactions)
+    print(f"{r['lignes']:,} DPE -> {r['cellules']:,} cellules et {r['lignes_histogrammes']:,} lignes d'histogramme "
+          f"en {r['construction_s']:.1f} s ({r['taille_fichier_mo']:.1f} Mo sur disque, {r['memoire_mo']:.1f} Mo en mémoire)")
+    print(f"Interaction (masques + toutes les agrégations) : p50 {r['interaction_p50_ms']:.0f} ms, p95 {r['interaction_p95_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Entraînement en mémoire (`dpe.model.fit_model` sur la base chargée) vs par blocs
+(`dpe.entrainement`), sur les 16 premières variables du formulaire et sur les
+19 : durée, pic de mémoire (RSS) et qualité (MAE, R², exactitude de
+l'étiquette) sur un même jeu de test.
+
+Limite : les deux jeux de colonnes sont des variables du formulaire du
+simulateur. Les 16 sont un préfixe de FEATURES, non la liste exacte de la
+baseline de l'étude ; les 19 ne sont pas les quelque 200 colonnes de la base
+ADEME, et le générateur synthétique n'en produit pas d'autres. Le banc mesure
+le passage par blocs à largeur comparable, pas l'apport de colonnes en plus.
+
+Chaque variante tourne dans un processus séparé pour mesurer son pic de mémoire.
+
+    python -m benchmarks.bench_entrainement --lignes 1000000 --arbres 24 --bloc 250000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.outils import pic_rss_mo
+from dpe.schema import FEATURES
+
+# Les 16 premières variables du formulaire (sans e1_ecs, e2, gen_ecs), puis les 19
+COLONNES = {"formulaire_16": FEATURES[:16], "formulaire_19": FEATURES}
+VARIANTES = tuple((mode, colonnes) for colonnes in COLONNES for mode in ("en_memoire", "par_blocs"))
+
+
+def _worker(mode, colonnes, source, test, arbres, bloc, max_depth):
+    import numpy as np
+    import pandas as pd
+
+    from dpe.entrainement import metriques
+    from dpe.features import FeatureEncoder
+    from dpe.model import fit_model
+    from dpe.schema import CIBLES, VOCABULAIRE
+
+    features = COLONNES[colonnes]
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        if mode == "en_memoire":
+            from dpe.ingest import read_dataset
+
+            df = read_dataset(source, columns=list(features + CIBLES)).dropna(subset=list(CIBLES))
+            forest = fit_model(df, features=features, n_estimators=arbres, max_depth=max_depth).forest
+        else:
+            from dpe.entrainement import train_out_of_core
+            from dpe.forest import CompiledForest
+
+            train_out_of_core(source, Path(tmp) / "modele", features=features, bloc=bloc, importances=0,
+                              n_estimators=arbres, max_depth=max_depth)
+            forest = CompiledForest.open(Path(tmp) / "modele")
+        duree = time.perf_counter() - t0
+        jeu = pd.read_parquet(test)
+        X = FeatureEncoder(features, VOCABULAIRE).encode_frame(jeu)
+        return {"secondes": duree, "pic_rss_mo": pic_rss_mo(), "noeuds": int(len(forest.feature)),
+                **metriques(forest, X, jeu[list(CIBLES)].to_numpy(dtype=np.float32))}
+
+
+def _mesure(mode, colonnes, source, test, arbres, bloc, max_depth):
+    sortie = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_entrainement", "--worker", mode, colonnes, str(source), str(test),
+         "--arbres", str(arbres), "--bloc", str(bloc), "--max-depth", str(max_depth)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(sortie.stdout)
+
+
+def run(lignes=1_000_000, arbres=24, bloc=250_000, max_depth=20, test=50_000):
+    from benchmarks.synthetic import ademe_frame
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source, jeu_test = Path(tmp) / "dpe.parquet", Path(tmp) / "test.parquet"
+        ademe_frame(lignes, seed=0, noms_ademe=False).to_parquet(source)
+        ademe_frame(test, seed=7, noms_ademe=False).to_parquet(jeu_test)
+        return {f"{mode}_{colonnes}": _mesure(mode, colonnes, source, jeu_test, arbres, bloc, max_depth)
+                for mode, colonnes in VARIANTES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lignes", type=int, default=1_000_000)
+    parser.add_argument("--arbres", type=int, default=24)
+    parser.add_argument("--bloc", type=int, default=250_000)
+    parser.add_argument("--max-depth", type=int, default=20)
+    parser.add_argument("--worker", nargs=4, metavar=("MODE", "COLONNES", "SOURCE", "TEST"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_worker(*args.worker, args.arbres, args.bloc, args.max_depth)))
+        return
+
+    res = run(args.lignes, args.arbres, args.bloc, args.max_depth)
+    print(f"{args.lignes:,} lignes, {args.arbres} arbres (profondeur {args.max_depth}), blocs de {args.bloc:,} lignes")
+    for nom, r in res.items():
+        print(f"{nom:<24} {r['secondes']:>7.1f} s  pic RSS {r['pic_rss_mo']:>6.0f} Mo  {r['noeuds']:>10,} nœuds  "
+              f"MAE conso {r['mae_conso']:>5.1f}  MAE GES {r['mae_ges']:>5.2f}  R² conso {r['r2_conso']:.3f}  "
+              f"étiquette {r['exactitude_etiquette']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
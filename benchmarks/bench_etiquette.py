@@ -0,0 +1,56 @@
+"""
+Rendu local de l'étiquette DPE : premier rendu, rendu servi par le cache LRU,
+et vérification qu'aucune connexion réseau n'est ouverte.
+
+    python -m benchmarks.bench_etiquette --labels 2000
+"""
+import argparse
+import socket
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import conso_ges
+from dpe.classes import classe_dpe
+from dpe.etiquette import render_label_svg
+
+
+def run(labels=2000, seed=0):
+    conso, ges = conso_ges(labels, seed)
+    entrees = [(round(c), round(g)) for c, g in zip(conso.tolist(), ges.tolist())]
+    entrees = [(c, g, classe_dpe(c, g)) for c, g in entrees]
+    render_label_svg.cache_clear()
+
+    connexions = []
+    connect = socket.socket.connect
+    socket.socket.connect = lambda self, adresse: connexions.append(adresse) or connect(self, adresse)
+    try:
+        mesures = {}
+        for passe in ("premier_rendu", "cache"):
+            durees = []
+            for e in entrees:
+                t0 = time.perf_counter()
+                render_label_svg(*e)
+                durees.append(time.perf_counter() - t0)
+            ms = np.asarray(durees) * 1000
+            mesures[passe] = {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95))}
+    finally:
+        socket.socket.connect = connect
+    return {"etiquettes": len(set(entrees)), **mesures, "connexions_sortantes": len(connexions),
+            "taille_svg_octets": len(render_label_svg(*entrees[0]))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", type=int, default=2000)
+    args = parser.parse_args()
+
+    r = run(args.labels)
+    print(f"{r['etiquettes']:,} étiquettes distinctes, SVG de {r['taille_svg_octets']:,} octets")
+    for passe in ("premier_rendu", "cache"):
+        print(f"{passe:<14} p50 {r[passe]['p50_ms']:.4f} ms  p95 {r[passe]['p95_ms']:.4f} ms")
+    print(f"Connexions sortantes : {r['connexions_sortantes']}")
+
+
+if __name__ == "__main__":
+    main()
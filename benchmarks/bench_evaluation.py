@@ -0,0 +1,81 @@
+"""
+Évaluation du modèle déployé (dpe.evaluation) : débit et pic de mémoire selon la
+taille du jeu de test et le nombre de processus. Le pic de mémoire doit rester
+le même quand le jeu de test grandit (seuls les accumulateurs sont conservés).
+
+Chaque mesure tourne dans un processus séparé pour mesurer son pic de mémoire.
+
+    python -m benchmarks.bench_evaluation --lignes 500000 2000000 --processes 1 4 --trees 100
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.outils import pic_rss_mo
+
+
+def _worker(source, modele, processes):
+    from dpe.evaluation import evaluate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        m = evaluate(source, modele, Path(tmp) / "metriques.json", processes=processes)
+        duree = time.perf_counter() - t0
+    return {"secondes": duree, "pic_rss_mo": pic_rss_mo(), "exactitude": m["classification"]["exactitude"],
+            "mae_conso": m["regression"]["conso"]["mae"]}
+
+
+def _mesure(source, modele, processes):
+    sortie = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_evaluation", "--worker", str(source), str(modele), str(processes)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(sortie.stdout)
+
+
+def run(lignes=(500_000, 2_000_000), processes=None, trees=100, train_rows=20_000):
+    from benchmarks.synthetic import ademe_frame, modele_synthetique
+
+    processes = processes or sorted({1, os.cpu_count() or 1})
+    with tempfile.TemporaryDirectory() as tmp:
+        modele = Path(tmp) / "modele"
+        modele_synthetique(train_rows).export(modele, n_trees=trees)
+        resultats = {}
+        for n in lignes:
+            source = Path(tmp) / f"test_{n}.parquet"
+            ademe_frame(n, seed=3, noms_ademe=False).to_parquet(source)
+            for p in processes:
+                r = _mesure(source, modele, p)
+                r["lignes_par_s"] = n / r["secondes"]
+                resultats[(n, p)] = r
+            source.unlink()
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lignes", type=int, nargs="+", default=[500_000, 2_000_000])
+    parser.add_argument("--processes", type=int, nargs="+", default=None)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--worker", nargs=3, metavar=("SOURCE", "MODELE", "PROCESSES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        source, modele, processes = args.worker
+        print(json.dumps(_worker(source, modele, int(processes))))
+        return
+
+    res = run(args.lignes, args.processes, args.trees)
+    print(f"{args.trees} arbres, {os.cpu_count()} cœurs disponibles")
+    for (n, p), r in res.items():
+        print(f"{n:>10,} lignes  {p} processus  {r['secondes']:>6.1f} s  {r['lignes_par_s']:>9,.0f} lignes/s  "
+              f"pic RSS {r['pic_rss_mo']:>5.0f} Mo  (exactitude {r['exactitude']:.1%}, MAE conso {r['mae_conso']:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Explications TreeSHAP du simulateur : coût de la table construite à l'export,
+latence de la première explication partielle et de l'explication exacte (toute
+la forêt), nombre d'arbres couverts dans un budget donné et écart de cette
+explication partielle à l'exacte, exactitude locale (base + somme des
+contributions = prédiction) et latence d'un formulaire déjà expliqué (cache).
+
+    python -m benchmarks.bench_explication --logements 20 --trees 500 100 --budget-ms 300
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import formulaire, modele_synthetique
+from dpe.explication import CacheExplications
+from dpe.model import ModeleDPE, empreinte_artefact
+
+
+def _taille(dossier):
+    return sum(f.stat().st_size for f in Path(dossier).glob("*.npy"))
+
+
+def _mesure(modele, formulaires, budget_ms):
+    premiers, totaux, arbres_budget, ecarts, exactitude = [], [], [], [], []
+    for valeurs in formulaires:
+        x = modele.encoder.encode_one(valeurs)[0]
+        t0 = time.perf_counter()
+        dans_budget = None
+        for i, (arbres, base, contributions) in enumerate(modele.explicateur.par_blocs(x)):
+            ecoule = (time.perf_counter() - t0) * 1000
+            if i == 0:
+                premiers.append(ecoule)
+            if ecoule <= budget_ms:
+                dans_budget = (arbres, contributions)
+        totaux.append((time.perf_counter() - t0) * 1000)
+        prediction = modele.forest.predict(x[None])[0]
+        exactitude.append(float(np.max(np.abs(base + contributions.sum(axis=0) - prediction) / np.abs(prediction))))
+        if dans_budget is not None:
+            arbres_budget.append(dans_budget[0])
+            # Écart relatif (norme L1) de l'explication partielle à l'explication exacte
+            ecarts.append(float(np.abs(dans_budget[1] - contributions).sum() / np.abs(contributions).sum()))
+    return {
+        "premier_p50_ms": float(np.percentile(premiers, 50)),
+        "premier_p95_ms": float(np.percentile(premiers, 95)),
+        "exacte_p50_ms": float(np.percentile(totaux, 50)),
+        "exacte_p95_ms": float(np.percentile(totaux, 95)),
+        "arbres_dans_budget": int(np.min(arbres_budget)) if arbres_budget else 0,
+        "ecart_budget": float(np.max(ecarts)) if ecarts else None,
+        "exactitude_locale": float(np.max(exactitude)),
+    }
+
+
+def run(logements=20, trees=(500, 100), budget_ms=300.0, train_rows=20_000):
+    modele = modele_synthetique(train_rows)
+    rng = np.random.default_rng(0)
+    formulaires = [formulaire(rng) for _ in range(logements)]
+    resultats = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in trees:
+            chemin = Path(tmp) / f"modele_{n}"
+            t0 = time.perf_counter()
+            modele.export(chemin, n_trees=n)
+            export_s = time.perf_counter() - t0
+            charge = ModeleDPE.load(chemin)
+            r = _mesure(charge, formulaires, budget_ms)
+            r.update({
+                "noeuds": len(charge.forest.children),
+                "export_s": export_s,
+                "foret_mo": _taille(chemin) / 1e6,
+                "table_mo": _taille(chemin / "explication") / 1e6,
+            })
+
+            # Formulaire déjà expliqué : servi par le cache, quelle que soit la session
+            cache = CacheExplications()
+            empreinte = empreinte_artefact(chemin)
+            cache.explique(charge, formulaires[0], empreinte).attendre()
+            t0 = time.perf_counter()
+            for _ in range(1000):
+                cache.explique(charge, formulaires[0], empreinte)
+            r["cache_us"] = (time.perf_counter() - t0) * 1000
+            resultats[n] = r
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logements", type=int, default=20)
+    parser.add_argument("--trees", type=int, nargs="+", default=[500, 100])
+    parser.add_argument("--budget-ms", type=float, default=300.0)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    r = run(args.logements, args.trees, args.budget_ms, args.train_rows)
+    for n, m in r.items():
+        print(f"{n} arbres ({m['noeuds']:,} nœuds) : export {m['export_s']:.1f} s, "
+              f"forêt {m['foret_mo']:.0f} Mo + table {m['table_mo']:.0f} Mo")
+        print(f"  première explication partielle  p50 {m['premier_p50_ms']:.0f} ms  p95 {m['premier_p95_ms']:.0f} ms")
+        print(f"  explication exacte              p50 {m['exacte_p50_ms']:.0f} ms  p95 {m['exacte_p95_ms']:.0f} ms")
+        ecart = f"{m['ecart_budget']:.1%}" if m["ecart_budget"] is not None else "-"
+        print(f"  dans {args.budget_ms:.0f} ms : {m['arbres_dans_budget']} arbres au moins, écart à l'exacte {ecart}")
+        print(f"  base + contributions = prédiction à {m['exactitude_locale']:.1e} près (relatif)")
+        print(f"  formulaire en cache : {m['cache_us']:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
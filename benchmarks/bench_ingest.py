@@ -0,0 +1,86 @@
+"""
+Chargement des données : `pd.read_csv` complet vs ingestion par blocs + cache Parquet.
+
+Chaque variante tourne dans un processus séparé pour mesurer son pic de mémoire (RSS).
+
+    python -m benchmarks.bench_ingest --rows 2000000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.outils import pic_rss_mo
+
+# Colonnes réellement utilisées par les pages (projection à la lecture du cache)
+COLONNES_VIZ = ["etiquette_dpe", "etiquette_ges", "conso", "ges", "surface", "zone_clim", "periode", "type_bat"]
+
+VARIANTES = ("read_csv_complet", "ingestion_par_blocs", "lecture_cache")
+
+
+def _worker(variante, csv):
+    import pandas as pd
+
+    from dpe.ingest import cache_path, ingest_csv, read_dataset
+
+    t0 = time.perf_counter()
+    if variante == "read_csv_complet":
+        df = pd.read_csv(csv)
+    elif variante == "ingestion_par_blocs":
+        ingest_csv(csv)
+        df = read_dataset(cache_path(csv), columns=COLONNES_VIZ)
+    else:
+        df = read_dataset(cache_path(csv), columns=COLONNES_VIZ)
+    duree = time.perf_counter() - t0
+    return {
+        "secondes": duree,
+        "pic_rss_mo": pic_rss_mo(),
+        "memoire_dataframe_mo": df.memory_usage(deep=True).sum() / 2**20,
+    }
+
+
+def _mesure(variante, csv):
+    sortie = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_ingest", "--worker", variante, str(csv)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(sortie.stdout)
+
+
+def run(rows=2_000_000, colonnes_inutiles=60, dossier=None):
+    from benchmarks.synthetic import ademe_frame
+
+    with tempfile.TemporaryDirectory(dir=dossier) as tmp:
+        csv = Path(tmp) / "dpe_synthetique.csv"
+        ademe_frame(rows, colonnes_inutiles=colonnes_inutiles).to_csv(csv, index=False)
+        resultats = {"lignes": rows, "taille_csv_mo": csv.stat().st_size / 2**20}
+        # L'ordre compte : la lecture du cache suppose l'ingestion déjà faite
+        for variante in VARIANTES:
+            resultats[variante] = _mesure(variante, csv)
+        resultats["taille_cache_mo"] = csv.with_suffix(".parquet").stat().st_size / 2**20
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--extra-columns", type=int, default=60)
+    parser.add_argument("--worker", nargs=2, metavar=("VARIANTE", "CSV"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_worker(*args.worker)))
+        return
+
+    res = run(args.rows, args.extra_columns)
+    print(f"{res['lignes']:,} lignes, CSV {res['taille_csv_mo']:.0f} Mo, cache Parquet {res['taille_cache_mo']:.0f} Mo")
+    for variante in VARIANTES:
+        r = res[variante]
+        print(f"{variante:<22} {r['secondes']:>7.2f} s  pic RSS {r['pic_rss_mo']:>7.0f} Mo  DataFrame {r['memoire_dataframe_mo']:>6.0f} Mo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Coût de l'instrumentation (dpe.instrumentation), désactivée puis activée :
+appel d'une fonction décorée par `chronometre` et bloc `with chrono(...)`
+comparés à l'appel nu, relevé de mémoire, et rerun complet de la page
+Présentation sous AppTest (médiane de plusieurs reruns).
+
+L'activation est lue à l'import : chaque configuration tourne dans un processus
+séparé (DPE_DIAGNOSTICS=0, 1, et 1 avec export JSON-lines).
+
+    python -m benchmarks.bench_instrumentation --appels 1000000 --reruns 30
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+CONFIGURATIONS = ("desactivee", "activee", "activee_export")
+
+
+def _ns_par_appel(fonction, appels):
+    # Meilleur de 5 passes : on mesure le coût propre, pas le bruit de la machine
+    meilleur = float("inf")
+    for _ in range(5):
+        t0 = time.perf_counter_ns()
+        fonction(appels)
+        meilleur = min(meilleur, time.perf_counter_ns() - t0)
+    return meilleur / appels
+
+
+def _worker(appels, reruns):
+    from dpe import instrumentation
+
+    def nue(x):
+        return x
+
+    decoree = instrumentation.chronometre("bench")(nue)
+
+    def boucle_nue(n):
+        for i in range(n):
+            nue(i)
+
+    def boucle_decoree(n):
+        for i in range(n):
+            decoree(i)
+
+    def boucle_chrono(n):
+        for i in range(n):
+            with instrumentation.chrono("bench"):
+                nue(i)
+
+    base = _ns_par_appel(boucle_nue, appels)
+    res = {
+        "decoree_ns": _ns_par_appel(boucle_decoree, appels) - base,
+        "chrono_ns": _ns_par_appel(boucle_chrono, appels) - base,
+        "releve_memoire_us": _ns_par_appel(lambda n: [instrumentation.releve_memoire() for _ in range(n)],
+                                           max(1, appels // 100)) / 1000,
+    }
+
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP), default_timeout=120).run()
+    durees = []
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        at.run()
+        durees.append(time.perf_counter() - t0)
+    res["rerun_ms"] = statistics.median(durees) * 1000
+    res["erreurs"] = [e.value for e in at.exception]
+    return res
+
+
+def _mesure(configuration, appels, reruns, dossier):
+    env = {**os.environ, "DPE_DIAGNOSTICS": "0" if configuration == "desactivee" else "1"}
+    env.pop("DPE_METRIQUES", None)
+    if configuration == "activee_export":
+        env["DPE_METRIQUES"] = str(Path(dossier) / "metriques.jsonl")
+    sortie = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_instrumentation", "--worker", "--appels", str(appels),
+         "--reruns", str(reruns)],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(sortie.strip().splitlines()[-1])
+
+
+def run(appels=1_000_000, reruns=30):
+    with tempfile.TemporaryDirectory() as tmp:
+        return {c: _mesure(c, appels, reruns, tmp) for c in CONFIGURATIONS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appels", type=int, default=1_000_000)
+    parser.add_argument("--reruns", type=int, default=30)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_worker(args.appels, args.reruns)))
+        return
+
+    res = run(args.appels, args.reruns)
+    print(f"Surcoût par rapport à l'appel nu ({args.appels:,} appels, meilleur de 5) ; "
+          f"rerun de la page Présentation (médiane de {args.reruns})")
+    for nom, r in res.items():
+        print(f"{nom:<16} décorée {r['decoree_ns']:>7.0f} ns  chrono {r['chrono_ns']:>7.0f} ns  "
+              f"relevé mémoire {r['releve_memoire_us']:>6.1f} µs  rerun {r['rerun_ms']:>6.1f} ms"
+              + (f"  erreurs : {r['erreurs']}" if r["erreurs"] else ""))
+
+
+if __name__ == "__main__":
+    main()
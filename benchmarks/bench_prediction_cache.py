@@ -0,0 +1,106 @@
+"""
+Cache de prédictions du simulateur : taux de hits et latence sur un flux de
+soumissions réaliste (quelques formulaires typiques très fréquents, loi de Zipf),
+cohérence sous accès concurrents et invalidation quand l'artefact est réécrit.
+
+    python -m benchmarks.bench_prediction_cache --soumissions 5000 --formulaires 300 --threads 8
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import formulaire, modele_synthetique
+from dpe.model import ModeleDPE, empreinte_artefact
+from dpe.predictions import CachePredictions
+
+
+def _flux(soumissions, formulaires, seed=0):
+    """Soumissions tirées selon une loi de Zipf parmi `formulaires` formulaires distincts."""
+    rng = np.random.default_rng(seed)
+    distincts = [formulaire(rng) for _ in range(formulaires)]
+    for v in distincts[: formulaires // 2]:
+        v["surface"] = 70.0  # valeur par défaut du formulaire
+    rangs = np.minimum(rng.zipf(1.3, size=soumissions), formulaires) - 1
+    return [distincts[r] for r in rangs]
+
+
+def _latences_ms(fn, flux):
+    durees = []
+    for valeurs in flux:
+        t0 = time.perf_counter()
+        fn(valeurs)
+        durees.append(time.perf_counter() - t0)
+    ms = np.asarray(durees) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)), "moyenne_ms": float(ms.mean())}
+
+
+def run(soumissions=5000, formulaires=300, threads=8, train_rows=20_000, max_entrees=10_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        chemin = Path(tmp) / "modele"
+        modele_synthetique(train_rows).export(chemin)
+        modele = ModeleDPE.load(chemin)
+        flux = _flux(soumissions, formulaires)
+        modele.predict_one(flux[0])
+
+        resultats = {"sans_cache": _latences_ms(modele.predict_one, flux)}
+        cache = CachePredictions(max_entrees)
+        empreinte = empreinte_artefact(chemin)
+        resultats["avec_cache"] = _latences_ms(lambda v: cache.predict_one(modele, v, empreinte), flux)
+        resultats["avec_cache"].update(cache.stats())
+        resultats["empreinte_us"] = _latences_ms(lambda v: empreinte_artefact(chemin), flux[:500])["moyenne_ms"] * 1000
+
+        # Sessions concurrentes : mêmes résultats que sans cache, compteurs cohérents
+        concurrent = CachePredictions(max_entrees)
+        attendus = {id(v): modele.predict_one(v) for v in flux}
+        erreurs = []
+
+        def session(part):
+            for v in part:
+                if concurrent.predict_one(modele, v, empreinte) != attendus[id(v)]:
+                    erreurs.append(v)
+
+        fils = [threading.Thread(target=session, args=(flux[i::threads],)) for i in range(threads)]
+        for f in fils:
+            f.start()
+        for f in fils:
+            f.join()
+        stats = concurrent.stats()
+        resultats["concurrence"] = {"threads": threads, "erreurs": len(erreurs),
+                                    "compteurs_coherents": stats["hits"] + stats["misses"] == len(flux)}
+
+        # Artefact réécrit : l'empreinte change et le cache est vidé
+        ModeleDPE.load(chemin).export(chemin)
+        nouvelle = empreinte_artefact(chemin)
+        cache.predict_one(modele, flux[0], nouvelle)
+        resultats["invalidation"] = {"empreinte_changee": nouvelle != empreinte, **cache.stats()}
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--soumissions", type=int, default=5000)
+    parser.add_argument("--formulaires", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    r = run(args.soumissions, args.formulaires, args.threads, args.train_rows)
+    for nom in ("sans_cache", "avec_cache"):
+        m = r[nom]
+        print(f"{nom:<11} p50 {m['p50_ms']:.3f} ms  p95 {m['p95_ms']:.3f} ms  moyenne {m['moyenne_ms']:.3f} ms")
+    c = r["avec_cache"]
+    print(f"Cache : {c['hits']:,} hits / {c['misses']:,} misses ({c['taux_hits']:.0%}), {c['entrees']:,} entrées")
+    print(f"Empreinte de l'artefact : {r['empreinte_us']:.0f} µs par soumission")
+    k = r["concurrence"]
+    print(f"{k['threads']} sessions concurrentes : {k['erreurs']} écarts, compteurs cohérents : {k['compteurs_coherents']}")
+    i = r["invalidation"]
+    print(f"Artefact réécrit : empreinte changée {i['empreinte_changee']}, invalidations {i['invalidations']}, "
+          f"entrées restantes {i['entrees']}")
+
+
+if __name__ == "__main__":
+    main()
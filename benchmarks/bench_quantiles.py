@@ -0,0 +1,76 @@
+"""
+Rang parmi les logements similaires : construction des esquisses de quantiles,
+taille sur disque, latence d'un rang, erreur de rang mesurée (comparée au rang
+exact calculé sur la base) et à la borne rendue avec chaque rang, et coût
+d'une semaine ajoutée par fusion comparé à une reconstruction.
+
+    python -m benchmarks.bench_quantiles --lignes 2000000 --semaine 100000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import ademe_frame, formulaire
+from dpe.quantiles import SEGMENT, Esquisses, build_quantiles
+
+
+def run(lignes=2_000_000, semaine=100_000, rangs=2000, verifications=200):
+    df = ademe_frame(lignes, seed=0, noms_ademe=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        source, dossier = Path(tmp) / "dpe.parquet", Path(tmp) / "quantiles"
+        df.to_parquet(source)
+        t0 = time.perf_counter()
+        build_quantiles(source, dossier)
+        resultats = {"construction_s": time.perf_counter() - t0,
+                     "taille_ko": (dossier / "effectifs.npy").stat().st_size / 1024}
+        esquisses = Esquisses.open(dossier)
+
+        rng = np.random.default_rng(1)
+        formulaires = [formulaire(rng) for _ in range(rangs)]
+        valeurs = rng.lognormal(5.2, 0.6, size=rangs)
+        t0 = time.perf_counter()
+        for f, v in zip(formulaires, valeurs):
+            esquisses.rang_logement(f, "conso", v)
+        resultats["rang_us"] = (time.perf_counter() - t0) / rangs * 1e6
+
+        ecarts, bornes = [], []
+        for f, v in zip(formulaires[:verifications], valeurs[:verifications]):
+            r = esquisses.rang_logement(f, "conso", v)
+            masque = np.logical_and.reduce([(df[nom] == f[nom]).to_numpy() for nom in SEGMENT if nom in r["segment"]])
+            exact = float((df["conso"].to_numpy()[masque] < v).mean())
+            ecarts.append(abs(r["part"] - exact))
+            bornes.append(r["erreur"])
+        resultats.update({"erreur_p50": float(np.median(ecarts)), "erreur_max": max(ecarts),
+                          "borne_p50": float(np.median(bornes)), "borne_max": max(bornes),
+                          "borne_respectee": all(e <= b + 1e-12 for e, b in zip(ecarts, bornes))})
+
+        # Semaine suivante : fusion dans les esquisses existantes, ou reconstruction complète
+        nouveaux = ademe_frame(semaine, seed=2, noms_ademe=False)
+        t0 = time.perf_counter()
+        Esquisses.open(dossier, mmap=False).fusionne(Esquisses.depuis(nouveaux)).save(dossier)
+        resultats["fusion_s"] = time.perf_counter() - t0
+        resultats["reconstruction_s"] = resultats["construction_s"] * (lignes + semaine) / lignes
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lignes", type=int, default=2_000_000)
+    parser.add_argument("--semaine", type=int, default=100_000)
+    args = parser.parse_args()
+
+    r = run(args.lignes, args.semaine)
+    print(f"Construction ({args.lignes:,} DPE) : {r['construction_s']:.1f} s, esquisses {r['taille_ko']:.0f} Ko")
+    print(f"Rang d'un logement : {r['rang_us']:.0f} µs")
+    print(f"Erreur de rang : p50 {r['erreur_p50']:.2%}  max {r['erreur_max']:.2%} "
+          f"(borne rendue : p50 {r['borne_p50']:.2%}  max {r['borne_max']:.2%}, "
+          f"{'toujours respectée' if r['borne_respectee'] else 'DÉPASSÉE'})")
+    print(f"Semaine de {args.semaine:,} DPE : fusion {r['fusion_s'] * 1000:.0f} ms "
+          f"(reconstruction estimée {r['reconstruction_s']:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
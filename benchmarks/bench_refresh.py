@@ -0,0 +1,117 @@
+"""
+Mise à jour hebdomadaire incrémentale : durée en fonction de la taille de
+l'historique et du delta, et vérification que le cube mis à jour est identique
+à un cube reconstruit de zéro.
+
+    python -m benchmarks.bench_refresh --base-rows 500000 2000000 --delta-rows 10000 50000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import ademe_frame
+from dpe.cube import (CLES_HISTOGRAMMES, DIMENSIONS, MESURES, aggregate, aggregate_histogrammes, compact, histogrammes_path,
+                      load_cube, load_histogrammes, merge, merge_histogrammes)
+from dpe.refresh import FichierSource, Registre, init, update
+
+
+def _historique(rows, part_remplaces=0.01):
+    """Base synthétique dont une part des DPE en remplace d'autres, comme dans l'export réel."""
+    base = ademe_frame(rows, noms_ademe=False)
+    n = int(rows * part_remplaces)
+    idx = np.random.default_rng(1).choice(rows, size=2 * n, replace=False)
+    base.loc[idx[:n], "numero_dpe_remplace"] = base["numero_dpe"].to_numpy()[idx[n:]]
+    base["date_reception"] = pd.to_datetime(base["date_reception"])
+    return base
+
+
+def _semaine(base, delta_rows, seed):
+    """Delta synthétique : nouveaux DPE, DPE renvoyés corrigés, remplacements et annulations."""
+    rng = np.random.default_rng(seed)
+    # Seuls des DPE encore en vigueur sont renvoyés, remplacés ou annulés
+    en_vigueur = np.flatnonzero(~base["numero_dpe"].isin(base["numero_dpe_remplace"]).to_numpy())
+    nouveaux = ademe_frame(delta_rows, seed=seed, noms_ademe=False)
+    nouveaux["numero_dpe"] = "S" + str(seed) + "_" + nouveaux["numero_dpe"]
+    nouveaux["date_reception"] = "2025-07-01"
+    n_modif = delta_rows // 20
+    idx = rng.choice(en_vigueur, size=3 * n_modif, replace=False)
+    # 1/3 renvoyés avec une conso corrigée, 1/3 remplacés par un nouveau DPE, 1/3 annulés
+    corriges = base.iloc[idx[:n_modif]].copy()
+    corriges["conso"] = corriges["conso"] * 0.8
+    corriges["date_reception"] = "2025-07-02"
+    nouveaux.loc[nouveaux.index[:n_modif], "numero_dpe_remplace"] = base["numero_dpe"].iloc[idx[n_modif:2 * n_modif]].to_numpy()
+    annules = pd.DataFrame({"numero_dpe": base["numero_dpe"].iloc[idx[2 * n_modif:]].to_numpy(), "date_annulation": "2025-07-03"})
+    return pd.concat([nouveaux, corriges], ignore_index=True), annules
+
+
+def _cube_reference(base, delta, annules):
+    """Cube et histogrammes reconstruits de zéro sur la base finale, pour contrôle."""
+    finale = pd.concat([base, delta], ignore_index=True)
+    retires = set(annules["numero_dpe"]) | set(finale["numero_dpe_remplace"].replace("", np.nan).dropna())
+    finale = finale.drop_duplicates("numero_dpe", keep="last")
+    finale = finale[~finale["numero_dpe"].isin(retires)]
+    return compact(merge(aggregate(finale))), merge_histogrammes(aggregate_histogrammes(finale))
+
+
+def _identiques(a, b, cle=DIMENSIONS, mesures=MESURES):
+    cle = list(cle)
+    a = a.astype({d: "string" for d in cle if d != "tranche"}).set_index(cle).sort_index()[list(mesures)]
+    b = b.astype({d: "string" for d in cle if d != "tranche"}).set_index(cle).sort_index()[list(mesures)]
+    return a.index.equals(b.index) and np.allclose(a.to_numpy(np.float64), b.to_numpy(np.float64), rtol=1e-4)
+
+
+def run(base_rows=(500_000, 2_000_000), delta_rows=(10_000, 50_000)):
+    resultats = []
+    for n_base in base_rows:
+        base = _historique(n_base)
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            base.to_parquet(tmp / "base.parquet")
+            t0 = time.perf_counter()
+            init(tmp / "base.parquet", Registre(tmp / "registre"), tmp / "cube.parquet",
+                 quantiles_path=tmp / "quantiles")
+            duree_init = time.perf_counter() - t0
+            for i, n_delta in enumerate(delta_rows):
+                # Chaque mesure repart d'une copie de l'état initial
+                delta, annules = _semaine(base, n_delta, seed=100 + i)
+                delta.to_parquet(tmp / "delta.parquet")
+                annules.to_csv(tmp / "annules.csv", index=False)
+                travail = tmp / f"essai_{i}"
+                shutil.copytree(tmp / "registre", travail / "registre")
+                shutil.copy(tmp / "cube.parquet", travail / "cube.parquet")
+                shutil.copy(histogrammes_path(tmp / "cube.parquet"), histogrammes_path(travail / "cube.parquet"))
+                shutil.copytree(tmp / "quantiles", travail / "quantiles")
+                t0 = time.perf_counter()
+                stats = update(FichierSource(tmp / "delta.parquet", tmp / "annules.csv"),
+                               Registre(travail / "registre"), travail / "cube.parquet", travail / "quantiles")
+                duree = time.perf_counter() - t0
+                delta["date_reception"] = pd.to_datetime(delta["date_reception"])
+                cube, histogrammes = _cube_reference(base, delta, annules)
+                resultats.append({
+                    "lignes_base": n_base, "lignes_delta": len(delta), "init_s": duree_init, "update_s": duree,
+                    "cube_identique": _identiques(load_cube(travail / "cube.parquet"), cube) and _identiques(
+                        load_histogrammes(histogrammes_path(travail / "cube.parquet")), histogrammes,
+                        CLES_HISTOGRAMMES, ("n",)),
+                    **stats,
+                })
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-rows", type=int, nargs="+", default=[500_000, 2_000_000])
+    parser.add_argument("--delta-rows", type=int, nargs="+", default=[10_000, 50_000])
+    args = parser.parse_args()
+
+    print(f"{'historique':>11} {'delta':>8} {'init':>8} {'update':>8}  cube identique")
+    for r in run(args.base_rows, args.delta_rows):
+        print(f"{r['lignes_base']:>11,} {r['lignes_delta']:>8,} {r['init_s']:>7.1f}s {r['update_s']:>7.2f}s  {r['cube_identique']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Scénarios de rénovation : nombre de scénarios par logement et latence de
+l'évaluation complète (énumération, appel unique au modèle, étiquetage, choix
+des parcours), comparée à une boucle de `predict_one` sur les mêmes scénarios.
+
+    python -m benchmarks.bench_renovation --logements 50 --train-rows 20000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import formulaire, modele_synthetique
+from dpe.renovation import LEVIERS, evalue, meilleurs_parcours
+
+
+def run(logements=50, train_rows=20_000, boucle=5):
+    modele = modele_synthetique(train_rows)
+    rng = np.random.default_rng(0)
+    formulaires = [formulaire(rng) for _ in range(logements)]
+    modele.predict_one(formulaires[0])
+
+    n_scenarios, lot_ms, etapes = [], [], []
+    for valeurs in formulaires:
+        t0 = time.perf_counter()
+        df, durees = evalue(modele, valeurs)
+        meilleurs_parcours(df)
+        lot_ms.append((time.perf_counter() - t0) * 1000)
+        n_scenarios.append(len(df))
+        etapes.append(durees)
+
+    # Référence : un appel au modèle par scénario, sur les premiers logements
+    boucle_ms = []
+    for valeurs in formulaires[:boucle]:
+        df, _ = evalue(modele, valeurs)
+        t0 = time.perf_counter()
+        for ligne in df[list(LEVIERS)].to_dict("records"):
+            modele.predict_one({**valeurs, **ligne})
+        boucle_ms.append((time.perf_counter() - t0) * 1000)
+
+    lot_ms = np.asarray(lot_ms)
+    return {
+        "scenarios_median": float(np.median(n_scenarios)),
+        "scenarios_max": int(max(n_scenarios)),
+        "lot_p50_ms": float(np.percentile(lot_ms, 50)),
+        "lot_p95_ms": float(np.percentile(lot_ms, 95)),
+        **{cle: float(np.median([e[cle] for e in etapes])) for cle in etapes[0]},
+        "boucle_p50_ms": float(np.median(boucle_ms)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logements", type=int, default=50)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    r = run(args.logements, args.train_rows)
+    print(f"Scénarios par logement : médiane {r['scenarios_median']:.0f}, max {r['scenarios_max']}")
+    print(f"Évaluation en lot      : p50 {r['lot_p50_ms']:.0f} ms  p95 {r['lot_p95_ms']:.0f} ms")
+    print(f"  énumération {r['enumeration_ms']:.0f} ms, modèle {r['prediction_ms']:.0f} ms, étiquetage {r['etiquetage_ms']:.1f} ms")
+    print(f"Boucle predict_one     : p50 {r['boucle_p50_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
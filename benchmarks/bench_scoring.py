@@ -0,0 +1,59 @@
+"""
+Notation en masse : débit (lignes/s) et débit par cœur selon le nombre de
+processus, jusqu'à tous les cœurs de la machine. Vérifie aussi que la sortie
+est identique quel que soit le nombre de processus.
+
+    python -m benchmarks.bench_scoring --rows 1000000 --train-rows 50000 --trees 500
+"""
+import argparse
+import filecmp
+import os
+import tempfile
+from pathlib import Path
+
+from benchmarks.synthetic import ademe_frame, modele_synthetique
+from dpe.scoring import score_csv
+
+
+def _paliers(max_processes):
+    paliers, p = [], 1
+    while p < max_processes:
+        paliers.append(p)
+        p *= 2
+    return paliers + [max_processes]
+
+
+def run(rows=200_000, train_rows=20_000, trees=100, processes=None, taille_lot=50_000):
+    processes = processes or _paliers(os.cpu_count())
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        modele_synthetique(train_rows, n_estimators=trees).export(tmp / "modele")
+        ademe_frame(rows, seed=1, noms_ademe=False).to_csv(tmp / "parc.csv", index=False)
+        resultats = {}
+        for p in processes:
+            stats = score_csv(tmp / "parc.csv", tmp / f"note_{p}.csv", tmp / "modele", processes=p, taille_lot=taille_lot)
+            stats["identique"] = filecmp.cmp(tmp / f"note_{processes[0]}.csv", tmp / f"note_{p}.csv", shallow=False)
+            resultats[p] = stats
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--processes", type=int, nargs="+", default=None)
+    parser.add_argument("--taille-lot", type=int, default=50_000)
+    args = parser.parse_args()
+
+    resultats = run(args.rows, args.train_rows, args.trees, args.processes, args.taille_lot)
+    base = next(iter(resultats.values()))["lignes_par_s"]
+    print(f"{args.rows:,} logements, {args.trees} arbres, {os.cpu_count()} cœurs disponibles")
+    print(f"{'processus':>9}{'lignes/s':>12}{'lignes/s/cœur':>15}{'accélération':>14}{'sortie identique':>18}")
+    for p, r in resultats.items():
+        print(f"{p:>9}{r['lignes_par_s']:>12,.0f}{r['lignes_par_s'] / p:>15,.0f}{r['lignes_par_s'] / base:>14.2f}"
+              f"{'oui' if r['identique'] else 'NON':>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Service HTTP de notation : débit et latences des appels unitaires (clients
+concurrents en keep-alive), débit des lots selon le format (JSON par lignes,
+JSON par colonnes, Arrow IPC) et taille des échanges, et coût du transport
+comparé au client en processus.
+
+    python -m benchmarks.bench_service --clients 1 8 32 --duree 5 --lot 1000
+"""
+import argparse
+import http.client
+import io
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import ademe_frame, formulaire, modele_synthetique
+from dpe.service import ARROW, JSON, ClientLocal, ServiceDPE, serveur
+
+
+def _unitaires(port, formulaires, clients, duree):
+    """`clients` connexions keep-alive qui enchaînent les POST /v1/predict pendant `duree` s."""
+    latences = [[] for _ in range(clients)]
+    depart = threading.Barrier(clients + 1)
+    fin = [0.0]
+
+    def client(i):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        rng = np.random.default_rng(i)
+        depart.wait()
+        while time.perf_counter() < fin[0]:
+            corps = formulaires[rng.integers(len(formulaires))]
+            t0 = time.perf_counter()
+            conn.request("POST", "/v1/predict", corps, {"Content-Type": JSON})
+            reponse = conn.getresponse()
+            reponse.read()
+            latences[i].append(time.perf_counter() - t0)
+            assert reponse.status == 200
+        conn.close()
+
+    fils = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for f in fils:
+        f.start()
+    fin[0] = time.perf_counter() + duree
+    depart.wait()
+    for f in fils:
+        f.join()
+    ms = np.concatenate([np.asarray(l) for l in latences]) * 1000
+    return {"requetes_par_s": len(ms) / duree, "p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99))}
+
+
+def _corps_lots(df):
+    import pyarrow as pa
+
+    # Côté client, les modalités sont envoyées en colonnes dictionnaire (catégorielles)
+    categorielles = df.astype({nom: "category" for nom in df.select_dtypes(exclude="number").columns})
+    table = pa.Table.from_pandas(categorielles, preserve_index=False)
+    tampon = io.BytesIO()
+    with pa.ipc.new_stream(tampon, table.schema) as flux:
+        flux.write_table(table)
+    return {
+        "json_lignes": (JSON, json.dumps({"logements": df.to_dict("records")}).encode()),
+        "json_colonnes": (JSON, json.dumps({nom: df[nom].tolist() for nom in df.columns}).encode()),
+        "arrow": (ARROW, tampon.getvalue()),
+    }
+
+
+def _lots(port, corps, repetitions, lignes):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    resultats = {}
+    for nom, (type_contenu, donnees) in corps.items():
+        durees = []
+        for _ in range(repetitions):
+            t0 = time.perf_counter()
+            conn.request("POST", "/v1/predict/batch", donnees, {"Content-Type": type_contenu})
+            reponse = conn.getresponse()
+            contenu = reponse.read()
+            durees.append(time.perf_counter() - t0)
+            assert reponse.status == 200, contenu
+        resultats[nom] = {"requete_octets": len(donnees), "reponse_octets": len(contenu),
+                          "p50_ms": float(np.median(durees) * 1000),
+                          "logements_par_s": lignes / float(np.median(durees))}
+    conn.close()
+    return resultats
+
+
+def run(clients=(1, 8, 32), duree=5.0, lot=1000, repetitions=10, train_rows=20_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        chemin = Path(tmp) / "modele"
+        modele = modele_synthetique(train_rows)
+        modele.export(chemin)
+        service = ServiceDPE(chemin)
+        httpd = serveur(service, port=0)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        port = httpd.server_address[1]
+        try:
+            rng = np.random.default_rng(0)
+            formulaires = [json.dumps(formulaire(rng)).encode() for _ in range(50_000)]
+            resultats = {"unitaire_http": {n: _unitaires(port, formulaires, n, duree) for n in clients}}
+
+            local = ClientLocal(service)
+            t0, n = time.perf_counter(), 0
+            while time.perf_counter() - t0 < duree:
+                local.post("/v1/predict", data=formulaires[-1 - n])
+                n += 1
+            resultats["unitaire_local_req_par_s"] = n / (time.perf_counter() - t0)
+
+            df = ademe_frame(lot, seed=1, noms_ademe=False)[list(modele.features)]
+            resultats["lots"] = _lots(port, _corps_lots(df), repetitions, lot)
+            resultats["cache"] = service.cache.stats()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duree", type=float, default=5.0)
+    parser.add_argument("--lot", type=int, default=1000)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    r = run(args.clients, args.duree, args.lot, train_rows=args.train_rows)
+    print("POST /v1/predict (keep-alive)")
+    for n, m in r["unitaire_http"].items():
+        print(f"  {n:>3} clients  {m['requetes_par_s']:>8,.0f} req/s  p50 {m['p50_ms']:.2f} ms  p99 {m['p99_ms']:.2f} ms")
+    print(f"  client en processus : {r['unitaire_local_req_par_s']:,.0f} req/s")
+    print(f"POST /v1/predict/batch ({args.lot} logements)")
+    for nom, m in r["lots"].items():
+        print(f"  {nom:<14} requête {m['requete_octets']:>9,} o  réponse {m['reponse_octets']:>7,} o  "
+              f"p50 {m['p50_ms']:>7.1f} ms  {m['logements_par_s']:>9,.0f} logements/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Latence d'une prédiction du simulateur (un logement) avec la forêt de 500 arbres.
+
+Compare l'encodeur précompilé à la construction d'un DataFrame par soumission.
+
+    python -m benchmarks.bench_simulator --repeat 500
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import formulaire, modele_synthetique
+
+
+def _percentiles(durees):
+    ms = np.asarray(durees) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)), "p99_ms": float(np.percentile(ms, 99))}
+
+
+def latences(fn, entrees, warmup=20):
+    for x in entrees[:warmup]:
+        fn(x)
+    durees = []
+    for x in entrees:
+        t0 = time.perf_counter()
+        fn(x)
+        durees.append(time.perf_counter() - t0)
+    return _percentiles(durees)
+
+
+def run(repeat=500, train_rows=20_000, modele=None):
+    if modele is None:
+        modele = modele_synthetique(train_rows)
+    rng = np.random.default_rng(1)
+    entrees = [formulaire(rng) for _ in range(repeat)]
+
+    def via_dataframe(valeurs):
+        # Chemin naïf : un DataFrame par soumission puis la forêt sklearn arbre par arbre
+        return modele.pipeline.predict(modele.encoder.encode_frame(pd.DataFrame([valeurs])))
+
+    return {
+        "arbres": len(modele.pipeline[-1].estimators_),
+        "encodeur_seul": latences(modele.encoder.encode_one, entrees),
+        "dataframe_par_soumission": latences(via_dataframe, entrees),
+        "encodeur_foret_compilee": latences(modele.predict_one, entrees),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--train-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    res = run(args.repeat, args.train_rows)
+    print(f"Forêt de {res['arbres']} arbres, {args.repeat} prédictions unitaires")
+    for nom in ("encodeur_seul", "dataframe_par_soumission", "encodeur_foret_compilee"):
+        r = res[nom]
+        print(f"{nom:<26} p50 {r['p50_ms']:7.3f} ms  p95 {r['p95_ms']:7.3f} ms  p99 {r['p99_ms']:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Démarrage à froid de l'application : temps jusqu'au premier rendu et coût du
+premier affichage de chaque page (imports paresseux compris).
+
+Chaque page est mesurée dans un processus neuf, avec DPE_PROFILE=1 et AppTest :
+la page Présentation est rendue d'abord (c'est la page d'accueil), puis la page
+mesurée. Les imports les plus coûteux relevés par dpe.profiling sont affichés.
+
+    python -m benchmarks.bench_startup --top 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+PAGES = ("🏁 Présentation", "📊 Dataviz", "📈 Résultats d'entraînement", "🧮 Simulateur DPE")
+
+
+def _worker(page):
+    from streamlit.testing.v1 import AppTest
+
+    from dpe import profiling
+
+    at = AppTest.from_file(str(APP), default_timeout=120).run()
+    accueil = time.perf_counter() - profiling.DEMARRAGE
+    if page != PAGES[0]:
+        at.sidebar.radio[0].set_value(page).run()
+    print(json.dumps({
+        "premier_rendu_s": accueil,
+        "page": profiling.PAGES.get(page, {}),
+        "imports": profiling.IMPORTS,
+        "erreurs": [e.value for e in at.exception],
+    }))
+
+
+def _mesure(page):
+    env = {**os.environ, "DPE_PROFILE": "1"}
+    sortie = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--worker", page],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(sortie.strip().splitlines()[-1])
+
+
+def run():
+    return {page: _mesure(page) for page in PAGES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return _worker(args.worker)
+
+    resultats = run()
+    print(f"{'page':<28}{'accueil (s)':>12}{'1er rendu page (ms)':>22}")
+    for page, r in resultats.items():
+        print(f"{page:<28}{r['premier_rendu_s']:>12.2f}{r['page'].get('premier_s', float('nan')) * 1000:>22.0f}")
+        if r["erreurs"]:
+            print(f"  erreurs : {r['erreurs']}")
+    for page, r in resultats.items():
+        print(f"\nImports les plus coûteux ({page})")
+        for nom, duree in sorted(r["imports"].items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {nom:<32}{duree * 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
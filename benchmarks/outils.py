@@ -0,0 +1,48 @@
+"""Outils de mesure partagés par les benchmarks."""
+import resource
+
+
+def _status_proc(cle):
+    try:
+        with open("/proc/self/status") as f:
+            for ligne in f:
+                if ligne.startswith(cle):
+                    return int(ligne.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def pic_rss_mo():
+    """
+    Pic de mémoire résidente du processus, en Mo.
+    VmHWM est remis à zéro par exec(), contrairement à ru_maxrss qui hérite
+    du pic du processus parent : on le préfère quand /proc est disponible.
+    """
+    pic = _status_proc("VmHWM:")
+    return pic if pic is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss_mo():
+    """Mémoire résidente courante du processus, en Mo (Linux uniquement, sinon le pic)."""
+    rss = _status_proc("VmRSS:")
+    return rss if rss is not None else pic_rss_mo()
+
+
+def memoire_partagee_mo():
+    """
+    Répartition de la mémoire du processus (Mo) d'après /proc/self/smaps_rollup :
+    `pss` compte les pages partagées au prorata des processus qui les utilisent,
+    `privee` les pages propres au processus. Vide hors Linux.
+    """
+    champs = {"Pss:": "pss", "Private_Clean:": "privee", "Private_Dirty:": "privee"}
+    res = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for ligne in f:
+                cle = ligne.split(":")[0] + ":"
+                if cle in champs:
+                    res[champs[cle]] = res.get(champs[cle], 0) + int(ligne.split()[1]) / 1024
+    except OSError:
+        pass
+    return res
@@ -0,0 +1,298 @@
+"""
+Suite de non-régression des performances de l'application, hors ligne.
+
+Une arborescence de travail est construite dans un dossier temporaire à partir
+de données synthétiques au format ADEME : export CSV, petit modèle compilé,
+métriques, cube de la page Dataviz, esquisses de quantiles et index des
+comparables (les images sont celles du dépôt). Deux processus neufs y mesurent
+ensuite :
+
+- les fonctions de app.py, chargé en mode « bare » : `get_classe_dpe` (scalaire)
+  et `dpe.classes.classes_dpe` (lot), `load_viz_data` (ingestion du CSV, relecture
+  du cache Parquet, hit), `load_model` (chargement, hit), prédiction unitaire et
+  par lot, génération de l'étiquette SVG ;
+- le rendu headless de chaque page sous AppTest : premier affichage (imports
+  paresseux compris), reruns, et soumission du formulaire du simulateur.
+
+Les résultats sont écrits en JSON et comparés à une baseline enregistrée : une
+mesure plus lente que la baseline de plus de `--tolerance` est une régression
+(code de sortie 1). La baseline ne vaut que pour la machine et les paramètres
+qui l'ont produite : sinon les écarts sont affichés à titre indicatif, sans
+régression ni échec, et il faut d'abord enregistrer une baseline sur place.
+
+    python -m benchmarks.suite                          # mesure et compare à benchmarks/baseline.json
+    python -m benchmarks.suite --enregistrer-baseline   # remplace la baseline
+    python -m benchmarks.suite --lignes 200000 --tolerance 0.5 --sortie resultats.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RACINE = Path(__file__).resolve().parent.parent
+APP = RACINE / "app.py"
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+RESULTATS_PATH = Path(__file__).resolve().parent / "resultats.json"
+
+PAGES = {
+    "presentation": "🏁 Présentation",
+    "dataviz": "📊 Dataviz",
+    "results": "📈 Résultats d'entraînement",
+    "simulator": "🧮 Simulateur DPE",
+}
+
+# Écart relatif toléré avant de signaler une régression
+TOLERANCE = 0.3
+
+
+def _mediane(fonction, repetitions, statistique=statistics.median):
+    """Durée médiane d'un appel, en secondes (`statistique=min` : meilleur appel, pour les boucles de micro-mesure)."""
+    durees = []
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - t0)
+    return statistique(durees)
+
+
+def preparer(dossier: Path, lignes=100_000, arbres=50):
+    """Construit dans `dossier` les fichiers que l'application lit (chemins relatifs au dossier courant)."""
+    from benchmarks.synthetic import ademe_frame, modele_synthetique
+    from dpe.comparables import COMPARABLES_PATH, build_index
+    from dpe.cube import CUBE_PATH, build_cube
+    from dpe.evaluation import METRIQUES_PATH, evaluate
+    from dpe.ingest import ingest_csv
+    from dpe.model import MODEL_PATH
+    from dpe.quantiles import QUANTILES_PATH, build_quantiles
+
+    dossier = Path(dossier)
+    (dossier / "data").mkdir(parents=True, exist_ok=True)
+    (dossier / "img").symlink_to(RACINE / "img", target_is_directory=True)
+    source = dossier / "data" / "dpe_synthetique.csv"
+    ademe_frame(lignes, seed=0).to_csv(source, index=False)
+    cache = ingest_csv(source)
+    modele_synthetique(20_000, n_estimators=arbres, max_depth=14).export(dossier / MODEL_PATH)
+    test = dossier / "data" / "test.parquet"
+    ademe_frame(20_000, seed=7, noms_ademe=False).to_parquet(test)
+    evaluate(test, dossier / MODEL_PATH, dossier / METRIQUES_PATH, processes=1)
+    build_cube(cache, dossier / CUBE_PATH)
+    build_quantiles(cache, dossier / QUANTILES_PATH)
+    build_index(cache, dossier / COMPARABLES_PATH)
+    return source
+
+
+def _fonctions(source, repetitions):
+    import runpy
+
+    import numpy as np
+
+    from benchmarks.synthetic import ademe_frame, conso_ges, formulaire
+    from dpe.classes import classes_dpe
+    from dpe.ingest import cache_path
+    from dpe.model import MODEL_PATH, empreinte_artefact
+
+    # app.py exécuté hors serveur : les appels Streamlit sont inertes, les fonctions sont celles de l'application
+    app = runpy.run_path(str(APP), run_name="app_benchmark")
+    mesures = {}
+
+    conso, ges = conso_ges(1_000_000, seed=1)
+    paires = list(zip(conso[:10_000].tolist(), ges[:10_000].tolist()))
+    get_classe_dpe = app["get_classe_dpe"]
+    mesures["classe_dpe_scalaire_us"] = _mediane(
+        lambda: [get_classe_dpe(c, g) for c, g in paires], repetitions, min) / len(paires) * 1e6
+    mesures["classe_dpe_lot_1m_ms"] = _mediane(lambda: classes_dpe(conso, ges), repetitions) * 1000
+
+    load_viz_data = app["load_viz_data"]
+
+    def ingestion():
+        cache_path(source).unlink(missing_ok=True)
+        load_viz_data.clear()
+        load_viz_data(source)
+
+    def relecture():
+        load_viz_data.clear()
+        load_viz_data(source)
+
+    mesures["load_viz_data_csv_ms"] = _mediane(ingestion, max(1, repetitions // 3)) * 1000
+    mesures["load_viz_data_parquet_ms"] = _mediane(relecture, repetitions) * 1000
+    mesures["load_viz_data_hit_us"] = _mediane(lambda: load_viz_data(source), repetitions) * 1e6
+
+    load_model = app["load_model"]
+    empreinte = empreinte_artefact(MODEL_PATH)
+
+    def chargement():
+        load_model.clear()
+        load_model(MODEL_PATH, empreinte)
+
+    mesures["load_model_ms"] = _mediane(chargement, repetitions) * 1000
+    mesures["load_model_hit_us"] = _mediane(lambda: load_model(MODEL_PATH, empreinte), repetitions) * 1e6
+
+    modele = load_model(MODEL_PATH, empreinte)
+    rng = np.random.default_rng(0)
+    formulaires = [formulaire(rng) for _ in range(200)]
+    mesures["prediction_unitaire_us"] = _mediane(
+        lambda: [modele.predict_one(v) for v in formulaires], repetitions, min) / len(formulaires) * 1e6
+    lot = ademe_frame(10_000, seed=5, noms_ademe=False)
+    mesures["prediction_lot_10k_ms"] = _mediane(lambda: modele.predict_frame(lot), repetitions) * 1000
+
+    # Étiquette hors cache lru : c'est le coût d'un logement jamais simulé
+    render_label_svg = app["render_label_svg"].__wrapped__
+    etiquettes = [(round(c), round(g), get_classe_dpe(round(c), round(g))) for c, g in paires[:200]]
+    mesures["etiquette_svg_us"] = _mediane(
+        lambda: [render_label_svg(*e) for e in etiquettes], repetitions, min) / len(etiquettes) * 1e6
+    return mesures
+
+
+def _pages(repetitions):
+    from streamlit.testing.v1 import AppTest
+
+    mesures, erreurs = {}, {}
+    t0 = time.perf_counter()
+    at = AppTest.from_file(str(APP), default_timeout=300).run()
+    mesures["page_presentation_premier_ms"] = (time.perf_counter() - t0) * 1000
+    for nom, libelle in PAGES.items():
+        if nom != "presentation":
+            t0 = time.perf_counter()
+            at.sidebar.radio[0].set_value(libelle).run()
+            mesures[f"page_{nom}_premier_ms"] = (time.perf_counter() - t0) * 1000
+        mesures[f"page_{nom}_rerun_ms"] = _mediane(at.run, repetitions) * 1000
+        if nom == "simulator":
+            # Première soumission (modèle, index, explicateur à charger), puis formulaire déjà vu
+            t0 = time.perf_counter()
+            at.button[0].click().run()
+            mesures["page_simulator_soumission_premiere_ms"] = (time.perf_counter() - t0) * 1000
+            mesures["page_simulator_soumission_ms"] = _mediane(lambda: at.button[0].click().run(), repetitions) * 1000
+        if at.exception:
+            erreurs[nom] = [e.value for e in at.exception]
+    return mesures, erreurs
+
+
+def _worker(mode, source, repetitions):
+    if mode == "fonctions":
+        return {"mesures": _fonctions(Path(source), repetitions), "erreurs": {}}
+    mesures, erreurs = _pages(repetitions)
+    return {"mesures": mesures, "erreurs": erreurs}
+
+
+def _mesure(mode, dossier, source, repetitions):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(RACINE), os.environ.get("PYTHONPATH")])),
+           "STREAMLIT_LOGGER_LEVEL": "error"}
+    for variable in ("DPE_PROFILE", "DPE_DIAGNOSTICS", "DPE_METRIQUES"):
+        env.pop(variable, None)
+    sortie = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--worker", mode, str(source), "--repetitions", str(repetitions)],
+        cwd=dossier, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(sortie.strip().splitlines()[-1])
+
+
+def run(lignes=100_000, arbres=50, repetitions=15) -> dict:
+    """Mesures de la suite, avec la description de la machine et des paramètres."""
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = preparer(Path(tmp), lignes, arbres)
+        preparation = time.perf_counter() - t0
+        fonctions = _mesure("fonctions", tmp, source, repetitions)
+        pages = _mesure("pages", tmp, source, repetitions)
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"processeurs": os.cpu_count(), "python": platform.python_version(),
+                    "plateforme": platform.platform(), "processeur": platform.processor() or platform.machine()},
+        "parametres": {"lignes": lignes, "arbres": arbres, "repetitions": repetitions},
+        "preparation_s": round(preparation, 1),
+        "mesures": {nom: round(v, 3) for nom, v in {**fonctions["mesures"], **pages["mesures"]}.items()},
+        "erreurs": pages["erreurs"],
+    }
+
+
+def compare(resultats: dict, baseline: dict, tolerance=TOLERANCE) -> dict:
+    """
+    Rapport nouvelle mesure / baseline pour chaque mesure commune, et les régressions au-delà de
+    la tolérance. Une baseline d'une autre machine ou d'autres paramètres n'est pas comparable :
+    les mesures plus lentes sont alors seulement signalées (`ecarts`), jamais comptées en régression.
+    """
+    ratios = {nom: v / baseline["mesures"][nom] for nom, v in resultats["mesures"].items()
+              if baseline["mesures"].get(nom)}
+    meme_machine = resultats["machine"] == baseline["machine"]
+    memes_parametres = resultats["parametres"] == baseline["parametres"]
+    plus_lentes = sorted(nom for nom, r in ratios.items() if r > 1 + tolerance)
+    comparable = meme_machine and memes_parametres
+    return {
+        "ratios": ratios,
+        "regressions": plus_lentes if comparable else [],
+        "ecarts": [] if comparable else plus_lentes,
+        "ameliorations": sorted(nom for nom, r in ratios.items() if r < 1 / (1 + tolerance)),
+        "nouvelles": sorted(set(resultats["mesures"]) - set(baseline["mesures"])),
+        "disparues": sorted(set(baseline["mesures"]) - set(resultats["mesures"])),
+        "meme_machine": meme_machine,
+        "memes_parametres": memes_parametres,
+        "comparable": comparable,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lignes", type=int, default=100_000, help="DPE synthétiques de la base de travail")
+    parser.add_argument("--arbres", type=int, default=50, help="arbres du modèle de test")
+    parser.add_argument("--repetitions", type=int, default=15)
+    parser.add_argument("--sortie", type=Path, default=RESULTATS_PATH)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="écart relatif toléré (0.3 : +30 %%)")
+    parser.add_argument("--enregistrer-baseline", action="store_true", help="écrit les résultats comme nouvelle baseline")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "SOURCE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_worker(*args.worker, args.repetitions)))
+        return
+
+    resultats = run(args.lignes, args.arbres, args.repetitions)
+    texte = json.dumps(resultats, ensure_ascii=False, indent=1)
+    args.sortie.write_text(texte)
+    if args.enregistrer_baseline:
+        args.baseline.write_text(texte)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() and not args.enregistrer_baseline else None
+    rapport = compare(resultats, baseline, args.tolerance) if baseline else None
+    print(f"{args.lignes:,} DPE synthétiques, modèle de {args.arbres} arbres, médiane de {args.repetitions} "
+          f"(préparation {resultats['preparation_s']:.0f} s) : {args.sortie}")
+    for nom, valeur in resultats["mesures"].items():
+        ligne = f"{nom:<40}{valeur:>12.3f}"
+        if rapport and nom in rapport["ratios"]:
+            r = rapport["ratios"][nom]
+            ligne += f"{baseline['mesures'][nom]:>12.3f}  ×{r:.2f}"
+            ligne += ("  RÉGRESSION" if nom in rapport["regressions"] else "  plus lent" if nom in rapport["ecarts"]
+                      else "  amélioration" if nom in rapport["ameliorations"] else "")
+        print(ligne)
+    for page, erreurs in resultats["erreurs"].items():
+        print(f"Erreurs sur la page {page} : {erreurs}")
+
+    if args.enregistrer_baseline:
+        print(f"Baseline enregistrée : {args.baseline}")
+    elif rapport is None:
+        print(f"Pas de baseline ({args.baseline}) : relancer avec --enregistrer-baseline pour en créer une.")
+    else:
+        if rapport["nouvelles"]:
+            print(f"Mesures absentes de la baseline : {', '.join(rapport['nouvelles'])}")
+        if rapport["comparable"]:
+            print(f"{len(rapport['regressions'])} régression(s) au-delà de +{args.tolerance:.0%} : "
+                  f"{', '.join(rapport['regressions']) or 'aucune'}")
+        else:
+            differences = [quoi for quoi, meme in (("machine", rapport["meme_machine"]),
+                                                   ("paramètres", rapport["memes_parametres"])) if not meme]
+            print(f"Baseline non comparable ({', '.join(differences)} différents : {baseline['machine']}, "
+                  f"{baseline['parametres']}) : {len(rapport['ecarts'])} mesure(s) plus lente(s) de plus de "
+                  f"+{args.tolerance:.0%}, à titre indicatif, sans régression comptée. Enregistrer d'abord une "
+                  f"baseline ici avec ces paramètres : --enregistrer-baseline.")
+    if resultats["erreurs"] or (rapport and rapport["regressions"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Générateurs de données synthétiques au format ADEME pour les benchmarks."""
+import numpy as np
+
+
+def conso_ges(n, seed=0):
+    """Consommations (kWh/m²/an) et émissions (kgCO₂/m²/an) plausibles pour `n` logements."""
+    rng = np.random.default_rng(seed)
+    conso = rng.lognormal(mean=5.2, sigma=0.45, size=n).astype(np.float32)
+    ges = (conso * rng.uniform(0.02, 0.3, size=n)).astype(np.float32)
+    return conso, ges
+
+
+_DEPARTEMENTS = [f"{i:02d}" for i in range(1, 96) if i != 20] + ["2A", "2B"]
+_REGIONS = ["11", "24", "27", "28", "32", "44", "52", "53", "75", "76", "84", "93", "94"]
+
+
+def ademe_frame(n, seed=0, colonnes_inutiles=0, noms_ademe=True):
+    """
+    Jeu de `n` DPE synthétiques au format de l'export ADEME.
+    `colonnes_inutiles` ajoute des colonnes hors schéma, comme dans l'export réel.
+    """
+    import pandas as pd
+
+    from dpe.classes import CLASSES, classes_dpe_codes
+    from dpe.schema import COLONNES_ADEME, VOCABULAIRE
+
+    rng = np.random.default_rng(seed)
+    codes = {nom: rng.integers(0, len(modalites), size=n) for nom, modalites in VOCABULAIRE.items()}
+    surface = rng.gamma(4.0, 20.0, size=n) + 9
+    # Consommation liée aux caractéristiques, pour que les modèles aient un signal à apprendre
+    conso = (
+        70
+        + 28 * (6 - codes["periode"])
+        + 30 * (codes["iso_env"] == 0) - 12 * codes["iso_env"]
+        + 10 * (codes["iso_mur"] == 1) + 8 * (codes["iso_toit"] == 1)
+        + 25 * (codes["zone_clim"] == 0) + 15 * codes["altitude"]
+        + np.array([20, 0, -60, 45, 10])[codes["generateur_chauff"]]
+        + 1500 / surface
+    ) * rng.lognormal(0, 0.25, size=n)
+    conso = np.clip(conso, 5, None)
+    ges = conso * np.array([0.03, 0.2, 0.3, 0.03, 0.1])[codes["energie_chauff"]] * rng.lognormal(0, 0.2, size=n)
+    dept = rng.integers(0, len(_DEPARTEMENTS), size=n)
+    jours = rng.integers(0, 4 * 365, size=n)
+    # Département cohérent avec la zone climatique, comme dans la base réelle : les
+    # départements hors zone sont retirés par un générateur à part, pour que le flux
+    # de `rng` (et donc les autres colonnes) reste celui des benchmarks antérieurs
+    zones = np.arange(len(_DEPARTEMENTS)) * 3 // len(_DEPARTEMENTS)
+    hors_zone = zones[dept] != codes["zone_clim"]
+    zone = codes["zone_clim"][hors_zone]
+    dept[hors_zone] = np.random.default_rng([seed, 1]).integers(
+        np.searchsorted(zones, zone), np.searchsorted(zones, zone, side="right"))
+    donnees = {
+        "numero_dpe": np.char.add("21", np.char.zfill(np.arange(n).astype(str), 11)),
+        "numero_dpe_remplace": np.full(n, "", dtype=object),
+        "date_reception": (np.datetime64("2021-07-01") + jours).astype(str),
+        "etiquette_dpe": np.array(list(CLASSES))[classes_dpe_codes(conso, ges)],
+        "etiquette_ges": np.array(list(CLASSES))[classes_dpe_codes(0, ges)],
+        "conso": conso.round(1),
+        "ges": ges.round(1),
+        "surface": surface.round(1),
+        "departement": np.array(_DEPARTEMENTS)[dept],
+        "region": np.array(_REGIONS)[dept % len(_REGIONS)],
+    }
+    for nom, modalites in VOCABULAIRE.items():
+        donnees[nom] = np.array(modalites)[codes[nom]]
+    df = pd.DataFrame(donnees)
+    for i in range(colonnes_inutiles):
+        df[f"colonne_hors_schema_{i}"] = rng.random(n).round(3)
+    if noms_ademe:
+        df = df.rename(columns={court: ademe for ademe, court in COLONNES_ADEME.items()})
+    return df
+
+
+def formulaire(rng=None):
+    """Valeurs d'un formulaire du simulateur tirées au hasard dans le vocabulaire."""
+    from dpe.schema import VOCABULAIRE
+
+    rng = rng or np.random.default_rng(0)
+    valeurs = {nom: modalites[rng.integers(len(modalites))] for nom, modalites in VOCABULAIRE.items()}
+    valeurs["surface"] = float(rng.integers(9, 250))
+    return valeurs
+
+
+def modele_synthetique(rows=20_000, seed=0, **params):
+    """Modèle du simulateur entraîné sur `rows` DPE synthétiques (500 arbres, profondeur 20 par défaut)."""
+    from dpe.model import fit_model
+
+    return fit_model(ademe_frame(rows, seed, noms_ademe=False), **params)
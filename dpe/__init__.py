@@ -0,0 +1 @@
+"""Briques métier du projet DPE, utilisables hors de Streamlit (jobs, benchmarks)."""
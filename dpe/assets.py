@@ -0,0 +1,196 @@
+"""
+Images statiques de la page Dataviz : variantes redimensionnées et cache d'octets.
+
+Pour chaque PNG de `img/` plus large qu'une largeur d'affichage (pleine largeur
+ou demi-colonne de la mise en page « wide »), une variante réduite à cette
+largeur est écrite dans `img/web/` (ignoré par git) : au premier affichage par
+`image()`, ou d'avance par `python -m dpe.assets` (étape de build). Une image
+déjà assez étroite n'a pas de variante, l'original est servi tel quel.
+
+Les variantes restent en couleurs pleines (PNG optimisé) ; elles ne passent en
+palette que si l'image a au plus 256 couleurs (transparence comprise) : la
+palette est alors faite de ces couleurs exactes, et gardée seulement si l'image
+relue en palette est identique pixel à pixel.
+st.image transmet le PNG tel quel (un WebP serait réencodé en PNG à chaque appel).
+
+À l'exécution, `image(nom, largeur)` sert les octets depuis un cache LRU borné
+en taille, partagé par toutes les sessions : après le premier affichage, plus
+aucun accès disque.
+
+    python -m dpe.assets
+"""
+import argparse
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+IMG_DIR = Path("img")
+VARIANTES_DIR = IMG_DIR / "web"
+# Largeurs CSS de la zone principale en mise en page « wide » (écran 1920 px)
+LARGEURS = {"pleine": 1400, "demi": 700}
+# Une réduction de moins de 20 % ne gagne rien une fois réencodée : l'original est servi
+REDUCTION_MIN = 1.25
+COULEURS_PALETTE = 256
+TAILLE_CACHE = 32 * 2**20
+
+
+def chemin_variante(nom, largeur, dossier=VARIANTES_DIR):
+    return Path(dossier) / f"{Path(nom).stem}.{largeur}.png"
+
+
+def _ecrit(cible, ecriture):
+    # Écriture atomique : plusieurs sessions peuvent générer la même variante
+    cible.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=cible.parent, prefix=f".{cible.name}.", suffix=".tmp", delete=False) as tmp:
+        try:
+            ecriture(tmp)
+            tmp.close()
+            os.replace(tmp.name, cible)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+
+
+def _palette(im):
+    """`im` (RGB ou RGBA) en palette de ses couleurs exactes, ou None si elle en a trop ou que l'aller-retour perd quelque chose."""
+    import numpy as np
+    from PIL import Image
+
+    if im.getcolors(COULEURS_PALETTE) is None:
+        return None
+    pixels = np.asarray(im)
+    canaux = pixels.shape[2]
+    cles = sum(pixels[..., k].astype(np.uint32) << (8 * k) for k in range(canaux))
+    couleurs, indices = np.unique(cles, return_inverse=True)
+    palette = Image.fromarray(indices.reshape(cles.shape).astype(np.uint8), "P")
+    palette.putpalette(np.stack([(couleurs >> (8 * k)) & 255 for k in range(canaux)], axis=1).astype(np.uint8).tobytes(),
+                       im.mode)
+    return palette if np.array_equal(np.asarray(palette.convert(im.mode)), pixels) else None
+
+
+def variante(original, largeur, sortie=VARIANTES_DIR, largeurs=LARGEURS):
+    """Chemin de la variante de `original` pour `largeur`, écrite si besoin ; None si l'original convient.
+
+    Une variante qui ne pèse pas moins que l'original est remplacée par un
+    fichier vide, pour ne pas la recalculer à chaque démarrage.
+    """
+    from PIL import Image
+
+    original = Path(original)
+    cible = chemin_variante(original.name, largeur, sortie)
+    if not (cible.is_file() and cible.stat().st_mtime >= original.stat().st_mtime):
+        px = largeurs[largeur]
+        with Image.open(original) as im:
+            # Jamais d'agrandissement, ni de copie à peine réduite de l'original
+            if im.width <= px * REDUCTION_MIN:
+                return None
+            im = im.convert("RGBA" if im.mode not in ("RGB", "RGBA") else im.mode)
+            im = im.resize((px, round(im.height * px / im.width)), Image.LANCZOS)
+        # Palette seulement si elle ne perd rien (quantize n'est pas exact, surtout avec la transparence)
+        im = _palette(im) or im
+        tampon = io.BytesIO()
+        im.save(tampon, "PNG", optimize=True)
+        donnees = tampon.getvalue()
+        if len(donnees) >= original.stat().st_size:
+            donnees = b""
+        _ecrit(cible, lambda f: f.write(donnees))
+    return cible if cible.stat().st_size else None
+
+
+def build_variantes(source=IMG_DIR, sortie=VARIANTES_DIR, largeurs=LARGEURS):
+    """Génère les variantes utiles de toutes les images PNG de `source` ; renvoie {fichier: (octets avant, après)}."""
+    tailles = {}
+    for original in sorted(Path(source).glob("*.png")):
+        for largeur in largeurs:
+            cible = variante(original, largeur, sortie, largeurs)
+            if cible is not None:
+                tailles[cible.name] = (original.stat().st_size, cible.stat().st_size)
+    return tailles
+
+
+def _chemin(nom, largeur):
+    original = IMG_DIR / nom
+    if not original.is_file():
+        return None
+    try:
+        return variante(original, largeur) or original
+    except (ImportError, OSError, ValueError):
+        # Pillow absent, dossier en lecture seule, image illisible : l'original fait l'affaire
+        return original
+
+
+class CacheOctets:
+    """Cache LRU d'octets borné par la taille totale, sûr entre threads (sessions Streamlit)."""
+
+    def __init__(self, max_octets=TAILLE_CACHE):
+        self.max_octets = max_octets
+        self.octets = 0
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def get(self, cle):
+        with self._verrou:
+            donnees = self._entrees.get(cle)
+            if donnees is not None:
+                self._entrees.move_to_end(cle)
+            return donnees
+
+    def put(self, cle, donnees):
+        if len(donnees) > self.max_octets:
+            return
+        with self._verrou:
+            ancien = self._entrees.pop(cle, None)
+            if ancien is not None:
+                self.octets -= len(ancien)
+            self._entrees[cle] = donnees
+            self.octets += len(donnees)
+            while self.octets > self.max_octets:
+                _, evince = self._entrees.popitem(last=False)
+                self.octets -= len(evince)
+
+    def clear(self):
+        with self._verrou:
+            self._entrees.clear()
+            self.octets = 0
+
+    def __len__(self):
+        return len(self._entrees)
+
+
+CACHE = CacheOctets()
+
+
+def image(nom, largeur="pleine", cache=CACHE):
+    """Octets de l'image `nom` pour la largeur d'affichage donnée ; None si l'image n'existe pas.
+
+    L'absence d'une image est aussi mise en cache (octets vides) : une image
+    ajoutée après le démarrage n'apparaît qu'après `CACHE.clear()`.
+    """
+    cle = (nom, largeur)
+    donnees = cache.get(cle)
+    if donnees is None:
+        chemin = _chemin(nom, largeur)
+        donnees = chemin.read_bytes() if chemin is not None else b""
+        cache.put(cle, donnees)
+    return donnees or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère les variantes redimensionnées des images de la page Dataviz.")
+    parser.add_argument("source", type=Path, nargs="?", default=IMG_DIR)
+    parser.add_argument("sortie", type=Path, nargs="?", default=VARIANTES_DIR)
+    args = parser.parse_args()
+    tailles = build_variantes(args.source, args.sortie)
+    print(f"{len(tailles)} variantes (les images assez étroites sont servies telles quelles)")
+    for largeur in LARGEURS:
+        avant = sum(a for f, (a, _) in tailles.items() if f.endswith(f".{largeur}.png"))
+        apres = sum(b for f, (_, b) in tailles.items() if f.endswith(f".{largeur}.png"))
+        print(f"{largeur:<7} {avant / 1024:,.0f} Ko -> {apres / 1024:,.0f} Ko")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+File d'inférence par micro-lots, partagée par toutes les sessions du processus.
+
+Une forêt coûte presque autant pour 1 ligne que pour quelques dizaines : le
+parcours des arbres est vectorisé sur les lignes. Plutôt que de laisser chaque
+session appeler `predict` sur une seule ligne, les demandes simultanées sont
+regroupées : dès que plusieurs sessions sont actives, un fil collecteur attend
+au plus `attente_max_ms` après la première demande (ou jusqu'à `max_lot`
+lignes), lance un seul `predict` sur le lot dans un pool borné de `workers`
+threads, puis rend à chaque session ses lignes. Tant que tous les workers sont
+occupés, les demandes s'accumulent et le lot suivant n'en est que plus gros.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+MAX_LOT = 64
+ATTENTE_MAX_MS = 2.0
+WORKERS = 2
+
+
+class FileFermee(RuntimeError):
+    """La file a été fermée : la demande n'est pas acceptée (l'appelant doit passer par une file ouverte)."""
+
+
+class FileInference:
+    """Regroupe les appels concurrents à `predict(X) -> (n, k)` en lots."""
+
+    def __init__(self, predict, max_lot=MAX_LOT, attente_max_ms=ATTENTE_MAX_MS, workers=WORKERS):
+        self._predict = predict
+        self.max_lot = max_lot
+        self.attente_max = attente_max_ms / 1000
+        self.lots = 0
+        self.lignes = 0
+        self.plus_gros_lot = 0
+        self._file = queue.SimpleQueue()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="dpe-inference")
+        self._libres = threading.Semaphore(workers)
+        self._verrou = threading.Lock()
+        # Protège le drapeau de fermeture : aucune demande ne peut entrer après la sentinelle de fin
+        self._ouverture = threading.Lock()
+        self.fermee = False
+        self._collecteur = threading.Thread(target=self._boucle, name="dpe-collecteur", daemon=True)
+        self._collecteur.start()
+
+    def soumettre(self, X: np.ndarray) -> Future:
+        """Ajoute les lignes de `X` à la file ; le Future reçoit leurs prédictions. FileFermee si la file est fermée."""
+        futur = Future()
+        with self._ouverture:
+            if self.fermee:
+                raise FileFermee("File d'inférence fermée")
+            self._file.put((np.asarray(X), futur, time.perf_counter()))
+        return futur
+
+    def predict(self, X: np.ndarray, timeout=None) -> np.ndarray:
+        """Même contrat que `ModeleDPE.predict`, servi par le prochain lot."""
+        return self.soumettre(X).result(timeout)
+
+    def _boucle(self):
+        concurrence = False
+        while True:
+            demande = self._file.get()
+            if demande is None:
+                return
+            # On attend un worker libre avant de fermer le lot : pendant ce temps, la file se remplit
+            self._libres.acquire()
+            lot, n = [demande], len(demande[0])
+            # Attente seulement si le lot précédent regroupait déjà plusieurs demandes : une
+            # session seule n'a personne avec qui partager son lot et ne doit pas patienter
+            echeance = demande[2] + (self.attente_max if concurrence else 0)
+            while n < self.max_lot:
+                try:
+                    suivante = self._file.get(timeout=max(echeance - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if suivante is None:
+                    self._file.put(None)
+                    break
+                lot.append(suivante)
+                n += len(suivante[0])
+            concurrence = len(lot) > 1
+            self._pool.submit(self._execute, lot)
+
+    def _execute(self, lot):
+        try:
+            pred = self._predict(np.concatenate([X for X, _, _ in lot]))
+            debut = 0
+            for X, futur, _ in lot:
+                futur.set_result(pred[debut:debut + len(X)])
+                debut += len(X)
+            with self._verrou:
+                self.lots += 1
+                self.lignes += debut
+                self.plus_gros_lot = max(self.plus_gros_lot, debut)
+        except BaseException as erreur:
+            for _, futur, _ in lot:
+                if not futur.done():
+                    futur.set_exception(erreur)
+        finally:
+            self._libres.release()
+
+    def fermer(self):
+        """
+        Traite les demandes en attente puis arrête le collecteur et les workers (idempotent).
+        Les demandes soumises ensuite lèvent FileFermee au lieu d'attendre un collecteur arrêté.
+        """
+        with self._ouverture:
+            if self.fermee:
+                return
+            self.fermee = True
+            self._file.put(None)
+        self._collecteur.join()
+        self._pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._verrou:
+            return {"lots": self.lots, "lignes": self.lignes, "plus_gros_lot": self.plus_gros_lot,
+                    "taille_moyenne": self.lignes / self.lots if self.lots else 0.0}
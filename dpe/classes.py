@@ -0,0 +1,91 @@
+"""
+Étiquetage DPE selon la méthode du double seuil (2021).
+
+Une seule table de seuils sert à la fois au calcul unitaire (formulaire du
+simulateur) et au calcul vectorisé (ré-étiquetage de la base ADEME complète).
+Les prédictions du modèle sont étiquetées après arrondi à l'entier
+(`classe_prediction`, `classes_prediction_codes`), comme elles sont affichées.
+NumPy et pandas ne sont importés que par la version vectorisée : le calcul
+unitaire reste disponible sans eux au démarrage de l'application.
+"""
+from bisect import bisect_right
+
+# Seuils officiels DPE [Conso, GES] : la classe est la première dont la borne
+# (exclue) dépasse la valeur. Au-delà de F, la classe est G.
+SEUILS = {
+    'A': (70, 6),
+    'B': (110, 11),
+    'C': (180, 30),
+    'D': (250, 50),
+    'E': (330, 70),
+    'F': (420, 100),
+}
+CLASSES = "ABCDEFG"
+
+SEUILS_CONSO = tuple(conso for conso, _ in SEUILS.values())
+SEUILS_GES = tuple(ges for _, ges in SEUILS.values())
+
+
+def classe_dpe(conso, ges):
+    """
+    Étiquette d'un seul logement : pire note entre la Conso et le GES.
+    Recherche dichotomique dans la table (une valeur manquante donne G).
+    """
+    idx = max(bisect_right(SEUILS_CONSO, conso), bisect_right(SEUILS_GES, ges))
+    return CLASSES[idx]
+
+
+def classe_ges(ges):
+    """Étiquette climat seule (seuils GES), affichée sur la seconde étiquette."""
+    return CLASSES[bisect_right(SEUILS_GES, ges)]
+
+
+def classes_dpe_codes(conso, ges):
+    """
+    Version tableau : renvoie les codes de classe (0=A ... 6=G) en int8.
+    Accepte des tableaux NumPy, des Series pandas ou des scalaires.
+    """
+    import numpy as np
+
+    conso = np.asarray(conso, dtype=np.float64)
+    ges = np.asarray(ges, dtype=np.float64)
+    idx_conso = np.searchsorted(np.asarray(SEUILS_CONSO, dtype=np.float64), conso, side="right")
+    idx_ges = np.searchsorted(np.asarray(SEUILS_GES, dtype=np.float64), ges, side="right")
+    return np.maximum(idx_conso, idx_ges).astype(np.int8)
+
+
+def classe_prediction(conso, ges):
+    """
+    Étiquette d'une prédiction du modèle : la conso et le GES sont d'abord
+    arrondis à l'entier, comme sur l'étiquette affichée (au pair le plus proche
+    pour les demis, comme `round`), puis classés. Simulateur, service, scoring,
+    rénovation et évaluation suivent tous cette règle : un même logement reçoit
+    la même classe partout, y compris près d'un seuil (250.4 -> 250 -> E).
+    """
+    return classe_dpe(round(float(conso)), round(float(ges)))
+
+
+def classes_prediction_codes(conso, ges):
+    """Version tableau de `classe_prediction` : codes de classe (0=A ... 6=G) en int8, NaN donne G."""
+    import numpy as np
+
+    return classes_dpe_codes(np.round(np.asarray(conso, dtype=np.float64)), np.round(np.asarray(ges, dtype=np.float64)))
+
+
+def classes_dpe(conso, ges):
+    """
+    Étiquettes DPE d'un lot de logements, en catégoriel ordonné (A < ... < G).
+    Si `conso` est une Series, le résultat conserve son index.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes = classes_dpe_codes(conso, ges)
+    labels = pd.Categorical.from_codes(np.atleast_1d(codes), categories=list(CLASSES), ordered=True)
+    if isinstance(conso, pd.Series):
+        return pd.Series(labels, index=conso.index, name="etiquette_dpe")
+    return labels
+
+# Couleurs officielles des étiquettes énergie et climat
+COULEURS = {'A': '#009036', 'B': '#53af31', 'C': '#c6d300', 'D': '#fce600', 'E': '#fbba00', 'F': '#eb6105', 'G': '#d40f14'}
+COULEURS_GES = {'A': '#a4dbf8', 'B': '#8cb4d3', 'C': '#7792b1', 'D': '#5d6f8e', 'E': '#4d5271', 'F': '#393551', 'G': '#281b35'}
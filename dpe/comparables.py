@@ -0,0 +1,274 @@
+"""
+Logements comparables : DPE réels les plus proches d'un formulaire du simulateur.
+
+L'index est construit hors ligne sur la base nettoyée puis ouvert en lecture
+seule par l'application, sans jamais relire la base brute :
+
+* les DPE sont partitionnés par zone climatique, type de bâtiment et période
+  (un comparable partage toujours ces trois modalités) ;
+* dans une partition, chaque DPE est réduit à un vecteur quantifié (codes int8)
+  de ses systèmes et isolations, et les DPE de même vecteur forment un groupe,
+  trié par surface ;
+* la distance au formulaire est la somme pondérée des systèmes différents et de
+  l'écart de surface (en log).
+
+Une recherche calcule le coût de chaque groupe de la partition (une opération
+vectorisée), parcourt les groupes du moins au plus coûteux et n'y lit, par
+dichotomie sur la surface, que les k DPE de surface la plus proche de part et
+d'autre. Elle s'arrête dès qu'aucun groupe restant ne peut battre le k-ième
+voisin : le résultat est exact et ne touche que quelques pages des tableaux.
+
+Tous les tableaux sont des .npy mappés en mémoire (`comparables.json` est écrit
+en dernier et sert d'empreinte).
+
+    python -m dpe.comparables donnees.parquet data/comparables
+"""
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dpe.classes import CLASSES
+from dpe.schema import VOCABULAIRE
+
+COMPARABLES_PATH = Path("data/comparables")
+
+# Modalités communes à tous les comparables d'un logement
+PARTITION = ("zone_clim", "type_bat", "periode")
+
+# Systèmes comparés dans une partition, avec le poids d'une modalité différente
+POIDS = {
+    "generateur_chauff": 2.0,
+    "energie_chauff": 2.0,
+    "iso_env": 1.5,
+    "iso_mur": 1.0,
+    "iso_toit": 1.0,
+    "chauffage_type": 1.0,
+    "emetteur": 0.5,
+    "ecs_type": 0.5,
+    "energie_ecs": 0.5,
+}
+SYSTEMES = tuple(POIDS)
+
+# Poids de l'écart de surface |ln(s / s0)| : 25 % d'écart coûtent autant qu'une isolation différente
+POIDS_SURFACE = 1.0 / np.log(1.25)
+
+# Nombre de comparables rendus par défaut
+K = 5
+
+# Groupes lus par lot lors d'une recherche (le lot double à chaque tour)
+LOT_GROUPES = 64
+
+# Colonnes brutes nécessaires pour construire l'index
+COLONNES_SOURCE = PARTITION + SYSTEMES + (
+    "surface", "conso", "ges", "etiquette_dpe", "etiquette_ges",
+    "numero_dpe", "numero_dpe_remplace", "date_reception", "departement",
+)
+
+# Tableaux par DPE (rangés par partition, groupe puis surface) et tableaux de l'index
+LIGNES = ("surface", "conso", "ges", "etiquettes", "numero_dpe", "departement", "date_reception")
+INDEX = ("groupes", "groupes_debut", "partitions_debut")
+
+
+def _codes(serie, modalites) -> np.ndarray:
+    """Codes int8 des modalités du vocabulaire (-1 pour une modalité absente ou inconnue)."""
+    return pd.Categorical(serie.astype("string"), categories=modalites).codes.astype(np.int8)
+
+
+def _code(valeur, modalites) -> int:
+    """Code d'une valeur du formulaire (-1 hors vocabulaire)."""
+    return modalites.index(valeur) if valeur in modalites else -1
+
+
+def _partition(codes) -> np.ndarray:
+    """Numéro de partition (base mixte sur les vocabulaires de PARTITION)."""
+    p = np.zeros(len(codes[0]), dtype=np.int64)
+    for nom, c in zip(PARTITION, codes):
+        p = p * len(VOCABULAIRE[nom]) + c
+    return p
+
+
+def _n_partitions():
+    return int(np.prod([len(VOCABULAIRE[nom]) for nom in PARTITION]))
+
+
+def empreinte(dossier: Path = COMPARABLES_PATH) -> str:
+    """Empreinte de l'index (taille et date de comparables.json, écrit en dernier)."""
+    dossier = Path(dossier)
+    st = (dossier / "comparables.json").stat()
+    return hashlib.sha256(f"{dossier}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def _bloc(bloc: pd.DataFrame, remplaces: np.ndarray) -> dict:
+    """Lignes retenues d'un bloc de DPE bruts, réduites aux tableaux de l'index."""
+    from dpe.refresh import en_vigueur
+
+    partition = [_codes(bloc[nom], VOCABULAIRE[nom]) for nom in PARTITION]
+    numeriques = {col: pd.to_numeric(bloc[col], errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+                  for col in ("surface", "conso", "ges")}
+    # Base nettoyée : partition connue, mesures plausibles, DPE encore en vigueur
+    garde = np.logical_and.reduce([c >= 0 for c in partition])
+    garde &= (numeriques["surface"] > 0) & (numeriques["conso"] > 0) & (numeriques["ges"] >= 0)
+    garde &= en_vigueur(bloc, remplaces)
+    etiquettes = np.stack([_codes(bloc[col], list(CLASSES)) for col in ("etiquette_dpe", "etiquette_ges")], axis=1)
+    lignes = {
+        "partition": _partition(partition),
+        "systemes": np.stack([_codes(bloc[nom], VOCABULAIRE[nom]) for nom in SYSTEMES], axis=1),
+        **numeriques,
+        "etiquettes": etiquettes,
+        "numero_dpe": bloc["numero_dpe"].astype("string").fillna("").to_numpy(dtype=object).astype("S16"),
+        "departement": bloc["departement"].astype("string").fillna("").to_numpy(dtype=object).astype("S3"),
+        "date_reception": pd.to_datetime(bloc["date_reception"], errors="coerce").to_numpy(dtype="datetime64[D]"),
+    }
+    return {nom: tab[garde] for nom, tab in lignes.items()}
+
+
+def build_index(source: Path, sortie: Path = COMPARABLES_PATH, batch_size=1_000_000) -> dict:
+    """
+    Construit l'index en deux passes par blocs sur la base (CSV ADEME ou cache Parquet) :
+    repérage des DPE remplacés, puis réduction des lignes retenues aux tableaux de l'index.
+    """
+    from dpe.ingest import iter_batches
+    from dpe.refresh import cles_remplacees
+
+    remplaces = cles_remplacees(source, batch_size)
+    blocs = [_bloc(bloc, remplaces) for bloc in iter_batches(source, columns=COLONNES_SOURCE, batch_size=batch_size)]
+    lignes = {nom: np.concatenate([b[nom] for b in blocs]) for nom in blocs[0]}
+    del blocs
+
+    # Signature d'un vecteur de systèmes (base mixte, -1 décalé à 0) : identifie son groupe
+    signature = np.zeros(len(lignes["partition"]), dtype=np.int64)
+    for j, nom in enumerate(SYSTEMES):
+        signature = signature * (len(VOCABULAIRE[nom]) + 1) + lignes["systemes"][:, j] + 1
+    ordre = np.lexsort((lignes["surface"], signature, lignes["partition"]))
+    partition, signature = lignes["partition"][ordre], signature[ordre]
+
+    nouveau = np.ones(len(ordre), dtype=bool)
+    nouveau[1:] = (partition[1:] != partition[:-1]) | (signature[1:] != signature[:-1])
+    debuts = np.flatnonzero(nouveau)
+    # Positions en int32 tant que la base le permet (13.6M lignes aujourd'hui)
+    entiers = np.int32 if len(ordre) < 2**31 else np.int64
+    tableaux = {
+        "groupes": lignes["systemes"][ordre[debuts]],
+        "groupes_debut": np.append(debuts, len(ordre)).astype(entiers),
+        "partitions_debut": np.searchsorted(partition[debuts], np.arange(_n_partitions() + 1)).astype(entiers),
+    }
+    for nom in LIGNES:
+        tableaux[nom] = lignes[nom][ordre]
+
+    sortie = Path(sortie)
+    sortie.mkdir(parents=True, exist_ok=True)
+    # Chaque fichier est remplacé d'un bloc : un processus qui mappe l'ancien index garde ses pages
+    for nom, tab in tableaux.items():
+        tmp = sortie / f"{nom}.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(tab))
+        tmp.replace(sortie / f"{nom}.npy")
+    meta = {
+        "n_dpe": int(len(ordre)),
+        "n_groupes": int(len(debuts)),
+        "n_remplaces": int(len(remplaces)),
+        "partition": list(PARTITION),
+        "systemes": list(SYSTEMES),
+    }
+    tmp = sortie / "comparables.json.tmp"
+    tmp.write_text(json.dumps(meta))
+    tmp.replace(sortie / "comparables.json")
+    return meta
+
+
+class IndexComparables:
+    """Index des DPE réels, ouvert en mémoire mappée ; `voisins` rend les comparables d'un formulaire."""
+
+    def __init__(self, tableaux: dict, meta: dict):
+        self.meta = meta
+        for nom, tab in tableaux.items():
+            setattr(self, nom, tab)
+        self.poids = np.array([POIDS[nom] for nom in SYSTEMES])
+
+    @classmethod
+    def open(cls, dossier: Path = COMPARABLES_PATH, mmap=True) -> "IndexComparables":
+        dossier = Path(dossier)
+        meta = json.loads((dossier / "comparables.json").read_text())
+        if tuple(meta["systemes"]) != SYSTEMES or tuple(meta["partition"]) != PARTITION:
+            raise ValueError(f"Index {dossier} construit pour d'autres caractéristiques : relancer python -m dpe.comparables")
+        mode = "r" if mmap else None
+        return cls({nom: np.load(dossier / f"{nom}.npy", mmap_mode=mode) for nom in INDEX + LIGNES}, meta)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, nom).nbytes for nom in INDEX + LIGNES)
+
+    def voisins(self, valeurs: dict, k: int = K) -> pd.DataFrame:
+        """Les `k` DPE réels les plus proches du formulaire `valeurs`, du plus proche au plus éloigné."""
+        codes = [np.array([_code(valeurs[nom], VOCABULAIRE[nom])]) for nom in PARTITION]
+        if any(c[0] < 0 for c in codes):
+            return self._frame(np.empty(0, dtype=np.int64), np.empty(0))
+        p = int(_partition(codes)[0])
+        g0, g1 = int(self.partitions_debut[p]), int(self.partitions_debut[p + 1])
+        requete = np.array([_code(valeurs[nom], VOCABULAIRE[nom]) for nom in SYSTEMES], dtype=np.int8)
+        couts = (np.asarray(self.groupes[g0:g1]) != requete) @ self.poids
+        debuts = np.asarray(self.groupes_debut[g0:g1 + 1], dtype=np.int64)
+        log_surface = np.log(float(valeurs["surface"]))
+
+        lignes, distances = np.empty(0, dtype=np.int64), np.empty(0)
+        ordre = np.argsort(couts, kind="stable")
+        pos, lot = 0, LOT_GROUPES
+        while pos < len(ordre):
+            # Borne inférieure des groupes restants : le coût du suivant, écart de surface nul
+            if len(lignes) == k and couts[ordre[pos]] >= distances[-1]:
+                break
+            groupes = ordre[pos:pos + lot]
+            pos, lot = pos + len(groupes), 2 * lot
+            r0, r1 = debuts[groupes], debuts[groupes + 1]
+            # Petits groupes : lus en entier ; grands : k DPE de part et d'autre de la surface cherchée
+            grands = np.flatnonzero(r1 - r0 > 2 * k)
+            for g in grands:
+                i = r0[g] + np.searchsorted(self.surface[r0[g]:r1[g]], valeurs["surface"])
+                r0[g], r1[g] = max(r0[g], i - k), min(r1[g], i + k)
+            n = r1 - r0
+            candidates = np.arange(n.sum()) + np.repeat(r0 - np.cumsum(n) + n, n)
+            d = np.repeat(couts[groupes], n) + POIDS_SURFACE * np.abs(np.log(self.surface[candidates]) - log_surface)
+            lignes, distances = np.concatenate([lignes, candidates]), np.concatenate([distances, d])
+            garde = np.argsort(distances, kind="stable")[:k]
+            lignes, distances = lignes[garde], distances[garde]
+        return self._frame(lignes, distances)
+
+    def _frame(self, lignes, distances) -> pd.DataFrame:
+        # Les systèmes d'un DPE sont ceux de son groupe (dernier début de groupe avant la ligne)
+        groupes = np.searchsorted(self.groupes_debut, lignes, side="right") - 1
+        systemes = np.asarray(self.groupes[groupes]).reshape(len(lignes), len(SYSTEMES))
+        etiquettes = np.asarray(self.etiquettes[lignes]).reshape(len(lignes), 2)
+        classes = np.array(list(CLASSES) + [None], dtype=object)
+        df = pd.DataFrame({
+            "numero_dpe": np.char.decode(np.asarray(self.numero_dpe[lignes])),
+            "date_reception": np.asarray(self.date_reception[lignes]),
+            "departement": np.char.decode(np.asarray(self.departement[lignes])),
+            "surface": np.asarray(self.surface[lignes]),
+        })
+        for j, nom in enumerate(SYSTEMES):
+            df[nom] = np.array(VOCABULAIRE[nom] + [None], dtype=object)[systemes[:, j]]
+        df["conso"] = np.asarray(self.conso[lignes])
+        df["ges"] = np.asarray(self.ges[lignes])
+        df["etiquette_dpe"] = classes[etiquettes[:, 0]]
+        df["etiquette_ges"] = classes[etiquettes[:, 1]]
+        df["distance"] = distances
+        return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit l'index des logements comparables du simulateur.")
+    parser.add_argument("source", type=Path, help="CSV ADEME ou cache Parquet")
+    parser.add_argument("sortie", type=Path, nargs="?", default=COMPARABLES_PATH)
+    args = parser.parse_args()
+    meta = build_index(args.source, args.sortie)
+    taille = sum(f.stat().st_size for f in args.sortie.glob("*.npy"))
+    print(f"Index enregistré : {args.sortie} ({meta['n_dpe']:,} DPE en {meta['n_groupes']:,} groupes, "
+          f"{meta['n_remplaces']:,} remplacés écartés, {taille / 2**20:.1f} Mo)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Cube d'agrégats DPE pour la page Dataviz.
+
+Le cube contient, pour chaque combinaison observée des dimensions ci-dessous,
+le nombre de DPE, les sommes de consommation / GES / surface et la répartition
+des étiquettes GES. Les histogrammes de consommation et de surface (effectifs
+par tranche, d'où les graphiques de distribution et des quantiles approchés)
+sont stockés à part, en creux : une ligne par étiquette, combinaison des
+dimensions filtrables de la page et tranche non vide, plutôt qu'une colonne
+par tranche dans chaque cellule du cube (majoritairement des zéros).
+
+Toutes ces mesures sont additives. Quelques mégaoctets suffisent là où la base brute fait
+13.6M lignes : toutes les vues de la page se calculent par masque + somme sur
+le cube, jamais sur les données brutes ni sur une copie filtrée du cube.
+
+    python -m dpe.cube donnees.parquet data/cube_dpe.parquet
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dpe.classes import CLASSES
+
+CUBE_PATH = Path("data/cube_dpe.parquet")
+
+
+def histogrammes_path(cube_path: Path) -> Path:
+    """Fichier des histogrammes, à côté du cube."""
+    cube_path = Path(cube_path)
+    return cube_path.with_name(f"{cube_path.stem}_histogrammes.parquet")
+
+
+HISTOGRAMMES_PATH = histogrammes_path(CUBE_PATH)
+
+DIMENSIONS = (
+    "etiquette_dpe", "departement", "region", "zone_clim", "periode",
+    "type_bat", "energie_chauff", "altitude", "inertie",
+)
+# Dimensions filtrables de la page Dataviz ; les histogrammes ne sont ventilés que par celles-ci et l'étiquette
+DIMENSIONS_FILTRES = ("departement", "zone_clim", "periode", "type_bat", "energie_chauff", "altitude")
+DIMENSIONS_HISTOGRAMMES = ("etiquette_dpe",) + DIMENSIONS_FILTRES
+COLONNES_GES = tuple(f"n_ges_{lettre}" for lettre in CLASSES)
+
+# Bornes basses des tranches des histogrammes ; la dernière tranche reçoit tout ce qui
+# la dépasse. Les seuils des étiquettes (70, 110, 180...) tombent sur des bornes.
+BORNES_CONSO = tuple(range(0, 510, 10))  # kWh/m²/an
+BORNES_SURFACE = tuple(range(0, 260, 10))  # m²
+HISTOGRAMMES = {"conso": BORNES_CONSO, "surface": BORNES_SURFACE}
+# Clé d'une ligne d'histogramme : `tranche` est l'indice de la tranche dans les bornes de `histogramme`
+CLES_HISTOGRAMMES = DIMENSIONS_HISTOGRAMMES + ("histogramme", "tranche")
+
+MESURES = ("n", "conso_sum", "ges_sum", "surface_sum") + COLONNES_GES
+EFFECTIFS = ("n",) + COLONNES_GES
+
+# Colonnes brutes nécessaires pour construire le cube
+COLONNES_SOURCE = DIMENSIONS + ("etiquette_ges", "conso", "ges", "surface")
+
+# Modalité utilisée pour les dimensions manquantes, pour que les effectifs restent exacts
+INCONNU = "Inconnu"
+
+
+def tranches(valeurs, bornes) -> np.ndarray:
+    """Indice de tranche de chaque valeur ; -1 si elle manque ou est sous la première borne."""
+    valeurs = pd.Series(valeurs).astype("float64").to_numpy(na_value=np.nan)
+    indices = np.searchsorted(np.asarray(bornes, dtype="float64"), valeurs, side="right") - 1
+    indices[np.isnan(valeurs)] = -1
+    return indices
+
+
+def aggregate(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrège un bloc de DPE bruts (noms courts) en cellules du cube."""
+    cles = pd.DataFrame({dim: df[dim].astype("string").fillna(INCONNU) for dim in DIMENSIONS})
+    mesures = pd.DataFrame({
+        "n": np.ones(len(df), dtype=np.int64),
+        "conso_sum": df["conso"].astype("float64").fillna(0),
+        "ges_sum": df["ges"].astype("float64").fillna(0),
+        "surface_sum": df["surface"].astype("float64").fillna(0),
+    })
+    ges = df["etiquette_ges"].astype("string")
+    for lettre, col in zip(CLASSES, COLONNES_GES):
+        mesures[col] = (ges == lettre).fillna(False).astype(np.int64)
+    return pd.concat([cles, mesures], axis=1).groupby(list(DIMENSIONS), sort=False).sum().reset_index()
+
+
+def aggregate_histogrammes(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrège un bloc de DPE bruts (noms courts) en lignes d'histogramme : effectif `n` par tranche non vide."""
+    cles = pd.DataFrame({dim: df[dim].astype("string").fillna(INCONNU) for dim in DIMENSIONS_HISTOGRAMMES})
+    parties = []
+    for nom, bornes in HISTOGRAMMES.items():
+        indices = tranches(df[nom], bornes)
+        connues = indices >= 0
+        parties.append(cles[connues].assign(histogramme=nom, tranche=indices[connues].astype(np.int16)))
+    lignes = pd.concat(parties, ignore_index=True)
+    return lignes.groupby(list(CLES_HISTOGRAMMES), sort=False).size().rename("n").reset_index()
+
+
+def _fusionne(tables, cles) -> pd.DataFrame:
+    # Les tables partielles s'additionnent ; les lignes vides (retraits d'une mise à jour) sont retirées.
+    # Les clés passent sur des catégories communes : une table déjà compactée (le cube chargé) n'est
+    # que recodée, sans conversion de ses modalités en chaînes
+    tables = [t.astype({cle: "category" for cle in cles if cle != "tranche"}) for t in tables]
+    types = {}
+    for cle in cles:
+        if cle != "tranche":
+            modalites = pd.Index(np.unique(np.concatenate([t[cle].cat.categories.astype(str) for t in tables])))
+            types[cle] = pd.CategoricalDtype(modalites)
+    table = pd.concat([t.astype(types) for t in tables], ignore_index=True)
+    table = table.groupby(list(cles), observed=True, sort=False).sum().reset_index()
+    table = table[table["n"] > 0].reset_index(drop=True)
+    for cle in types:
+        table[cle] = table[cle].cat.remove_unused_categories()
+    return table
+
+
+def merge(*cubes: pd.DataFrame) -> pd.DataFrame:
+    """Fusionne des cubes partiels (les mesures sont additives). Les cellules vides sont retirées."""
+    return _fusionne(cubes, DIMENSIONS)
+
+
+def merge_histogrammes(*tables: pd.DataFrame) -> pd.DataFrame:
+    """Fusionne des histogrammes partiels, comme `merge`."""
+    return _fusionne(tables, CLES_HISTOGRAMMES)
+
+
+def compact(cube: pd.DataFrame) -> pd.DataFrame:
+    """Types de stockage : dimensions catégorielles, effectifs int32, sommes float32."""
+    types = {dim: "category" for dim in DIMENSIONS}
+    types.update({col: "int32" for col in EFFECTIFS})
+    types.update({col: "float32" for col in ("conso_sum", "ges_sum", "surface_sum")})
+    return cube.astype(types)
+
+
+def compact_histogrammes(histogrammes: pd.DataFrame) -> pd.DataFrame:
+    """Types de stockage des histogrammes : clés catégorielles, tranche int16, effectif int32."""
+    types = {cle: "category" for cle in DIMENSIONS_HISTOGRAMMES + ("histogramme",)}
+    types.update({"tranche": "int16", "n": "int32"})
+    return histogrammes.astype(types)
+
+
+def build_cube(source: Path, sortie: Path = CUBE_PATH, batch_size=1_000_000) -> pd.DataFrame:
+    """
+    Construit le cube et ses histogrammes (`histogrammes_path(sortie)`) en deux passes par
+    blocs sur la base (CSV ADEME ou cache Parquet) : repérage des DPE remplacés, qui ne
+    comptent pas, puis agrégation.
+    """
+    from dpe.ingest import iter_batches
+    from dpe.refresh import cles_remplacees, en_vigueur
+
+    remplaces = cles_remplacees(source, batch_size)
+    partiels, histogrammes = [], []
+    for bloc in iter_batches(source, columns=("numero_dpe",) + COLONNES_SOURCE, batch_size=batch_size):
+        bloc = bloc[en_vigueur(bloc, remplaces)]
+        partiels.append(aggregate(bloc))
+        histogrammes.append(aggregate_histogrammes(bloc))
+        # On refusionne régulièrement pour borner la mémoire des cubes partiels
+        if len(partiels) >= 8:
+            partiels, histogrammes = [merge(*partiels)], [merge_histogrammes(*histogrammes)]
+    cube = compact(merge(*partiels))
+    save_histogrammes(merge_histogrammes(*histogrammes), histogrammes_path(sortie))
+    save_cube(cube, sortie)
+    return cube
+
+
+def _ecrit(table: pd.DataFrame, sortie: Path) -> Path:
+    sortie = Path(sortie)
+    sortie.parent.mkdir(parents=True, exist_ok=True)
+    tmp = sortie.with_suffix(".tmp")
+    table.to_parquet(tmp, compression="zstd", index=False)
+    tmp.replace(sortie)
+    return sortie
+
+
+def save_cube(cube: pd.DataFrame, sortie: Path = CUBE_PATH) -> Path:
+    return _ecrit(compact(cube), sortie)
+
+
+def save_histogrammes(histogrammes: pd.DataFrame, sortie: Path = HISTOGRAMMES_PATH) -> Path:
+    return _ecrit(compact_histogrammes(histogrammes), sortie)
+
+
+def load_cube(path: Path = CUBE_PATH) -> pd.DataFrame:
+    return pd.read_parquet(path)
+
+
+def load_histogrammes(path: Path = HISTOGRAMMES_PATH) -> pd.DataFrame:
+    return pd.read_parquet(path)
+
+
+def masque_filtres(table: pd.DataFrame, filtres: dict) -> np.ndarray:
+    """
+    Masque des lignes (cellules du cube ou lignes d'histogramme) dont chaque dimension filtrée
+    est dans la liste donnée (liste vide = pas de filtre). Les agrégations prennent ce masque
+    plutôt qu'une copie filtrée de la table.
+    """
+    masque = np.ones(len(table), dtype=bool)
+    for dim, valeurs in filtres.items():
+        if valeurs:
+            # Test sur les quelques modalités, puis lecture par code de catégorie
+            codes = _categories(table[dim])
+            masque &= np.append(codes.categories.isin(valeurs), False)[codes.codes.to_numpy()]
+    return masque
+
+
+def _categories(colonne: pd.Series):
+    return (colonne if isinstance(colonne.dtype, pd.CategoricalDtype) else colonne.astype("category")).cat
+
+
+def _groupes(table: pd.DataFrame, by, lignes):
+    """Numéro de groupe des `lignes` (codes des catégories de `by` combinés) et modalités de chaque dimension."""
+    groupes, modalites = 0, []
+    for dim in by:
+        codes = _categories(table[dim])
+        groupes = groupes * len(codes.categories) + codes.codes.to_numpy()[lignes].astype(np.int64)
+        modalites.append(codes.categories)
+    return groupes, modalites
+
+
+def _somme(table: pd.DataFrame, by, colonnes, masque=None) -> pd.DataFrame:
+    """
+    Sommes des `colonnes` par combinaison observée des dimensions `by`, sur les lignes du
+    masque : les codes des catégories sont combinés en un numéro de groupe, puis np.bincount.
+    """
+    lignes = np.flatnonzero(masque) if masque is not None else slice(None)
+    groupes, modalites = _groupes(table, by, lignes)
+    taille = int(np.prod([len(m) for m in modalites]))
+    observes = np.flatnonzero(np.bincount(groupes, minlength=taille))
+    sommes = {col: np.bincount(groupes, weights=table[col].to_numpy()[lignes], minlength=taille)[observes]
+              for col in colonnes}
+    index = pd.MultiIndex.from_product(modalites, names=list(by))[observes]
+    res = pd.DataFrame(sommes, index=index if len(by) > 1 else index.get_level_values(0))
+    return res.astype({col: np.int64 for col in colonnes if col in EFFECTIFS})
+
+
+def rollup(cube: pd.DataFrame, by, mesures=MESURES, masque=None) -> pd.DataFrame:
+    """
+    Somme des `mesures` par `by` (une ou plusieurs dimensions) sur les cellules du masque, avec
+    les moyennes dérivées utilisées par les graphiques quand les sommes correspondantes sont demandées.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    res = _somme(cube, by, mesures, masque).reset_index()
+    for somme, moyenne in (("conso_sum", "conso_moyenne"), ("ges_sum", "ges_moyen"), ("surface_sum", "surface_moyenne")):
+        if somme in res and "n" in res:
+            res[moyenne] = res[somme] / res["n"]
+    return res
+
+
+def crosstab(cube: pd.DataFrame, dim, masque=None) -> pd.DataFrame:
+    """Effectifs par modalité de `dim` (lignes) et étiquette DPE (colonnes A à G), sur les cellules du masque."""
+    lignes = np.flatnonzero(masque) if masque is not None else slice(None)
+    groupes, (modalites, etiquettes) = _groupes(cube, [dim, "etiquette_dpe"], lignes)
+    effectifs = np.bincount(groupes, weights=cube["n"].to_numpy()[lignes], minlength=len(modalites) * len(etiquettes))
+    observees = np.bincount(groupes // len(etiquettes), minlength=len(modalites)) > 0
+    effectifs = pd.DataFrame(effectifs.reshape(len(modalites), -1)[observees].astype(np.int64),
+                             index=pd.Index(modalites[observees], name=dim), columns=etiquettes)
+    return effectifs.reindex(columns=list(CLASSES), fill_value=0)
+
+
+def histogramme(histogrammes: pd.DataFrame, nom, by=None, masque=None):
+    """
+    Effectifs par tranche de l'histogramme `nom` (clé de HISTOGRAMMES) sur les lignes du masque :
+    Series indexée par borne basse, ou DataFrame par modalité de `by` (colonnes : bornes basses).
+    """
+    bornes = HISTOGRAMMES[nom]
+    retenues = (histogrammes["histogramme"] == nom).to_numpy()
+    if masque is not None:
+        retenues = retenues & masque
+    lignes = np.flatnonzero(retenues)
+    tranche = histogrammes["tranche"].to_numpy()[lignes].astype(np.int64)
+    n = histogrammes["n"].to_numpy()[lignes]
+    if by is None:
+        return pd.Series(np.bincount(tranche, weights=n, minlength=len(bornes)).astype(np.int64), index=list(bornes))
+    codes = _categories(histogrammes[by])
+    groupes = codes.codes.to_numpy()[lignes].astype(np.int64) * len(bornes) + tranche
+    effectifs = np.bincount(groupes, weights=n, minlength=len(codes.categories) * len(bornes))
+    effectifs = pd.DataFrame(effectifs.reshape(-1, len(bornes)).astype(np.int64),
+                             index=pd.Index(codes.categories, name=by), columns=list(bornes))
+    return effectifs[effectifs.sum(axis=1) > 0]
+
+
+def quantiles(effectifs, bornes, niveaux=(0.25, 0.5, 0.75)) -> np.ndarray:
+    """
+    Quantiles approchés d'une distribution connue par tranches, par interpolation
+    linéaire dans la tranche (la dernière, ouverte, prend la largeur de la précédente).
+    La précision est celle d'une tranche.
+    """
+    effectifs = np.asarray(effectifs, dtype="float64")
+    bornes = np.asarray(bornes, dtype="float64")
+    hautes = np.append(bornes[1:], bornes[-1] + (bornes[-1] - bornes[-2]))
+    cumul = np.cumsum(effectifs)
+    if cumul[-1] == 0:
+        return np.full(len(niveaux), np.nan)
+    rangs = np.asarray(niveaux, dtype="float64") * cumul[-1]
+    i = np.minimum(np.searchsorted(cumul, rangs, side="left"), len(effectifs) - 1)
+    avant = cumul[i] - effectifs[i]
+    part = np.divide(rangs - avant, effectifs[i], out=np.zeros(len(i)), where=effectifs[i] > 0)
+    return bornes[i] + part * (hautes[i] - bornes[i])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit le cube d'agrégats de la page Dataviz.")
+    parser.add_argument("source", type=Path, help="CSV ADEME ou cache Parquet")
+    parser.add_argument("sortie", type=Path, nargs="?", default=CUBE_PATH)
+    args = parser.parse_args()
+    cube = build_cube(args.source, args.sortie)
+    taille = sum(path.stat().st_size for path in (args.sortie, histogrammes_path(args.sortie))) / 2**20
+    print(f"Cube enregistré : {args.sortie} ({len(cube):,} cellules, {taille:.1f} Mo avec les histogrammes)")
+
+
+if __name__ == "__main__":
+    main()
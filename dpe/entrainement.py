@@ -0,0 +1,151 @@
+"""
+Entraînement hors mémoire du modèle du simulateur.
+
+`python -m dpe.model train` charge toute la base avant d'entraîner, ce qui
+bornait la baseline à 16 colonnes. Ici la base (CSV ADEME ou cache Parquet) est
+parcourue par blocs, encodés en codes catégoriels float32 (FeatureEncoder), et
+chaque bloc entraîne sa part des arbres de la forêt sur ses seules lignes
+(« pasting » : le nombre d'arbres d'un bloc est proportionnel à ses lignes).
+Les arbres d'un bloc sont aussitôt compilés sur disque puis libérés ; les
+parties sont enfin concaténées tableau par tableau (`CompiledForest.assemble`)
+dans le format compilé que charge l'application, table d'explication comprise.
+
+La mémoire de pointe est donc celle d'un bloc et de ses arbres, quelle que soit
+la taille de la base ou le nombre de colonnes. La validation (MAE, R²,
+exactitude de l'étiquette) porte sur un échantillon uniforme de toute la base :
+le nombre de lignes étant connu d'avance, leurs positions sont tirées avant la
+lecture, et chaque bloc ne met de côté que les siennes.
+
+Les blocs suivent l'ordre du fichier : avec l'export ADEME (trié par date de
+réception), chaque arbre voit une période et la forêt les voit toutes.
+
+    python -m dpe.entrainement donnees.parquet --sortie models/modele_dpe --bloc 1000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from dpe.classes import classes_prediction_codes
+from dpe.features import FeatureEncoder
+from dpe.forest import CompiledForest
+from dpe.model import ECHANTILLON_IMPORTANCES, MODEL_PATH, PARAMS_RF, ModeleDPE
+from dpe.schema import CIBLES, FEATURES, VOCABULAIRE
+
+# Lignes par bloc : c'est ce qui borne la mémoire (encodage float32 + arbres du bloc)
+TAILLE_BLOC = 1_000_000
+
+# Part de la base mise de côté pour la validation, plafonnée en lignes
+VALIDATION = 0.02
+VALIDATION_MAX = 200_000
+
+
+def _lignes(source) -> int:
+    import pyarrow.parquet as pq
+
+    from dpe.ingest import _parquet
+
+    return pq.ParquetFile(_parquet(source)).metadata.num_rows
+
+
+def metriques(forest: CompiledForest, X: np.ndarray, y: np.ndarray, lot=50_000) -> dict:
+    """MAE et R² par cible, et exactitude de l'étiquette DPE, sur un jeu encodé."""
+    pred = np.concatenate([forest.predict(X[i:i + lot]) for i in range(0, len(X), lot)])
+    res = {}
+    for k, cible in enumerate(CIBLES):
+        res[f"mae_{cible}"] = float(np.abs(pred[:, k] - y[:, k]).mean())
+        res[f"r2_{cible}"] = float(1 - ((pred[:, k] - y[:, k]) ** 2).sum() / ((y[:, k] - y[:, k].mean()) ** 2).sum())
+    res["exactitude_etiquette"] = float(
+        (classes_prediction_codes(pred[:, 0], pred[:, 1]) == classes_prediction_codes(y[:, 0], y[:, 1])).mean())
+    return res
+
+
+def train_out_of_core(source: Path, sortie: Path = MODEL_PATH, features=FEATURES, vocabulaire=VOCABULAIRE,
+                      bloc=TAILLE_BLOC, validation=VALIDATION, importances=ECHANTILLON_IMPORTANCES,
+                      n_jobs=-1, random_state=42, **params) -> dict:
+    """
+    Entraîne la forêt par blocs et écrit le modèle compilé dans `sortie`.
+    Rend les métriques de validation, la taille de la forêt et la durée.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+
+    from dpe.ingest import iter_batches
+
+    t0 = time.perf_counter()
+    params = {**PARAMS_RF, **params}
+    n_estimators = params.pop("n_estimators")
+    encoder = FeatureEncoder(features, vocabulaire)
+    total, lues = _lignes(source), 0
+    rng = np.random.default_rng(random_state)
+    # Positions des lignes de validation, uniformes sur toute la base (pas seulement les premiers blocs)
+    positions = np.sort(rng.choice(total, size=min(VALIDATION_MAX, round(validation * total)), replace=False))
+    X_val, y_val = [], []
+    sortie = Path(sortie)
+    sortie.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=sortie.parent, prefix=".parties_") as tmp:
+        parties = []
+        for i, df in enumerate(iter_batches(source, columns=list(features) + list(CIBLES), batch_size=bloc)):
+            # Arbres de ce bloc : proportionnels aux lignes lues (la somme vaut n_estimators)
+            arbres = round(n_estimators * (lues + len(df)) / total) - round(n_estimators * lues / total)
+            garde = np.zeros(len(df), dtype=bool)
+            garde[positions[np.searchsorted(positions, lues):np.searchsorted(positions, lues + len(df))] - lues] = True
+            lues += len(df)
+            connues = df[list(CIBLES)].notna().all(axis=1).to_numpy()
+            df, garde = df[connues], garde[connues]
+            X = encoder.encode_frame(df)
+            y = df[list(CIBLES)].to_numpy(dtype=np.float32)
+            del df
+            X_val.append(X[garde])
+            y_val.append(y[garde])
+            if arbres == 0 or not (~garde).any():
+                continue
+            foret = RandomForestRegressor(n_estimators=arbres, n_jobs=n_jobs, random_state=random_state + i, **params)
+            foret.fit(X[~garde], y[~garde])
+            del X, y
+            partie = Path(tmp) / f"partie_{i:05d}"
+            CompiledForest.from_sklearn(foret).save(partie)
+            parties.append(partie)
+            del foret
+        if not parties:
+            raise ValueError(f"Aucune ligne exploitable dans {source}")
+        meta_foret = CompiledForest.assemble(parties, sortie)
+
+    X_val, y_val = np.concatenate(X_val), np.concatenate(y_val)
+    modele = ModeleDPE(None, vocabulaire, features, CIBLES, forest=CompiledForest.open(sortie))
+    # Importances globales sur un tirage de l'échantillon de validation (qui suit l'ordre du fichier)
+    echantillon = X_val[np.sort(rng.choice(len(X_val), size=min(importances, len(X_val)), replace=False))]
+    modele.finalise(sortie, meta_foret, echantillon if importances > 0 and len(echantillon) else None)
+    return {
+        "lignes": lues,
+        "arbres": meta_foret["n_trees"],
+        "noeuds": int(len(modele.forest.feature)),
+        "validation": len(X_val),
+        **metriques(modele.forest, X_val, y_val),
+        "duree_s": time.perf_counter() - t0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entraîne le modèle du simulateur par blocs (mémoire bornée).")
+    parser.add_argument("source", type=Path, help="CSV ADEME ou cache Parquet")
+    parser.add_argument("--sortie", type=Path, default=MODEL_PATH)
+    parser.add_argument("--bloc", type=int, default=TAILLE_BLOC, help="lignes par bloc")
+    parser.add_argument("--n-estimators", type=int, default=PARAMS_RF["n_estimators"])
+    parser.add_argument("--max-depth", type=int, default=PARAMS_RF["max_depth"])
+    parser.add_argument("--importances", type=int, default=ECHANTILLON_IMPORTANCES,
+                        help="logements de validation utilisés pour les importances globales (0 : aucune)")
+    args = parser.parse_args()
+
+    res = train_out_of_core(args.source, args.sortie, bloc=args.bloc, importances=args.importances,
+                            n_estimators=args.n_estimators, max_depth=args.max_depth)
+    print(f"Modèle compilé : {args.sortie} ({res['arbres']} arbres, {res['noeuds']:,} nœuds, "
+          f"{res['lignes']:,} lignes en {res['duree_s']:.0f} s)")
+    print(f"Validation ({res['validation']:,} logements) : MAE conso {res['mae_conso']:.1f}  "
+          f"MAE GES {res['mae_ges']:.2f}  R² conso {res['r2_conso']:.3f}  "
+          f"étiquette exacte {res['exactitude_etiquette']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
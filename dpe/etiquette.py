@@ -0,0 +1,73 @@
+"""
+Rendu local de l'étiquette DPE 2021 (énergie + climat) en SVG.
+
+Remplace l'image distante d'outils.immo : aucune requête sortante, et les
+étiquettes déjà dessinées sont servies depuis un cache LRU en mémoire.
+"""
+from functools import lru_cache
+
+from dpe.classes import CLASSES, COULEURS, COULEURS_GES, SEUILS_CONSO, SEUILS_GES, classe_ges
+
+LARGEUR_PANNEAU = 330
+HAUTEUR_BARRE = 30
+ECART_BARRE = 6
+HAUT = 56
+
+
+def _tranches(seuils):
+    """Libellés des plages de chaque classe : « < 70 », « 70 à 110 », ..., « ≥ 420 »."""
+    bornes = (None,) + tuple(seuils) + (None,)
+    libelles = []
+    for bas, haut in zip(bornes[:-1], bornes[1:]):
+        if bas is None:
+            libelles.append(f"&lt; {haut}")
+        elif haut is None:
+            libelles.append(f"≥ {bas}")
+        else:
+            libelles.append(f"{bas} à {haut}")
+    return libelles
+
+
+def _panneau(x0, titre, unite, valeur, lettre, couleurs, seuils):
+    elements = [
+        f'<text x="{x0}" y="24" font-size="16" font-weight="bold" fill="#222">{titre}</text>',
+        f'<text x="{x0}" y="42" font-size="11" fill="#555">{unite}</text>',
+    ]
+    for i, (classe, tranche) in enumerate(zip(CLASSES, _tranches(seuils))):
+        y = HAUT + i * (HAUTEUR_BARRE + ECART_BARRE)
+        largeur = 110 + 22 * i
+        texte = "#fff" if classe in "ABFG" or couleurs is COULEURS_GES else "#222"
+        elements.append(
+            f'<rect x="{x0}" y="{y}" width="{largeur}" height="{HAUTEUR_BARRE}" rx="4" fill="{couleurs[classe]}"/>'
+            f'<text x="{x0 + 8}" y="{y + 20}" font-size="11" fill="{texte}">{tranche}</text>'
+            f'<text x="{x0 + largeur - 20}" y="{y + 22}" font-size="18" font-weight="bold" fill="{texte}">{classe}</text>'
+        )
+        if classe == lettre:
+            # Classe du logement : barre cerclée et valeur reportée à droite
+            elements.append(
+                f'<rect x="{x0 - 3}" y="{y - 3}" width="{largeur + 6}" height="{HAUTEUR_BARRE + 6}" rx="6" '
+                f'fill="none" stroke="#111" stroke-width="3"/>'
+                f'<polygon points="{x0 + largeur + 12},{y + HAUTEUR_BARRE / 2} {x0 + largeur + 24},{y + 2} '
+                f'{x0 + largeur + 24},{y + HAUTEUR_BARRE - 2}" fill="#111"/>'
+                f'<rect x="{x0 + largeur + 24}" y="{y}" width="70" height="{HAUTEUR_BARRE}" rx="4" fill="#111"/>'
+                f'<text x="{x0 + largeur + 59}" y="{y + 21}" font-size="15" font-weight="bold" fill="#fff" '
+                f'text-anchor="middle">{valeur:.0f}</text>'
+            )
+    return "".join(elements)
+
+
+@lru_cache(maxsize=1024)
+def render_label_svg(conso, ges, lettre) -> str:
+    """
+    Double étiquette DPE : consommation (avec la classe finale `lettre`, issue
+    du double seuil) et émissions de GES (classe climat seule).
+    """
+    hauteur = HAUT + len(CLASSES) * (HAUTEUR_BARRE + ECART_BARRE) + 10
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {2 * LARGEUR_PANNEAU + 20} {hauteur}" '
+        f'font-family="Arial, Helvetica, sans-serif">'
+        f'<rect width="100%" height="100%" fill="#fff"/>'
+        + _panneau(10, "Consommation énergétique", "kWh/m²/an (énergie primaire)", conso, lettre, COULEURS, SEUILS_CONSO)
+        + _panneau(LARGEUR_PANNEAU + 20, "Émissions de GES", "kgCO₂/m²/an", ges, classe_ges(ges), COULEURS_GES, SEUILS_GES)
+        + "</svg>"
+    )
@@ -0,0 +1,204 @@
+"""
+Évaluation du modèle déployé sur un jeu de test, pour la page Résultats.
+
+Le jeu de test (CSV ADEME ou cache Parquet) est lu par blocs ; chaque bloc est
+encodé comme le formulaire puis prédit par un pool de processus qui ouvrent
+tous le modèle compilé mappé en mémoire (comme dpe.scoring). Un processus ne
+renvoie pas ses prédictions, seulement un accumulateur : matrice de confusion
+des étiquettes et sommes d'erreurs par cible (|e|, e², y, y²). Les
+accumulateurs s'additionnent, donc la mémoire est bornée par quelques blocs en
+vol quelle que soit la taille du jeu de test. La forêt compilée somme les arbres
+dans un accumulateur (n, cibles) : la prédiction d'un bloc coûte de l'ordre du
+bloc encodé lui-même, non n x arbres x cibles.
+
+Le résultat est un petit fichier JSON (`models/metriques.json`) que la page
+Résultats charge à la place de chiffres recopiés à la main. Il porte l'empreinte
+du modèle évalué : la page signale des métriques calculées sur un autre modèle.
+
+    python -m dpe.evaluation test.parquet --processes 4
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dpe.classes import CLASSES, classes_prediction_codes
+from dpe.model import MODEL_PATH, ModeleDPE, empreinte_artefact
+
+METRIQUES_PATH = Path("models/metriques.json")
+
+# Pic de prédiction d'un bloc de 100 000 logements : ~9 Mo (bloc encodé 7 Mo), quel que soit le nombre d'arbres
+TAILLE_BLOC = 100_000
+
+# Modèle du processus de travail, ouvert une fois par l'initialiseur du pool
+_MODELE = None
+
+
+def _init_worker(model_path):
+    global _MODELE
+    _MODELE = ModeleDPE.load(model_path)
+
+
+class Accumulateur:
+    """Statistiques additives d'une évaluation : confusion des étiquettes et sommes d'erreurs par cible."""
+
+    def __init__(self, cibles):
+        self.cibles = tuple(cibles)
+        # confusion[vraie, prédite], classes A..G
+        self.confusion = np.zeros((len(CLASSES), len(CLASSES)), dtype=np.int64)
+        # Par cible : n, somme |e|, somme e², somme y, somme y²
+        self.sommes = np.zeros((len(self.cibles), 5), dtype=np.float64)
+
+    def ajoute(self, pred: np.ndarray, y: np.ndarray, etiquettes: np.ndarray):
+        """Ajoute un bloc : prédictions et cibles (n, n_cibles), étiquettes vraies en codes (-1 : inconnue)."""
+        for k in range(len(self.cibles)):
+            ok = ~np.isnan(y[:, k])
+            e = pred[ok, k].astype(np.float64) - y[ok, k]
+            yk = y[ok, k].astype(np.float64)
+            self.sommes[k] += (ok.sum(), np.abs(e).sum(), (e * e).sum(), yk.sum(), (yk * yk).sum())
+        ok = etiquettes >= 0
+        predites = classes_prediction_codes(pred[ok, 0], pred[ok, 1])
+        np.add.at(self.confusion, (etiquettes[ok], predites), 1)
+        return self
+
+    def fusionne(self, autre: "Accumulateur") -> "Accumulateur":
+        self.confusion += autre.confusion
+        self.sommes += autre.sommes
+        return self
+
+    def metriques(self) -> dict:
+        """Métriques de la page Résultats, en types JSON."""
+        regression = {}
+        for cible, (n, abs_e, e2, s, s2) in zip(self.cibles, self.sommes):
+            ss_tot = s2 - s * s / n if n else 0.0
+            regression[cible] = {
+                "n": int(n),
+                "mae": abs_e / n if n else None,
+                "rmse": float(np.sqrt(e2 / n)) if n else None,
+                "r2": 1 - e2 / ss_tot if ss_tot > 0 else None,
+            }
+
+        c = self.confusion
+        n = int(c.sum())
+        support, predits, justes = c.sum(axis=1), c.sum(axis=0), np.diag(c)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(predits > 0, justes / predits, 0.0)
+            rappel = np.where(support > 0, justes / support, 0.0)
+            f1 = np.where(precision + rappel > 0, 2 * precision * rappel / (precision + rappel), 0.0)
+        ecart = np.abs(np.subtract.outer(np.arange(len(CLASSES)), np.arange(len(CLASSES))))
+        return {
+            "regression": regression,
+            "classification": {
+                "n": n,
+                "classes": list(CLASSES),
+                "confusion": c.tolist(),
+                "exactitude": float(justes.sum() / n) if n else None,
+                "f1_pondere": float((f1 * support).sum() / n) if n else None,
+                # Erreurs « à une classe près » (C prédit D...) et étiquette à une classe près
+                "erreurs_une_classe": float(c[ecart == 1].sum() / n) if n else None,
+                "a_une_classe_pres": float(c[ecart <= 1].sum() / n) if n else None,
+                "rapport": {
+                    lettre: {"precision": float(p), "rappel": float(r), "f1": float(f), "support": int(s)}
+                    for lettre, p, r, f, s in zip(CLASSES, precision, rappel, f1, support)
+                },
+            },
+        }
+
+
+def _evalue(X, y, etiquettes):
+    return Accumulateur(_MODELE.cibles).ajoute(_MODELE.predict(X), y, etiquettes)
+
+
+def _blocs(source, modele, taille_bloc):
+    """(X, y, codes des étiquettes vraies) par bloc du jeu de test."""
+    import pyarrow.parquet as pq
+
+    from dpe.ingest import _parquet, iter_batches
+
+    disponibles = set(pq.ParquetFile(_parquet(source)).schema_arrow.names)
+    manquantes = [nom for nom in modele.features + modele.cibles if nom not in disponibles]
+    if manquantes:
+        raise ValueError(f"Colonnes absentes de {source} : {', '.join(manquantes)}")
+    # Étiquette officielle si le jeu la contient, sinon celle des valeurs vraies, arrondies comme les prédictions
+    officielle = "etiquette_dpe" in disponibles
+    colonnes = list(modele.features + modele.cibles) + (["etiquette_dpe"] if officielle else [])
+    for bloc in iter_batches(source, columns=colonnes, batch_size=taille_bloc):
+        y = bloc[list(modele.cibles)].to_numpy(dtype=np.float32, na_value=np.nan)
+        if officielle:
+            etiquettes = pd.Categorical(bloc["etiquette_dpe"].astype("string"), categories=list(CLASSES)).codes
+        else:
+            etiquettes = np.where(np.isnan(y).any(axis=1), -1, classes_prediction_codes(y[:, 0], y[:, 1]))
+        yield modele.encoder.encode_frame(bloc), y, etiquettes.astype(np.int8)
+
+
+def evaluate(source: Path, model_path: Path = MODEL_PATH, sortie: Path = METRIQUES_PATH, processes=None,
+             taille_bloc=TAILLE_BLOC) -> dict:
+    """
+    Évalue le modèle compilé `model_path` sur le jeu `source` et écrit les métriques dans `sortie`.
+    `processes` vaut par défaut le nombre de cœurs ; 1 évalue dans le processus courant.
+    """
+    processes = processes or os.cpu_count()
+    modele = ModeleDPE.load(model_path)
+    total = Accumulateur(modele.cibles)
+    t0 = time.perf_counter()
+    blocs = _blocs(source, modele, taille_bloc)
+    if processes == 1:
+        for X, y, etiquettes in blocs:
+            total.ajoute(modele.predict(X), y, etiquettes)
+    else:
+        with mp.get_context("spawn").Pool(processes, initializer=_init_worker, initargs=(str(model_path),)) as pool:
+            en_vol = deque()
+            for bloc in blocs:
+                en_vol.append(pool.apply_async(_evalue, bloc))
+                # Deux blocs en attente par processus suffisent à les occuper sans lire tout le jeu
+                if len(en_vol) >= 2 * processes:
+                    total.fusionne(en_vol.popleft().get())
+            while en_vol:
+                total.fusionne(en_vol.popleft().get())
+
+    metriques = {
+        "modele": str(model_path),
+        "empreinte": empreinte_artefact(model_path),
+        "n_trees": modele.forest.n_trees,
+        "features": list(modele.features),
+        "jeu_test": str(source),
+        "date": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "secondes": round(time.perf_counter() - t0, 2),
+        "processes": processes,
+        **total.metriques(),
+    }
+    sortie = Path(sortie)
+    sortie.parent.mkdir(parents=True, exist_ok=True)
+    tmp = sortie.with_name(sortie.name + ".tmp")
+    tmp.write_text(json.dumps(metriques, ensure_ascii=False, indent=1))
+    tmp.replace(sortie)
+    return metriques
+
+
+def load_metriques(path: Path = METRIQUES_PATH) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Évalue le modèle déployé et écrit les métriques de la page Résultats.")
+    parser.add_argument("source", type=Path, help="jeu de test : CSV ADEME ou cache Parquet")
+    parser.add_argument("--modele", type=Path, default=MODEL_PATH)
+    parser.add_argument("--sortie", type=Path, default=METRIQUES_PATH)
+    parser.add_argument("--processes", type=int, default=None, help="par défaut, tous les cœurs")
+    parser.add_argument("--taille-bloc", type=int, default=TAILLE_BLOC)
+    args = parser.parse_args()
+    m = evaluate(args.source, args.modele, args.sortie, args.processes, args.taille_bloc)
+    c, r = m["classification"], m["regression"]["conso"]
+    print(f"{c['n']:,} logements en {m['secondes']:.1f} s ({m['processes']} processus) : {args.sortie}")
+    print(f"Étiquette exacte {c['exactitude']:.1%} (à une classe près {c['a_une_classe_pres']:.1%}), "
+          f"F1 pondéré {c['f1_pondere']:.3f} ; conso MAE {r['mae']:.1f}  RMSE {r['rmse']:.1f}  R² {r['r2']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
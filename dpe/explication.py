@@ -0,0 +1,379 @@
+"""
+Explications des prédictions : contribution exacte de chaque caractéristique (TreeSHAP).
+
+Ce sont les valeurs de Shapley « path-dependent » de la forêt (Lundberg et al.,
+TreeSHAP), calculées sans bibliothèque dédiée et vectorisées sur les nœuds :
+
+* pour une feuille de valeur v et une caractéristique i de son chemin, la
+  contribution vaut  v (o_i - z_i) ∫₀¹ Π_{j≠i} (z_j + (o_j - z_j) t) dt,  où z_j
+  est la part des échantillons d'entraînement qui suit le chemin aux nœuds testant
+  j, et o_j vaut 1 si le logement suit le chemin à tous ces nœuds ;
+* l'intégrande est un polynôme de degré < D (nombre de caractéristiques distinctes
+  sur un chemin) : une quadrature de Gauss-Legendre à ceil(D/2) points est exacte ;
+* en descendant les arbres niveau par niveau, on évalue ce produit aux points de
+  quadrature pour chaque nœud ; en remontant, on somme les feuilles et chaque nœud
+  crédite la caractéristique testée par son parent (comme Linear TreeSHAP). Le coût
+  est proportionnel au nombre de nœuds, sans facteur profondeur².
+
+Tout ce qui ne dépend que de la structure des arbres (ordre par niveaux, parts z,
+occurrence précédente de la même caractéristique sur le chemin) est calculé à
+l'export et enregistré avec le modèle, en .npy mappables comme la forêt. Les arbres
+sont traités par blocs : la mémoire de travail reste bornée et une explication
+partielle, sur les premiers arbres, est disponible pendant le calcul.
+"""
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from dpe.predictions import CachePredictions
+
+# Tableaux de la table d'explication : un par nœud, dans l'ordre par niveaux de chaque bloc
+# (nœuds internes d'abord, puis feuilles), plus les bornes des niveaux et les blocs d'arbres
+CHAMPS = ("orig", "parent", "paire", "feature", "seuil", "nan_gauche", "gauche", "z", "prev",
+          "niveaux", "internes", "arbres", "esperances")
+
+# Nombre de nœuds visé par bloc d'arbres : tableaux de travail de quelques Mo
+NOEUDS_PAR_BLOC = 1 << 17
+
+# Blocs calculés en parallèle pour une même explication (NumPy relâche le GIL)
+WORKERS = min(4, os.cpu_count() or 1)
+
+# Explications gardées en mémoire (toutes sessions confondues)
+TAILLE_CACHE = 1000
+
+
+class ExplicateurArbres:
+    """Contributions TreeSHAP d'une forêt compilée, pour un logement déjà encodé."""
+
+    def __init__(self, forest, orig, parent, paire, feature, seuil, nan_gauche, gauche, z, prev,
+                 niveaux, internes, arbres, esperances, n_features, degre, workers=WORKERS):
+        self.forest = forest
+        self.orig = orig
+        self.parent = parent
+        # paire[k] (niveau > 0) : position dans le niveau du k-ième fils, fils rangés par père
+        self.paire = paire
+        self.feature = feature
+        self.seuil = seuil
+        self.nan_gauche = nan_gauche
+        self.gauche = gauche
+        self.z = z
+        self.prev = prev
+        # niveaux[b] : début de chaque niveau du bloc b (dernière valeur = fin du bloc) ;
+        # internes[b] : nombre de nœuds internes de chaque niveau
+        self.niveaux = niveaux
+        self.internes = internes
+        self.arbres = arbres
+        self.esperances = esperances
+        self.n_features = int(n_features)
+        self.degre = int(degre)
+        self.workers = workers
+        # Points et poids de Gauss-Legendre ramenés sur [0, 1], en colonne (calculs en float32)
+        points, poids = np.polynomial.legendre.leggauss(max(1, math.ceil(self.degre / 2)))
+        self._t = ((points + 1) / 2).astype(np.float32)[:, None]
+        self._w = (poids / 2).astype(np.float32)[:, None]
+
+    @property
+    def n_trees(self):
+        return int(np.sum(self.arbres))
+
+    @property
+    def esperance(self) -> np.ndarray:
+        """Valeur de base : prédiction moyenne de la forêt sur ses données d'entraînement."""
+        return np.asarray(self.esperances).sum(axis=0) / self.n_trees
+
+    @classmethod
+    def from_forest(cls, forest, n_features, noeuds_par_bloc=NOEUDS_PAR_BLOC) -> "ExplicateurArbres":
+        """Construit la table d'explication (structure seule, indépendante du logement)."""
+        if forest.cover is None:
+            raise ValueError("Forêt sans poids par nœud : réexporter le modèle depuis le Pipeline sklearn")
+        enfants = np.asarray(forest.children)
+        feature = np.asarray(forest.feature)
+        seuils = np.asarray(forest.threshold)
+        missing_left = np.asarray(forest.missing_left)
+        cover = np.asarray(forest.cover, dtype=np.float64)
+        value = np.asarray(forest.value, dtype=np.float64)
+        roots = np.asarray(forest.roots)
+        n = len(enfants)
+
+        orig = np.empty(n, dtype=np.int32)
+        parent = np.full(n, -1, dtype=np.int32)
+        paire = np.zeros(n, dtype=np.int32)
+        feat = np.zeros(n, dtype=np.int16)
+        seuil = np.zeros(n, dtype=seuils.dtype)
+        nan_gauche = np.zeros(n, dtype=bool)
+        gauche = np.zeros(n, dtype=bool)
+        z = np.ones(n, dtype=np.float32)
+        prev = np.full(n, -1, dtype=np.int32)
+        niveaux, internes, arbres, esperances = [], [], [], []
+        degre = 1
+
+        def internes_dabord(noeuds):
+            return np.argsort(enfants[noeuds, 0] == noeuds, kind="stable")
+
+        position, t0 = 0, 0
+        while t0 < len(roots):
+            t1 = max(t0 + 1, int(np.searchsorted(roots, roots[t0] + noeuds_par_bloc, side="right")))
+            t1 = min(t1, len(roots))
+            debuts, n_internes = [], []
+            ordre = internes_dabord(roots[t0:t1])
+            noeuds = roots[t0:t1][ordre].astype(np.int64)
+            # Par nœud du niveau : part des échantillons qui y arrive, nombre de caractéristiques
+            # distinctes sur le chemin, et `derniers[k, f]` = dernière arête du chemin testant f
+            parts = np.ones(len(noeuds))
+            distinctes = np.zeros(len(noeuds), dtype=np.int32)
+            derniers = np.full((len(noeuds), n_features), -1, dtype=np.int32)
+            z_complet = np.ones(len(noeuds))
+            esperance = np.zeros(value.shape[1])
+            while len(noeuds):
+                debuts.append(position)
+                positions = np.arange(position, position + len(noeuds), dtype=np.int32)
+                orig[positions] = noeuds
+                m = int(np.count_nonzero(enfants[noeuds, 0] != noeuds))
+                n_internes.append(m)
+                # Espérance de chaque arbre : feuilles pondérées par leur part des échantillons
+                esperance += (value[noeuds[m:]] * parts[m:, None]).sum(axis=0)
+                degre = max(degre, int(distinctes.max(initial=0)))
+                position += len(noeuds)
+                if m == 0:
+                    break
+
+                # Niveau suivant : les fils (droit, gauche) des nœuds internes, rangés par père,
+                # puis réordonnés internes d'abord ; `paire` garde le lien fils -> père
+                peres = noeuds[:m]
+                fils = enfants[peres].reshape(-1).astype(np.int64)
+                ordre = internes_dabord(fils)
+                rang = np.empty_like(ordre)
+                rang[ordre] = np.arange(len(ordre))
+                pos_fils = np.arange(position, position + len(fils), dtype=np.int32)
+                paire[pos_fils] = rang
+                f = np.repeat(feature[peres], 2)[ordre]
+                parent[pos_fils] = np.repeat(positions[:m], 2)[ordre]
+                feat[pos_fils] = f
+                seuil[pos_fils] = np.repeat(seuils[peres], 2)[ordre]
+                nan_gauche[pos_fils] = np.repeat(missing_left[peres], 2)[ordre]
+                gauche[pos_fils] = (ordre % 2).astype(bool)
+                ratio = cover[fils[ordre]] / np.repeat(cover[peres], 2)[ordre]
+                derniers = np.repeat(derniers[:m], 2, axis=0)[ordre]
+                k = np.arange(len(fils))
+                precedente = derniers[k, f]
+                derniers[k, f] = pos_fils
+                prev[pos_fils] = precedente
+                a_prev = precedente >= 0
+                # z en float64 pendant la construction, enregistré en float32
+                z_prec = np.where(a_prev, z_complet[np.maximum(precedente - debuts[0], 0)], 1.0)
+                z_complet = np.concatenate([z_complet, ratio * z_prec])
+                z[pos_fils] = z_complet[pos_fils - debuts[0]]
+                parts = np.repeat(parts[:m], 2)[ordre] * ratio
+                distinctes = np.repeat(distinctes[:m], 2)[ordre] + ~a_prev
+                noeuds = fils[ordre]
+            niveaux.append(debuts)
+            internes.append(n_internes)
+            arbres.append(t1 - t0)
+            esperances.append(esperance)
+            t0 = t1
+
+        # Un bloc par ligne ; les niveaux absents valent la fin du bloc et n'ont aucun nœud interne
+        largeur = max(len(d) for d in niveaux) + 1
+        fins = [d[0] for d in niveaux[1:]] + [position]
+        table = np.array([d + [fin] * (largeur - len(d)) for d, fin in zip(niveaux, fins)], dtype=np.int64)
+        internes = np.array([m + [0] * (largeur - 1 - len(m)) for m in internes], dtype=np.int64)
+        return cls(forest, orig, parent, paire, feat, seuil, nan_gauche, gauche, z, prev,
+                   table, internes, np.array(arbres, dtype=np.int32), np.array(esperances), n_features, degre)
+
+    def save(self, dossier: Path):
+        """Enregistre la table en .npy non compressés, chaque fichier remplacé d'un bloc."""
+        dossier = Path(dossier)
+        dossier.mkdir(parents=True, exist_ok=True)
+        for champ in CHAMPS:
+            tmp = dossier / f"{champ}.npy.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(getattr(self, champ)))
+            tmp.replace(dossier / f"{champ}.npy")
+        meta = {"n_features": self.n_features, "degre": self.degre, "n_trees": self.n_trees}
+        (dossier / "explication.json").write_text(json.dumps(meta))
+        return meta
+
+    @classmethod
+    def open(cls, dossier: Path, forest, mmap=True) -> "ExplicateurArbres":
+        dossier = Path(dossier)
+        meta = json.loads((dossier / "explication.json").read_text())
+        mode = "r" if mmap else None
+        tableaux = {champ: np.load(dossier / f"{champ}.npy", mmap_mode=mode) for champ in CHAMPS}
+        return cls(forest, n_features=meta["n_features"], degre=meta["degre"], **tableaux)
+
+    def _bloc(self, x, b) -> np.ndarray:
+        """Somme des contributions (n_features, n_sorties) des arbres du bloc `b`."""
+        t, w = self._t, self._w
+        valeurs = self.forest.value
+        niveaux = [int(v) for v in self.niveaux[b]]
+        internes = [int(v) for v in self.internes[b]]
+        debut = niveaux[0]
+        # (début, fin, nombre de nœuds internes) de chaque niveau non vide, relatifs au bloc
+        bornes = [(niveaux[d] - debut, niveaux[d + 1] - debut, internes[d])
+                  for d in range(len(niveaux) - 1) if niveaux[d + 1] > niveaux[d]]
+        n = niveaux[-1] - debut
+        # Par nœud et point de quadrature : produit des facteurs du chemin (G) et coefficient
+        # de sa contribution (A) ; o = le logement suit le chemin pour la caractéristique testée
+        G = np.empty((len(t), n), dtype=np.float32)
+        A = np.empty((len(t), n), dtype=np.float32)
+        o = np.ones(n, dtype=bool)
+        G[:, : bornes[0][1]] = 1.0
+
+        # Descente
+        for s, e, _ in bornes[1:]:
+            sl = slice(debut + s, debut + e)
+            xe = x[self.feature[sl]]
+            va_gauche = xe <= self.seuil[sl]
+            if self.forest.nan_possible:
+                va_gauche |= np.isnan(xe) & self.nan_gauche[sl]
+            q = self.prev[sl]
+            a_prev = q >= 0
+            iq = np.where(a_prev, q - debut, 0)
+            # Même caractéristique déjà testée plus haut : les deux conditions sont fusionnées,
+            # et l'ancien facteur est remplacé par le nouveau
+            oq = o[iq] | ~a_prev
+            oc = (va_gauche == self.gauche[sl]) & oq
+            o[s:e] = oc
+            zc = self.z[sl]
+            zq = np.where(a_prev, self.z[debut + iq], np.float32(1))
+            dc = oc - zc
+            dq = oq - zq
+            fc = zc + dc * t
+            fq = zq + dq * t
+            g = G[:, self.parent[sl] - debut]
+            g *= fc
+            g /= fq
+            G[:, s:e] = g
+            fc = np.divide(dc, fc, out=fc)
+            fq = np.divide(dq, fq, out=fq)
+            fc -= fq
+            fc *= w
+            A[:, s:e] = fc
+
+        # Remontée : H = somme des feuilles du sous-arbre, valeur × G
+        contributions = np.zeros((self.n_features, valeurs.shape[1]))
+        H_fils = None
+        for d in range(len(bornes) - 1, -1, -1):
+            s, e, m = bornes[d]
+            H = np.empty((valeurs.shape[1], len(t), e - s), dtype=np.float32)
+            v = np.asarray(valeurs[self.orig[debut + s + m: debut + e]], dtype=np.float32).T
+            np.multiply(v[:, None, :], G[None, :, s + m:e], out=H[:, :, m:])
+            if m:
+                paire = self.paire[debut + bornes[d + 1][0]: debut + bornes[d + 1][1]]
+                np.add(H_fils[:, :, paire[0::2]], H_fils[:, :, paire[1::2]], out=H[:, :, :m])
+            if d > 0:
+                c = (H * A[:, s:e]).sum(axis=1)
+                f = self.feature[debut + s: debut + e]
+                for j in range(len(c)):
+                    contributions[:, j] += np.bincount(f, weights=c[j], minlength=self.n_features)
+            H_fils = H
+        return contributions
+
+    def par_blocs(self, x: np.ndarray):
+        """
+        Explications successives, de plus en plus complètes : (arbres, base, contributions)
+        après chaque bloc. Sur les premiers arbres, ce sont les valeurs exactes de la sous-forêt ;
+        la dernière est celle de la forêt entière.
+        """
+        x = np.asarray(x, dtype=np.float32).reshape(-1)
+        blocs = range(len(self.arbres))
+        if self.workers > 1:
+            pool = ThreadPoolExecutor(self.workers, thread_name_prefix="dpe-treeshap")
+            sommes = pool.map(lambda b: self._bloc(x, b), blocs)
+        else:
+            pool, sommes = None, (self._bloc(x, b) for b in blocs)
+        try:
+            somme = np.zeros((self.n_features, self.forest.value.shape[1]))
+            esperance = np.zeros(self.forest.value.shape[1])
+            arbres = 0
+            for b, contributions in zip(blocs, sommes):
+                somme += contributions
+                arbres += int(self.arbres[b])
+                esperance += self.esperances[b]
+                yield arbres, esperance / arbres, somme / arbres
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    def explique(self, x: np.ndarray):
+        """Valeur de base (n_sorties,) et contributions (n_features, n_sorties) : base + somme = prédiction."""
+        for _, base, contributions in self.par_blocs(x):
+            pass
+        return base, contributions
+
+    def importances(self, X: np.ndarray) -> np.ndarray:
+        """Importance globale : moyenne des |contributions| sur les lignes de `X`, (n_features, n_sorties)."""
+        return np.mean([np.abs(self.explique(x)[1]) for x in np.asarray(X, dtype=np.float32)], axis=0)
+
+
+class Explication:
+    """Explication d'un logement calculée en arrière-plan, lisible pendant le calcul."""
+
+    def __init__(self, n_arbres):
+        self.n_arbres = n_arbres
+        self.arbres = 0
+        self.base = None
+        self.contributions = None
+        self.duree_ms = None
+        self.erreur = None
+        self._fin = threading.Event()
+        self._verrou = threading.Lock()
+
+    @property
+    def termine(self):
+        return self._fin.is_set()
+
+    def etat(self):
+        """(arbres déjà pris en compte, base, contributions) ; contributions None avant le premier bloc."""
+        with self._verrou:
+            return self.arbres, self.base, self.contributions
+
+    def attendre(self, timeout=None):
+        self._fin.wait(timeout)
+        if self.erreur is not None:
+            raise self.erreur
+        return self.base, self.contributions
+
+    def _calcule(self, explicateur, x):
+        t0 = time.perf_counter()
+        try:
+            for arbres, base, contributions in explicateur.par_blocs(x):
+                with self._verrou:
+                    self.arbres, self.base, self.contributions = arbres, base, contributions
+        except Exception as erreur:
+            self.erreur = erreur
+        finally:
+            self.duree_ms = (time.perf_counter() - t0) * 1000
+            self._fin.set()
+
+
+class CacheExplications(CachePredictions):
+    """
+    Explications par ligne encodée, même clé et même invalidation que le cache de prédictions.
+    Le calcul part dans un fil dédié : l'appelant récupère tout de suite une `Explication`
+    qu'il affiche au fil de l'eau ; deux sessions qui soumettent le même formulaire la partagent.
+    """
+
+    def __init__(self, max_entrees=TAILLE_CACHE, workers=1):
+        super().__init__(max_entrees)
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="dpe-explication")
+
+    def explique(self, modele, valeurs: dict, empreinte) -> Explication:
+        X = modele.encoder.encode_one(valeurs)
+        cle = X.tobytes()
+        explication = self._get(empreinte, cle)
+        if explication is None or explication.erreur is not None:
+            explicateur = modele.explicateur
+            explication = Explication(explicateur.n_trees)
+            self._put(empreinte, cle, explication)
+            self._pool.submit(explication._calcule, explicateur, X[0])
+        return explication
+
+
+EXPLICATIONS = CacheExplications()
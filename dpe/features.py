@@ -0,0 +1,44 @@
+"""
+Encodage des caractéristiques d'un logement en matrice numérique pour le modèle.
+
+Chaque modalité est remplacée par son rang dans le vocabulaire d'entraînement.
+Les tables de correspondance sont construites une fois au chargement du modèle :
+encoder un formulaire revient alors à quelques lectures de dictionnaire, sans
+construire de DataFrame. Une modalité inconnue est codée -1. pandas n'est
+importé que pour l'encodage par lots.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+
+class FeatureEncoder:
+    def __init__(self, features, vocabulaire):
+        self.features = tuple(features)
+        self.vocabulaire = {nom: list(vocabulaire[nom]) for nom in self.features if nom in vocabulaire}
+        # Une table par colonne ; None pour les variables numériques
+        self._tables = [
+            {modalite: float(code) for code, modalite in enumerate(self.vocabulaire[nom])}
+            if nom in self.vocabulaire else None
+            for nom in self.features
+        ]
+
+    def encode_one(self, valeurs: dict) -> np.ndarray:
+        """Encode un seul logement (dict champ -> valeur) en matrice (1, n_features) float32."""
+        ligne = [
+            float(valeurs[nom]) if table is None else table.get(valeurs[nom], -1.0)
+            for nom, table in zip(self.features, self._tables)
+        ]
+        return np.array([ligne], dtype=np.float32)
+
+    def encode_frame(self, df) -> np.ndarray:
+        """Encode un lot de logements (DataFrame) ; produit exactement les mêmes codes que `encode_one`."""
+        import pandas as pd
+
+        X = np.empty((len(df), len(self.features)), dtype=np.float32)
+        for j, nom in enumerate(self.features):
+            if nom in self.vocabulaire:
+                X[:, j] = pd.Categorical(df[nom], categories=self.vocabulaire[nom]).codes
+            else:
+                X[:, j] = pd.to_numeric(df[nom], errors="coerce")
+        return X
@@ -0,0 +1,212 @@
+"""
+Forêt aléatoire « compilée » en tableaux plats pour l'inférence.
+
+`RandomForestRegressor.predict` appelle chaque arbre l'un après l'autre : pour un
+seul logement et 500 arbres, le coût est dominé par ces 500 appels Python.
+Ici tous les nœuds de tous les arbres sont concaténés dans quelques tableaux
+NumPy et on descend les arbres en même temps, un niveau par itération.
+Les feuilles pointent sur elles-mêmes, ce qui permet de faire exactement
+`profondeur` itérations sans test de fin.
+
+Les tableaux sont enregistrables en .npy non compressés : relus avec
+`mmap_mode="r"`, leurs pages sont partagées entre tous les processus qui
+chargent le même modèle.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+# Tableaux constitutifs d'une forêt compilée (un fichier .npy chacun)
+CHAMPS = ("feature", "threshold", "children", "missing_left", "value", "roots")
+
+# Poids d'entraînement par nœud (weighted_n_node_samples) : inutile pour prédire, nécessaire
+# aux explications (dpe.explication). Absent des artefacts exportés avant leur ajout.
+OPTIONNELS = ("cover",)
+
+# Nombre de couples (ligne, arbre) traités à la fois : garde les tableaux de travail en cache
+TAILLE_BLOC = 1 << 15
+
+
+def _seuils_float32(seuils):
+    """
+    Seuils float64 arrondis vers le bas en float32. Les entrées étant float32,
+    `x <= s` et `x <= arrondi_bas(s)` sont équivalents : aucune décision ne change.
+    """
+    s32 = seuils.astype(np.float32)
+    trop_haut = s32.astype(np.float64) > seuils
+    s32[trop_haut] = np.nextafter(s32[trop_haut], np.float32(-np.inf))
+    return s32
+
+
+class CompiledForest:
+    def __init__(self, feature, threshold, children, missing_left, value, roots, max_depth, nan_possible=None, cover=None):
+        self.feature = feature
+        self.threshold = threshold
+        # children[i] = (fils droit, fils gauche) : indexé par le résultat de `x <= seuil`
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.cover = cover
+        self.max_depth = int(max_depth)
+        # Précalculé à l'enregistrement pour ne pas parcourir un tableau mappé au chargement
+        self.nan_possible = bool(missing_left.any()) if nan_possible is None else nan_possible
+
+    @classmethod
+    def from_sklearn(cls, foret) -> "CompiledForest":
+        """Aplatit les arbres d'une forêt sklearn entraînée (régression, une ou plusieurs sorties)."""
+        arbres = [est.tree_ for est in foret.estimators_]
+        tailles = np.array([t.node_count for t in arbres])
+        roots = np.concatenate([[0], np.cumsum(tailles)[:-1]]).astype(np.int32)
+        feature, threshold, children, missing_left, value, cover = [], [], [], [], [], []
+        for t, offset in zip(arbres, roots):
+            feuille = t.children_left < 0
+            ids = np.arange(t.node_count) + offset
+            feature.append(np.where(feuille, 0, t.feature))
+            threshold.append(t.threshold)
+            children.append(np.stack([
+                np.where(feuille, ids, t.children_right + offset),
+                np.where(feuille, ids, t.children_left + offset),
+            ], axis=1))
+            mgl = getattr(t, "missing_go_to_left", None)
+            missing_left.append(np.zeros(t.node_count, dtype=bool) if mgl is None else (mgl.astype(bool) & ~feuille))
+            value.append(t.value[:, :, 0])
+            cover.append(t.weighted_n_node_samples)
+        return cls(
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            children=np.concatenate(children).astype(np.int32),
+            missing_left=np.concatenate(missing_left),
+            value=np.concatenate(value).astype(np.float64),
+            roots=roots,
+            max_depth=max(t.max_depth for t in arbres),
+            cover=np.concatenate(cover).astype(np.float64),
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, champ).nbytes for champ in CHAMPS + OPTIONNELS if getattr(self, champ) is not None)
+
+    def _blocs_feuilles(self, X: np.ndarray):
+        """Feuilles atteintes, bloc d'arbres par bloc d'arbres : (premier arbre, matrice (n, arbres du bloc))."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n, p = X.shape
+        x_plat = X.ravel()
+        enfants = self.children.reshape(-1)
+        debut_ligne = (np.arange(n) * p)[:, None]
+        pas = max(1, TAILLE_BLOC // max(n, 1))
+        for t in range(0, self.n_trees, pas):
+            racines = self.roots[t:t + pas]
+            noeud = np.broadcast_to(racines, (n, len(racines))).copy()
+            for _ in range(self.max_depth):
+                x = x_plat[debut_ligne + self.feature[noeud]]
+                a_gauche = x <= self.threshold[noeud]
+                if self.nan_possible:
+                    a_gauche |= np.isnan(x) & self.missing_left[noeud]
+                noeud = enfants[2 * noeud + a_gauche]
+            yield t, noeud
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """Indice de la feuille atteinte dans chaque arbre, matrice (n, n_arbres)."""
+        feuilles = np.empty((len(X), self.n_trees), dtype=np.int32)
+        for t, noeud in self._blocs_feuilles(X):
+            feuilles[:, t:t + noeud.shape[1]] = noeud
+        return feuilles
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Moyenne des feuilles sur les arbres, comme `RandomForestRegressor.predict`.
+        Les valeurs sont sommées bloc d'arbres par bloc d'arbres dans un accumulateur
+        (n, sorties) : la mémoire de travail ne croît pas avec le nombre d'arbres.
+        """
+        somme = np.zeros((len(X), self.value.shape[1]), dtype=np.float64)
+        for _, noeud in self._blocs_feuilles(X):
+            somme += self.value[noeud].sum(axis=1, dtype=np.float64)
+        pred = somme / max(self.n_trees, 1)
+        return pred[:, 0] if pred.shape[1] == 1 else pred
+
+    def save(self, dossier: Path, float32=False, n_trees=None):
+        """
+        Enregistre les tableaux en .npy non compressés (mappables en mémoire).
+        Variante allégée : seuils et valeurs en float32, et/ou seulement les `n_trees` premiers arbres.
+        """
+        dossier = Path(dossier)
+        dossier.mkdir(parents=True, exist_ok=True)
+        tableaux = {champ: getattr(self, champ) for champ in CHAMPS + OPTIONNELS if getattr(self, champ) is not None}
+        if n_trees is not None and n_trees < self.n_trees:
+            # Les arbres sont stockés à la suite : on tronque au début du premier arbre écarté
+            fin = int(self.roots[n_trees])
+            tableaux = {champ: tab[:fin] for champ, tab in tableaux.items()}
+            tableaux["roots"] = self.roots[:n_trees]
+        if float32:
+            tableaux["threshold"] = _seuils_float32(np.asarray(tableaux["threshold"], dtype=np.float64))
+            tableaux["value"] = tableaux["value"].astype(np.float32)
+            if len(self.roots) and self.feature.max(initial=0) < 128:
+                tableaux["feature"] = tableaux["feature"].astype(np.int8)
+        # Chaque fichier est remplacé d'un bloc : un processus qui mappe encore l'ancien artefact
+        # garde ses pages (ancien inode) au lieu de lire un fichier tronqué en cours d'écriture
+        for champ, tab in tableaux.items():
+            tmp = dossier / f"{champ}.npy.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(tab))
+            tmp.replace(dossier / f"{champ}.npy")
+        meta = {
+            "max_depth": self.max_depth,
+            "nan_possible": bool(np.asarray(tableaux["missing_left"]).any()),
+            "n_trees": len(tableaux["roots"]),
+            "float32": bool(float32),
+        }
+        (dossier / "forest.json").write_text(json.dumps(meta))
+        return meta
+
+    @classmethod
+    def assemble(cls, parties, dossier: Path) -> dict:
+        """
+        Concatène des forêts enregistrées (dossiers `parties`) en une seule forêt dans `dossier`.
+        Chaque tableau est écrit directement dans un .npy mappé, partie par partie : la mémoire
+        de travail est celle d'une partie, pas de la forêt entière.
+        """
+        dossier = Path(dossier)
+        dossier.mkdir(parents=True, exist_ok=True)
+        forets = [cls.open(p) for p in parties]
+        decalages = np.concatenate([[0], np.cumsum([len(f.feature) for f in forets])[:-1]])
+        champs = CHAMPS + tuple(c for c in OPTIONNELS if all(getattr(f, c) is not None for f in forets))
+        for champ in champs:
+            premier = getattr(forets[0], champ)
+            n = sum(len(getattr(f, champ)) for f in forets)
+            tmp = dossier / f"{champ}.npy.tmp"
+            sortie = np.lib.format.open_memmap(tmp, mode="w+", dtype=premier.dtype, shape=(n,) + premier.shape[1:])
+            debut = 0
+            for foret, decalage in zip(forets, decalages):
+                tab = getattr(foret, champ)
+                # Les indices de nœuds sont relatifs à la partie : on les décale
+                sortie[debut:debut + len(tab)] = tab + decalage if champ in ("children", "roots") else tab
+                debut += len(tab)
+            sortie.flush()
+            del sortie
+            tmp.replace(dossier / f"{champ}.npy")
+        meta = {
+            "max_depth": max(f.max_depth for f in forets),
+            "nan_possible": any(f.nan_possible for f in forets),
+            "n_trees": sum(f.n_trees for f in forets),
+            "float32": forets[0].threshold.dtype == np.float32,
+        }
+        (dossier / "forest.json").write_text(json.dumps(meta))
+        return meta
+
+    @classmethod
+    def open(cls, dossier: Path, mmap=True) -> "CompiledForest":
+        """Relit une forêt enregistrée ; avec `mmap`, aucun tableau n'est copié en mémoire."""
+        dossier = Path(dossier)
+        meta = json.loads((dossier / "forest.json").read_text())
+        mode = "r" if mmap else None
+        tableaux = {champ: np.load(dossier / f"{champ}.npy", mmap_mode=mode) for champ in CHAMPS}
+        for champ in OPTIONNELS:
+            if (dossier / f"{champ}.npy").exists():
+                tableaux[champ] = np.load(dossier / f"{champ}.npy", mmap_mode=mode)
+        return cls(max_depth=meta["max_depth"], nan_possible=meta["nan_possible"], **tableaux)
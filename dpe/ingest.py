@@ -0,0 +1,107 @@
+"""
+Ingestion de l'export ADEME par blocs vers un cache Parquet.
+
+L'export complet (~13.6M lignes, plusieurs centaines de colonnes) ne tient pas
+en mémoire avec un simple `pd.read_csv`. On le lit ici par blocs, en ne gardant
+que les colonnes du schéma, avec des flottants en float32 et les modalités
+répétées en catégoriel, et on écrit un cache colonne qu'on relit ensuite en ne
+projetant que les colonnes demandées.
+"""
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dpe.schema import CATEGORIELLES, COLONNES_ADEME, DATES, NUMERIQUES
+
+TAILLE_BLOC = 500_000
+
+
+def cache_path(source: Path) -> Path:
+    """Emplacement du cache Parquet associé à un CSV ADEME."""
+    return Path(source).with_suffix(".parquet")
+
+
+def _schema_arrow(colonnes) -> pa.Schema:
+    champs = []
+    for nom in colonnes:
+        if nom in NUMERIQUES:
+            type_ = pa.float32()
+        elif nom in CATEGORIELLES:
+            type_ = pa.dictionary(pa.int32(), pa.string())
+        elif nom in DATES:
+            type_ = pa.timestamp("ms")
+        else:
+            type_ = pa.string()
+        champs.append(pa.field(nom, type_))
+    return pa.schema(champs)
+
+
+def _prepare_bloc(bloc: pd.DataFrame) -> pd.DataFrame:
+    bloc = bloc.rename(columns=COLONNES_ADEME)
+    for nom in bloc.columns:
+        if nom in NUMERIQUES:
+            bloc[nom] = pd.to_numeric(bloc[nom], errors="coerce").astype("float32")
+        elif nom in DATES:
+            bloc[nom] = pd.to_datetime(bloc[nom], errors="coerce").astype("datetime64[ms]")
+    return bloc
+
+
+def ingest_csv(source: Path, cache: Path = None, chunksize: int = TAILLE_BLOC) -> Path:
+    """
+    Convertit le CSV ADEME en cache Parquet, un groupe de lignes par bloc lu.
+    La mémoire utilisée est bornée par la taille d'un bloc, pas par celle du fichier.
+    """
+    source = Path(source)
+    cache = Path(cache) if cache is not None else cache_path(source)
+
+    entete = pd.read_csv(source, nrows=0).columns
+    usecols = [col for col in COLONNES_ADEME if col in entete]
+    colonnes = [COLONNES_ADEME[col] for col in usecols]
+    schema = _schema_arrow(colonnes)
+    dtypes = {col: "category" for col in usecols if COLONNES_ADEME[col] in CATEGORIELLES}
+    dtypes.update({col: "string" for col in usecols if COLONNES_ADEME[col] not in CATEGORIELLES + NUMERIQUES + DATES})
+
+    # Fichier temporaire propre à cet appel : deux processus qui ingèrent le même CSV
+    # (deux workers au démarrage à froid) n'écrivent jamais dans le même fichier
+    with tempfile.NamedTemporaryFile(dir=cache.parent, prefix=f".{cache.name}.", suffix=".tmp", delete=False) as f:
+        tmp = Path(f.name)
+    try:
+        with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+            for bloc in pd.read_csv(source, usecols=usecols, dtype=dtypes, chunksize=chunksize, low_memory=True):
+                bloc = _prepare_bloc(bloc)[colonnes]
+                writer.write_table(pa.Table.from_pandas(bloc, schema=schema, preserve_index=False))
+        # Écriture atomique : un cache à moitié écrit n'est jamais lu ; le dernier arrivé remplace l'autre
+        tmp.replace(cache)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return cache
+
+
+def _parquet(path: Path) -> Path:
+    """Chemin Parquet à lire : un CSV est d'abord ingéré (une seule fois, tant qu'il n'est pas modifié)."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        cache = cache_path(path)
+        if not cache.exists() or cache.stat().st_mtime < path.stat().st_mtime:
+            ingest_csv(path, cache)
+        path = cache
+    return path
+
+
+def read_dataset(path: Path, columns=None) -> pd.DataFrame:
+    """Charge les données DPE en ne lisant que les colonnes demandées."""
+    return pd.read_parquet(_parquet(path), columns=list(columns) if columns is not None else None)
+
+
+def iter_batches(path: Path, columns=None, batch_size: int = TAILLE_BLOC):
+    """
+    Parcourt les données DPE par blocs de DataFrames, sans jamais tout charger.
+    Les modalités répétées restent catégorielles bloc par bloc.
+    """
+    fichier = pq.ParquetFile(_parquet(path))
+    for batch in fichier.iter_batches(batch_size=batch_size, columns=list(columns) if columns is not None else None):
+        yield batch.to_pandas()
@@ -0,0 +1,211 @@
+"""
+Instrumentation des chemins chauds de l'application, activée par DPE_DIAGNOSTICS=1.
+
+Chaque opération nommée (rendu d'une page, chargeur en cache, prédiction,
+service d'une image...) garde une fenêtre glissante de ses dernières durées,
+d'où la page Diagnostics tire les percentiles p50/p95/p99 ; des compteurs et
+des relevés de mémoire résidente (RSS) complètent le tableau. L'état vit dans
+ce module, donc il est partagé par toutes les sessions du processus et survit
+aux reruns Streamlit.
+
+Si DPE_METRIQUES désigne un fichier, chaque mesure y est aussi ajoutée en une
+ligne JSON ({"t", "op", "ms"} ou {"t", "rss_mo"}) pour un outil externe.
+
+Désactivé, `chronometre` rend la fonction décorée telle quelle et `chrono` un
+gestionnaire de contexte vide partagé : le coût est celui d'un `with` vide
+(mesuré par benchmarks/bench_instrumentation.py).
+
+    DPE_DIAGNOSTICS=1 DPE_METRIQUES=metriques.jsonl streamlit run app.py
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+ACTIF = os.environ.get("DPE_DIAGNOSTICS", "") not in ("", "0")
+EXPORT = os.environ.get("DPE_METRIQUES") or None
+
+# Durées conservées par opération, et relevés de mémoire conservés
+FENETRE = 512
+RELEVES_MEMOIRE = 256
+
+# opération -> Fenetre
+OPERATIONS = {}
+# compteur -> valeur
+COMPTEURS = {}
+# (instant, RSS en Mo)
+MEMOIRE = deque(maxlen=RELEVES_MEMOIRE)
+
+DEBUT = time.time()
+
+_verrou = threading.Lock()
+_export = None
+_NUL = nullcontext()
+
+
+class Fenetre:
+    """Dernières durées d'une opération, avec le nombre d'appels et le cumul depuis le démarrage."""
+
+    __slots__ = ("durees", "n", "total", "erreurs")
+
+    def __init__(self, taille=FENETRE):
+        self.durees = deque(maxlen=taille)
+        self.n = 0
+        self.total = 0.0
+        self.erreurs = 0
+
+    def ajoute(self, secondes):
+        self.durees.append(secondes)
+        self.n += 1
+        self.total += secondes
+
+    def percentiles(self, niveaux=(50, 95, 99)) -> dict:
+        """Percentiles de la fenêtre, en secondes (rang le plus proche)."""
+        tri = sorted(self.durees)
+        if not tri:
+            return {p: None for p in niveaux}
+        return {p: tri[min(len(tri) - 1, max(0, -(-p * len(tri) // 100) - 1))] for p in niveaux}
+
+
+def _exporte(ligne):
+    # Appelé sous le verrou : le fichier est ouvert au premier usage, en ajout et ligne par ligne
+    global _export
+    if _export is None:
+        _export = open(EXPORT, "a", buffering=1, encoding="utf-8")
+    _export.write(json.dumps(ligne, ensure_ascii=False) + "\n")
+
+
+def enregistre(nom, secondes, erreur=False):
+    """Ajoute une durée à la fenêtre de l'opération `nom`."""
+    if not ACTIF:
+        return
+    with _verrou:
+        fenetre = OPERATIONS.get(nom)
+        if fenetre is None:
+            fenetre = OPERATIONS[nom] = Fenetre()
+        fenetre.ajoute(secondes)
+        fenetre.erreurs += erreur
+        if EXPORT:
+            _exporte({"t": round(time.time(), 3), "op": nom, "ms": round(secondes * 1000, 3)})
+
+
+class _Chrono:
+    __slots__ = ("nom", "t0")
+
+    def __init__(self, nom):
+        self.nom = nom
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, type_exc, exc, tb):
+        enregistre(self.nom, time.perf_counter() - self.t0, erreur=type_exc is not None)
+        return False
+
+
+def chrono(nom):
+    """Gestionnaire de contexte qui chronomètre son bloc sous le nom `nom` (vide si inactif)."""
+    return _Chrono(nom) if ACTIF else _NUL
+
+
+def chronometre(nom):
+    """
+    Décorateur équivalent à `chrono`. Inactif, la fonction est rendue telle quelle.
+
+    Placé de part et d'autre d'un cache Streamlit, il compte les appels (dessus)
+    et les calculs effectifs (dessous, suffixe « .calcul ») : la différence est
+    le nombre de hits du cache.
+    """
+    def decorateur(fonction):
+        if not ACTIF:
+            return fonction
+
+        @functools.wraps(fonction)
+        def chronometree(*args, **kwargs):
+            with _Chrono(nom):
+                return fonction(*args, **kwargs)
+
+        return chronometree
+
+    return decorateur
+
+
+def compte(nom, n=1):
+    """Incrémente le compteur `nom`."""
+    if not ACTIF:
+        return
+    with _verrou:
+        COMPTEURS[nom] = COMPTEURS.get(nom, 0) + n
+
+
+def _status(cle):
+    try:
+        with open("/proc/self/status") as f:
+            for ligne in f:
+                if ligne.startswith(cle):
+                    return int(ligne.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_mo():
+    """Mémoire résidente courante du processus, en Mo (None hors Linux)."""
+    return _status("VmRSS:")
+
+
+def pic_rss_mo():
+    """Pic de mémoire résidente du processus, en Mo."""
+    pic = _status("VmHWM:")
+    if pic is None:
+        import resource
+
+        pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return pic
+
+
+def releve_memoire():
+    """Ajoute un relevé de la mémoire résidente (un par rerun suffit)."""
+    if not ACTIF:
+        return
+    rss = rss_mo()
+    if rss is None:
+        return
+    with _verrou:
+        MEMOIRE.append((time.time(), rss))
+        if EXPORT:
+            _exporte({"t": round(time.time(), 3), "rss_mo": round(rss, 1)})
+
+
+def resume() -> dict:
+    """Instantané des mesures, en types JSON : percentiles en ms par opération, compteurs, mémoire."""
+    with _verrou:
+        fenetres = {nom: (f.n, f.total, f.erreurs, f.percentiles((50, 95, 99, 100))) for nom, f in OPERATIONS.items()}
+        compteurs = dict(COMPTEURS)
+        memoire = list(MEMOIRE)
+    operations = {}
+    for nom, (n, total, erreurs, p) in sorted(fenetres.items()):
+        operations[nom] = {
+            "n": n, "erreurs": erreurs, "total_s": round(total, 4),
+            **{f"p{niveau}_ms": round(p[niveau] * 1000, 3) for niveau in (50, 95, 99)},
+            "max_ms": round(p[100] * 1000, 3),
+        }
+    return {
+        "depuis_s": round(time.time() - DEBUT, 1),
+        "operations": operations,
+        "compteurs": compteurs,
+        "memoire": {"rss_mo": rss_mo(), "pic_rss_mo": pic_rss_mo(),
+                    "releves": [(round(t, 1), round(rss, 1)) for t, rss in memoire]},
+    }
+
+
+def reinitialise():
+    """Vide les fenêtres, les compteurs et les relevés."""
+    with _verrou:
+        OPERATIONS.clear()
+        COMPTEURS.clear()
+        MEMOIRE.clear()
@@ -0,0 +1,257 @@
+"""
+Modèle de prédiction de la consommation et des émissions d'un logement.
+
+Deux formats d'artefact :
+
+* `modele_dpe.joblib` : le Pipeline sklearn entraîné et le vocabulaire
+  d'entraînement, tel que produit par l'entraînement ;
+* `modele_dpe/` : la forêt compilée en .npy non compressés + `modele.json`.
+  C'est le format chargé par l'application : les tableaux sont mappés en
+  mémoire, donc le démarrage ne lit presque rien et tous les processus d'une
+  même machine partagent les mêmes pages. Ce format n'a besoin ni de sklearn
+  ni de joblib. Le sous-dossier `explication/` contient la table qui sert aux
+  contributions TreeSHAP (dpe.explication), construite à l'export.
+
+    python -m dpe.model train donnees.parquet
+    python -m dpe.model export models/modele_dpe.joblib models/modele_dpe_leger --float32 --trees 100
+    python -m dpe.model export models/modele_dpe.joblib models/modele_dpe --donnees donnees.parquet
+
+Pour une base qui ne tient pas en mémoire, `python -m dpe.entrainement` entraîne
+par blocs et produit directement le dossier compilé.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from dpe.classes import classe_prediction
+from dpe.features import FeatureEncoder
+from dpe.forest import CompiledForest
+from dpe.schema import CIBLES, FEATURES, VOCABULAIRE
+
+MODEL_PATH = Path("models/modele_dpe")
+PIPELINE_PATH = Path("models/modele_dpe.joblib")
+
+# Meilleurs hyperparamètres du GridSearch (cf. page Résultats)
+PARAMS_RF = {"n_estimators": 500, "max_depth": 20}
+
+# Modèle tout juste entraîné (Pipeline en mémoire) : en dessous de cette taille de lot,
+# la forêt compilée est plus rapide que sklearn. Un modèle chargé depuis le dossier
+# compilé n'a pas de Pipeline et prédit toujours avec la forêt compilée.
+PETIT_LOT = 128
+
+# Logements tirés des données d'entraînement pour les importances globales (moyenne des |SHAP|)
+ECHANTILLON_IMPORTANCES = 100
+
+
+def empreinte_artefact(path: Path) -> str:
+    """
+    Empreinte d'un artefact, changée à chaque réécriture : taille et date de modele.json pour
+    un dossier compilé (écrit en dernier par `export`), du fichier lui-même pour un joblib.
+    Un seul stat, sans relire les tableaux : assez léger pour être vérifié à chaque prédiction.
+    Le chemin est résolu : `models/modele_dpe` et son chemin absolu ont la même empreinte.
+    """
+    path = Path(path).resolve()
+    st = (path / "modele.json" if path.is_dir() else path).stat()
+    return hashlib.sha256(f"{path}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+class ModeleDPE:
+    """Encodeur précompilé + forêt (compilée et/ou Pipeline sklearn), prédit (conso, ges)."""
+
+    def __init__(self, pipeline, vocabulaire, features=FEATURES, cibles=CIBLES, forest=None,
+                 explicateur=None, importances=None, importances_n=0):
+        self.pipeline = pipeline
+        self.vocabulaire = vocabulaire
+        self.features = tuple(features)
+        self.cibles = tuple(cibles)
+        self.encoder = FeatureEncoder(self.features, vocabulaire)
+        self.forest = forest if forest is not None else self._compile(pipeline)
+        self._explicateur = explicateur
+        # {cible: {feature: moyenne des |contributions|}}, calculées à l'export
+        self.importances = importances
+        self.importances_n = importances_n
+
+    @staticmethod
+    def _compile(pipeline):
+        # Le Pipeline ne contient que la forêt : l'encodage est fait par FeatureEncoder
+        if pipeline is None:
+            return None
+        foret = pipeline[-1]
+        if len(pipeline.steps) == 1 and hasattr(foret, "estimators_"):
+            return CompiledForest.from_sklearn(foret)
+        return None
+
+    @classmethod
+    def load(cls, path: Path, mmap=True) -> "ModeleDPE":
+        """Charge un artefact : dossier compilé (mappé en mémoire) ou fichier joblib."""
+        path = Path(path)
+        if path.is_dir():
+            meta = json.loads((path / "modele.json").read_text())
+            forest = CompiledForest.open(path, mmap=mmap)
+            explicateur = None
+            if forest.cover is not None and (path / "explication").is_dir():
+                from dpe.explication import ExplicateurArbres
+
+                explicateur = ExplicateurArbres.open(path / "explication", forest, mmap=mmap)
+            return cls(None, meta["vocabulaire"], meta["features"], meta["cibles"], forest=forest,
+                       explicateur=explicateur, importances=meta.get("importances"),
+                       importances_n=meta.get("importances_n", 0))
+        import joblib
+
+        artefact = joblib.load(path)
+        return cls(artefact["pipeline"], artefact["vocabulaire"], artefact["features"], artefact["cibles"])
+
+    def save(self, path: Path) -> Path:
+        import joblib
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(
+            {"pipeline": self.pipeline, "vocabulaire": self.vocabulaire, "features": self.features, "cibles": self.cibles},
+            path,
+        )
+        return path
+
+    @property
+    def explicateur(self):
+        """Contributions TreeSHAP ; None pour une forêt exportée sans poids par nœud."""
+        if self._explicateur is None and self.forest is not None and self.forest.cover is not None:
+            # Modèle en mémoire (Pipeline) : table construite à la première explication
+            from dpe.explication import ExplicateurArbres
+
+            self._explicateur = ExplicateurArbres.from_forest(self.forest, len(self.features))
+        return self._explicateur
+
+    def export(self, dossier: Path, float32=False, n_trees=None, echantillon=None) -> Path:
+        """
+        Écrit le format compilé mappable ; `float32`/`n_trees` produisent la variante allégée.
+        La table d'explication est construite pour la forêt telle qu'enregistrée ; avec
+        `echantillon` (matrice encodée), les importances globales sont ajoutées à modele.json.
+        """
+        if self.forest is None:
+            raise ValueError("Seul un Pipeline réduit à une forêt aléatoire peut être compilé")
+        dossier = Path(dossier)
+        return self.finalise(dossier, self.forest.save(dossier, float32=float32, n_trees=n_trees), echantillon)
+
+    def finalise(self, dossier: Path, meta_foret: dict, echantillon=None) -> Path:
+        """
+        Complète un dossier où la forêt est déjà enregistrée (`CompiledForest.save` ou
+        `assemble`) : table d'explication, puis modele.json, écrit en dernier.
+        """
+        dossier = Path(dossier)
+        meta = {
+            "features": list(self.features),
+            "cibles": list(self.cibles),
+            "vocabulaire": self.vocabulaire,
+            **meta_foret,
+        }
+        foret = CompiledForest.open(dossier)
+        if foret.cover is None:
+            # Forêt relue d'un ancien artefact : pas d'explications, pas de table périmée
+            shutil.rmtree(dossier / "explication", ignore_errors=True)
+        else:
+            from dpe.explication import ExplicateurArbres
+
+            explicateur = ExplicateurArbres.from_forest(foret, len(self.features))
+            explicateur.save(dossier / "explication")
+            if echantillon is not None:
+                importances = explicateur.importances(echantillon)
+                meta["importances"] = {
+                    cible: dict(zip(self.features, importances[:, k].round(4).tolist()))
+                    for k, cible in enumerate(self.cibles)
+                }
+                meta["importances_n"] = len(echantillon)
+        (dossier / "modele.json").write_text(json.dumps(meta, ensure_ascii=False, indent=1))
+        return dossier
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Prédictions (n, 2) [conso, ges] pour une matrice déjà encodée.
+
+        Le Pipeline sklearn ne sert qu'aux grands lots d'un modèle qui l'a encore
+        (entraîné ou relu depuis le .joblib). L'application, la notation en masse,
+        le service et l'évaluation chargent le dossier compilé : tous leurs lots
+        passent par `CompiledForest.predict`, à mémoire de travail bornée.
+        """
+        if self.pipeline is None or (self.forest is not None and len(X) <= PETIT_LOT):
+            return self.forest.predict(X)
+        return self.pipeline.predict(X)
+
+    def predict_frame(self, df) -> np.ndarray:
+        """Prédictions (n, 2) [conso, ges] pour un DataFrame de logements (noms courts de dpe.schema)."""
+        return self.predict(self.encoder.encode_frame(df))
+
+    def predict_one(self, valeurs: dict):
+        """Conso, GES et étiquette DPE pour un seul logement (valeurs du formulaire)."""
+        conso, ges = self.predict(self.encoder.encode_one(valeurs))[0]
+        return float(conso), float(ges), classe_prediction(conso, ges)
+
+    def explique_one(self, valeurs: dict):
+        """Valeur de base (2,) et contributions (n_features, 2) [conso, ges] : base + somme = prédiction."""
+        return self.explicateur.explique(self.encoder.encode_one(valeurs)[0])
+
+
+def fit_model(df, vocabulaire=VOCABULAIRE, n_jobs=-1, random_state=42, features=FEATURES,
+              **params) -> ModeleDPE:
+    """Entraîne une forêt aléatoire multi-sorties (conso, ges) sur un DataFrame déjà renommé (cf. dpe.schema)."""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.pipeline import Pipeline
+
+    params = {**PARAMS_RF, **params}
+    pipeline = Pipeline([("foret", RandomForestRegressor(n_jobs=n_jobs, random_state=random_state, **params))])
+    X = FeatureEncoder(features, vocabulaire).encode_frame(df)
+    pipeline.fit(X, df[list(CIBLES)].to_numpy(dtype=np.float32))
+    return ModeleDPE(pipeline, vocabulaire, features)
+
+
+def _echantillon(modele, df, n):
+    """Logements tirés au hasard de `df`, encodés, pour les importances globales (None sans données)."""
+    if df is None or n <= 0:
+        return None
+    return modele.encoder.encode_frame(df.sample(min(n, len(df)), random_state=0))
+
+
+def main():
+    from dpe.ingest import read_dataset
+
+    parser = argparse.ArgumentParser(description="Entraîne et exporte le modèle du simulateur.")
+    commandes = parser.add_subparsers(dest="commande", required=True)
+
+    train = commandes.add_parser("train", help="entraîne la forêt puis l'exporte au format compilé")
+    train.add_argument("dataset", type=Path, help="CSV ADEME ou cache Parquet")
+    train.add_argument("--pipeline", type=Path, default=PIPELINE_PATH)
+    train.add_argument("--sortie", type=Path, default=MODEL_PATH)
+    train.add_argument("--n-estimators", type=int, default=PARAMS_RF["n_estimators"])
+    train.add_argument("--max-depth", type=int, default=PARAMS_RF["max_depth"])
+    train.add_argument("--importances", type=int, default=ECHANTILLON_IMPORTANCES,
+                       help="logements tirés pour les importances globales (0 : aucune)")
+
+    export = commandes.add_parser("export", help="compile un Pipeline joblib existant")
+    export.add_argument("pipeline", type=Path)
+    export.add_argument("sortie", type=Path)
+    export.add_argument("--float32", action="store_true", help="seuils et valeurs en float32")
+    export.add_argument("--trees", type=int, default=None, help="ne garder que les N premiers arbres")
+    export.add_argument("--donnees", type=Path, default=None, help="jeu où tirer les logements des importances globales")
+    export.add_argument("--importances", type=int, default=ECHANTILLON_IMPORTANCES)
+    args = parser.parse_args()
+
+    if args.commande == "train":
+        df = read_dataset(args.dataset, columns=list(FEATURES + CIBLES)).dropna(subset=list(CIBLES))
+        modele = fit_model(df, n_estimators=args.n_estimators, max_depth=args.max_depth)
+        print(f"Pipeline enregistré : {modele.save(args.pipeline)}")
+        print(f"Modèle compilé : {modele.export(args.sortie, echantillon=_echantillon(modele, df, args.importances))}")
+    else:
+        modele = ModeleDPE.load(args.pipeline)
+        df = read_dataset(args.donnees, columns=list(FEATURES)) if args.donnees else None
+        echantillon = _echantillon(modele, df, args.importances)
+        print(f"Modèle compilé : {modele.export(args.sortie, float32=args.float32, n_trees=args.trees, echantillon=echantillon)}")
+
+
+if __name__ == "__main__":
+    main()
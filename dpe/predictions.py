@@ -0,0 +1,88 @@
+"""
+Cache des prédictions du simulateur, partagé par toutes les sessions du processus.
+
+La clé est la ligne encodée du formulaire (float32, toutes les caractéristiques
+du modèle, énergies secondaires comprises) : deux formulaires qui donnent la
+même entrée au modèle partagent la même entrée de cache, par exemple une
+modalité inconnue ou une surface saisie 70 ou 70.0. Le cache est borné en
+nombre d'entrées (LRU) et vidé dès que l'empreinte de l'artefact change.
+"""
+import threading
+from collections import OrderedDict
+
+from dpe.classes import classe_prediction
+
+TAILLE_CACHE = 10_000
+
+
+class CachePredictions:
+    """Cache LRU (conso, ges, lettre) par ligne encodée, sûr entre threads, avec compteurs."""
+
+    def __init__(self, max_entrees=TAILLE_CACHE):
+        self.max_entrees = max_entrees
+        self.empreinte = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def _get(self, empreinte, cle):
+        with self._verrou:
+            if empreinte != self.empreinte:
+                # Nouvel artefact : aucune prédiction de l'ancien modèle ne doit être servie
+                if self.empreinte is not None:
+                    self.invalidations += 1
+                self._entrees.clear()
+                self.empreinte = empreinte
+            resultat = self._entrees.get(cle)
+            if resultat is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entrees.move_to_end(cle)
+            return resultat
+
+    def _put(self, empreinte, cle, resultat):
+        with self._verrou:
+            if empreinte != self.empreinte:
+                return
+            self._entrees[cle] = resultat
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.max_entrees:
+                self._entrees.popitem(last=False)
+
+    def predict_one(self, modele, valeurs: dict, empreinte, predict=None):
+        """
+        Comme `modele.predict_one`, servi depuis le cache quand le formulaire a déjà été vu.
+        `predict` remplace `modele.predict` pour les misses (file d'inférence par micro-lots).
+        """
+        X = modele.encoder.encode_one(valeurs)
+        cle = X.tobytes()
+        resultat = self._get(empreinte, cle)
+        if resultat is None:
+            # Prédiction hors verrou : deux sessions simultanées peuvent calculer la même
+            # entrée, mais aucune n'attend l'inférence d'une autre
+            conso, ges = (predict or modele.predict)(X)[0]
+            resultat = (float(conso), float(ges), classe_prediction(conso, ges))
+            self._put(empreinte, cle, resultat)
+        return resultat
+
+    def clear(self):
+        with self._verrou:
+            self._entrees.clear()
+
+    def stats(self):
+        with self._verrou:
+            appels = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "taux_hits": self.hits / appels if appels else 0.0,
+                "entrees": len(self._entrees),
+                "invalidations": self.invalidations,
+                "empreinte": self.empreinte,
+            }
+
+
+PREDICTIONS = CachePredictions()
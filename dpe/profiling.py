@@ -0,0 +1,89 @@
+"""
+Profilage du démarrage de l'application, activé par la variable DPE_PROFILE=1.
+
+Mesure le temps d'import de chaque module importé (dépendances comprises, au
+niveau de l'import le plus externe) et le temps de rendu de chaque page, dont
+le premier rendu dans le processus, qui inclut les imports paresseux de la page.
+Désactivé, le module ne modifie rien.
+"""
+import builtins
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+ACTIF = os.environ.get("DPE_PROFILE", "") not in ("", "0")
+
+
+def _debut_processus():
+    """Instant de lancement du processus (horloge perf_counter), d'après /proc ; à défaut, maintenant."""
+    try:
+        with open("/proc/self/stat") as f:
+            debut = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.perf_counter() - (uptime - debut / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.perf_counter()
+
+
+DEMARRAGE = _debut_processus()
+
+# module -> secondes passées dans son premier import
+IMPORTS = {}
+# page -> {"premier_s", "depuis_demarrage_s", "dernier_s", "rendus"}
+PAGES = {}
+
+_import_original = builtins.__import__
+_local = threading.local()
+
+
+def _import_chronometre(name, globals=None, locals=None, fromlist=(), level=0):
+    # Modules déjà chargés ou imports imbriqués : on ne mesure que l'import le plus externe
+    if level or name in sys.modules or getattr(_local, "profondeur", 0):
+        return _import_original(name, globals, locals, fromlist, level)
+    _local.profondeur = 1
+    t0 = time.perf_counter()
+    try:
+        return _import_original(name, globals, locals, fromlist, level)
+    finally:
+        _local.profondeur = 0
+        IMPORTS[name] = IMPORTS.get(name, 0.0) + time.perf_counter() - t0
+
+
+def install():
+    """Branche le chronométrage des imports si le profilage est actif (idempotent)."""
+    if ACTIF and builtins.__import__ is not _import_chronometre:
+        builtins.__import__ = _import_chronometre
+
+
+@contextmanager
+def page(nom):
+    """Chronomètre un rendu de page."""
+    if not ACTIF:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        duree = time.perf_counter() - t0
+        stats = PAGES.get(nom)
+        if stats is None:
+            PAGES[nom] = {"premier_s": duree, "depuis_demarrage_s": time.perf_counter() - DEMARRAGE,
+                          "dernier_s": duree, "rendus": 1}
+        else:
+            stats["dernier_s"] = duree
+            stats["rendus"] += 1
+
+
+def rapport_markdown(top=15):
+    """Tableaux markdown des imports les plus coûteux et des temps de rendu par page."""
+    lignes = ["**Imports (premier chargement)**", "", "| Module | ms |", "|---|---:|"]
+    for nom, duree in sorted(IMPORTS.items(), key=lambda kv: -kv[1])[:top]:
+        lignes.append(f"| `{nom}` | {duree * 1000:.0f} |")
+    lignes += ["", "**Pages**", "", "| Page | 1er rendu (ms) | depuis démarrage (s) | dernier (ms) | rendus |", "|---|---:|---:|---:|---:|"]
+    for nom, s in PAGES.items():
+        lignes.append(f"| {nom} | {s['premier_s'] * 1000:.0f} | {s['depuis_demarrage_s']:.2f} | {s['dernier_s'] * 1000:.0f} | {s['rendus']} |")
+    return "\n".join(lignes)
@@ -0,0 +1,222 @@
+"""
+Rang d'un logement simulé parmi les logements similaires (« consomme plus que
+X % des maisons de zone H1 construites entre 1949 et 1974 »).
+
+Pour chaque segment (zone climatique × type de bâtiment × période, les clés du
+formulaire), on tient une esquisse de la distribution de la consommation et
+des émissions : un histogramme à seaux logarithmiques fixes (chaque seau couvre
+un facteur GAMMA = 1.02, soit 1 % d'erreur relative sur les valeurs, comme un
+DDSketch). Les seaux étant les mêmes partout, les esquisses se fusionnent par
+simple addition des effectifs, et se soustraient : la mise à jour
+hebdomadaire (`dpe.refresh update`) y ajoute les DPE reçus et en retire les DPE
+remplacés ou annulés, sans reconstruction — ce qu'un t-digest ou un KLL ne
+permet pas.
+
+Erreur de rang : la part des logements sous une valeur v est exacte à la masse
+du seau de v près (on interpole à l'intérieur du seau). Cette borne est rendue
+avec chaque rang (`erreur`) : elle ne dépasse quelques pour cent que si un
+segment concentre ses DPE sur très peu de valeurs (benchmarks/bench_quantiles.py
+la compare à l'erreur mesurée).
+
+Toutes les esquisses tiennent dans un tableau uint32 (segments × mesures × seaux,
+quelques centaines de Ko) mappé en mémoire ; un rang se calcule en quelques µs.
+
+    python -m dpe.quantiles donnees.parquet data/quantiles
+"""
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dpe.schema import VOCABULAIRE
+
+QUANTILES_PATH = Path("data/quantiles")
+
+# Clés de segment, dans l'ordre du formulaire
+SEGMENT = ("zone_clim", "type_bat", "periode")
+MESURES = ("conso", "ges")
+
+# Seaux : [0, V_MIN), puis [V_MIN·GAMMA^(i-1), V_MIN·GAMMA^i), puis [V_MAX, +inf)
+GAMMA = 1.02
+V_MIN, V_MAX = 0.1, 5000.0
+N_SEAUX = int(np.ceil(np.log(V_MAX / V_MIN) / np.log(GAMMA))) + 2
+
+# Segments de repli quand le segment complet compte trop peu de DPE
+NIVEAUX = (SEGMENT, ("zone_clim", "periode"), ("zone_clim",), ())
+EFFECTIF_MIN = 30
+
+_FORME = tuple(len(VOCABULAIRE[nom]) for nom in SEGMENT)
+# Une ligne par segment, plus une pour les DPE hors vocabulaire (comptés au niveau national)
+N_SEGMENTS = int(np.prod(_FORME)) + 1
+
+
+def seaux(valeurs) -> np.ndarray:
+    """Seau de chaque valeur (NaN : -1)."""
+    v = np.asarray(valeurs, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        i = np.floor(np.log(v / V_MIN) / np.log(GAMMA)).astype(np.int64, copy=False) + 1
+    i = np.where(v < V_MIN, 0, np.minimum(i, N_SEAUX - 1))
+    return np.where(np.isnan(v), -1, i)
+
+
+def _bornes(i):
+    if i == 0:
+        return 0.0, V_MIN
+    if i == N_SEAUX - 1:
+        return V_MAX, np.inf
+    return V_MIN * GAMMA ** (i - 1), V_MIN * GAMMA ** i
+
+
+def _segments(df: pd.DataFrame) -> np.ndarray:
+    codes = [pd.Categorical(df[nom].astype("string"), categories=VOCABULAIRE[nom]).codes.astype(np.int64)
+             for nom in SEGMENT]
+    segment = np.ravel_multi_index([np.maximum(c, 0) for c in codes], _FORME)
+    return np.where(np.logical_and.reduce([c >= 0 for c in codes]), segment, N_SEGMENTS - 1)
+
+
+def comptes(df: pd.DataFrame) -> np.ndarray:
+    """Effectifs (segments × mesures × seaux, int64) d'un bloc de DPE bruts (noms courts)."""
+    segment = _segments(df)
+    res = np.zeros((N_SEGMENTS, len(MESURES), N_SEAUX), dtype=np.int64)
+    for m, mesure in enumerate(MESURES):
+        s = seaux(pd.to_numeric(df[mesure], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan))
+        ok = s >= 0
+        res[:, m] += np.bincount(segment[ok] * N_SEAUX + s[ok], minlength=N_SEGMENTS * N_SEAUX).reshape(N_SEGMENTS, N_SEAUX)
+    return res
+
+
+def empreinte(dossier: Path = QUANTILES_PATH) -> str:
+    """Empreinte des esquisses (taille et date de quantiles.json, écrit en dernier)."""
+    dossier = Path(dossier)
+    st = (dossier / "quantiles.json").stat()
+    return hashlib.sha256(f"{dossier}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+class Esquisses:
+    """Esquisses de quantiles par segment ; additives (`fusionne`) et soustractives (`retire`)."""
+
+    def __init__(self, effectifs: np.ndarray = None):
+        if effectifs is None:
+            effectifs = np.zeros((N_SEGMENTS, len(MESURES), N_SEAUX), dtype=np.int64)
+        if effectifs.shape != (N_SEGMENTS, len(MESURES), N_SEAUX):
+            raise ValueError(f"Esquisses de forme {effectifs.shape}, attendu {(N_SEGMENTS, len(MESURES), N_SEAUX)}")
+        self.effectifs = effectifs
+
+    @classmethod
+    def depuis(cls, df: pd.DataFrame) -> "Esquisses":
+        return cls(comptes(df))
+
+    def fusionne(self, autre: "Esquisses") -> "Esquisses":
+        return Esquisses(self.effectifs.astype(np.int64) + autre.effectifs)
+
+    def retire(self, autre: "Esquisses") -> "Esquisses":
+        effectifs = self.effectifs.astype(np.int64) - autre.effectifs
+        if (effectifs < 0).any():
+            raise ValueError("Retrait de DPE absents des esquisses (registre et esquisses désynchronisés)")
+        return Esquisses(effectifs)
+
+    def save(self, dossier: Path = QUANTILES_PATH):
+        dossier = Path(dossier)
+        dossier.mkdir(parents=True, exist_ok=True)
+        tmp = dossier / "effectifs.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, self.effectifs.astype(np.uint32))
+        tmp.replace(dossier / "effectifs.npy")
+        meta = {"segment": list(SEGMENT), "mesures": list(MESURES), "gamma": GAMMA, "v_min": V_MIN, "v_max": V_MAX,
+                "n_dpe": int(self.effectifs[:, 0].sum())}
+        tmp = dossier / "quantiles.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        tmp.replace(dossier / "quantiles.json")
+        return meta
+
+    @classmethod
+    def open(cls, dossier: Path = QUANTILES_PATH, mmap=True) -> "Esquisses":
+        dossier = Path(dossier)
+        meta = json.loads((dossier / "quantiles.json").read_text())
+        if (tuple(meta["segment"]), meta["gamma"], meta["v_min"], meta["v_max"]) != (SEGMENT, GAMMA, V_MIN, V_MAX):
+            raise ValueError(f"Esquisses {dossier} construites avec d'autres seaux : relancer python -m dpe.quantiles")
+        return cls(np.load(dossier / "effectifs.npy", mmap_mode="r" if mmap else None))
+
+    def histogramme(self, segment: dict, mesure: str) -> np.ndarray:
+        """Effectifs par seau des DPE du segment (clés absentes de `segment` : toutes modalités)."""
+        m = MESURES.index(mesure)
+        if not segment:
+            return self.effectifs[:, m].sum(axis=0, dtype=np.int64)
+        selection = tuple(VOCABULAIRE[nom].index(segment[nom]) if nom in segment else slice(None) for nom in SEGMENT)
+        lignes = np.arange(N_SEGMENTS - 1).reshape(_FORME)[selection].ravel()
+        return self.effectifs[lignes, m].sum(axis=0, dtype=np.int64)
+
+    def rang(self, segment: dict, mesure: str, valeur: float) -> dict:
+        """
+        Part des DPE du segment dont la mesure est inférieure à `valeur` (`part`),
+        exacte à `erreur` près, et effectif du segment (`n`).
+        """
+        h = self.histogramme(segment, mesure)
+        n = int(h.sum())
+        if n == 0:
+            return {"part": None, "erreur": None, "n": 0}
+        i = int(seaux([valeur])[0])
+        bas, haut = _bornes(i)
+        if i == 0:
+            fraction = valeur / V_MIN
+        elif np.isinf(haut):
+            fraction = 0.5
+        else:
+            fraction = np.log(valeur / bas) / np.log(haut / bas)
+        return {"part": float((h[:i].sum() + h[i] * fraction) / n), "erreur": float(h[i] / n), "n": n}
+
+    def quantile(self, segment: dict, mesure: str, q: float) -> float:
+        """Valeur sous laquelle se trouvent une part `q` des DPE du segment (à GAMMA près)."""
+        h = self.histogramme(segment, mesure)
+        if h.sum() == 0:
+            return np.nan
+        cumul = np.cumsum(h)
+        i = int(np.searchsorted(cumul, q * cumul[-1]))
+        bas, haut = _bornes(min(i, N_SEAUX - 1))
+        return float(bas if np.isinf(haut) else np.sqrt(max(bas, V_MIN / GAMMA) * haut))
+
+    def rang_logement(self, valeurs: dict, mesure: str, valeur: float) -> dict:
+        """
+        Rang parmi les logements du segment du formulaire, en élargissant le segment
+        (NIVEAUX) tant qu'il compte moins de EFFECTIF_MIN DPE. `segment` donne les clés retenues.
+        """
+        for niveau in NIVEAUX:
+            if not all(valeurs.get(nom) in VOCABULAIRE[nom] for nom in niveau):
+                continue
+            segment = {nom: valeurs[nom] for nom in niveau}
+            res = self.rang(segment, mesure, valeur)
+            if res["n"] >= EFFECTIF_MIN or not niveau:
+                return {**res, "segment": segment}
+
+
+def build_quantiles(source: Path, sortie: Path = QUANTILES_PATH, batch_size=1_000_000) -> Esquisses:
+    """
+    Construit les esquisses en deux passes par blocs sur la base (CSV ADEME ou cache Parquet) :
+    repérage des DPE remplacés, qui ne comptent pas, puis comptage.
+    """
+    from dpe.ingest import iter_batches
+    from dpe.refresh import cles_remplacees, en_vigueur
+
+    remplaces = cles_remplacees(source, batch_size)
+    esquisses = Esquisses()
+    for bloc in iter_batches(source, columns=("numero_dpe",) + SEGMENT + MESURES, batch_size=batch_size):
+        esquisses.effectifs += comptes(bloc[en_vigueur(bloc, remplaces)])
+    esquisses.save(sortie)
+    return esquisses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit les esquisses de quantiles par segment du simulateur.")
+    parser.add_argument("source", type=Path, help="CSV ADEME ou cache Parquet")
+    parser.add_argument("sortie", type=Path, nargs="?", default=QUANTILES_PATH)
+    args = parser.parse_args()
+    esquisses = build_quantiles(args.source, args.sortie)
+    print(f"Esquisses enregistrées : {args.sortie} ({int(esquisses.effectifs[:, 0].sum()):,} DPE, "
+          f"{(args.sortie / 'effectifs.npy').stat().st_size / 1024:.0f} Ko)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Mise à jour hebdomadaire incrémentale des agrégats DPE.
+
+La base ADEME est mise à jour chaque semaine. Plutôt que de retraiter les
+13.6M lignes, on ne récupère que les DPE reçus depuis le dernier filigrane
+(date de réception) et on les applique en delta au cube d'agrégats (et aux
+esquisses de quantiles du simulateur, additives elles aussi) :
+
+* un DPE nouveau ajoute sa contribution ;
+* un DPE déjà connu (renvoyé, corrigé) retire son ancienne contribution puis ajoute la nouvelle ;
+* un DPE remplacé (`numero_dpe_remplace`) ou annulé retire sa contribution, et
+  reste au registre comme tombe : renvoyé plus tard, il n'est pas rajouté.
+
+La construction initiale (`init`) suit les mêmes règles que les constructions
+complètes (`dpe.cube`, `dpe.quantiles`, `dpe.comparables`) : une première passe
+repère les DPE remplacés, qui ne comptent nulle part.
+
+Pour retrouver l'ancienne contribution d'un DPE sans relire l'historique, on
+tient un registre en segments : un segment par passage, trié par clé (hash du
+numéro DPE), avec un index de clés .npy mappé en mémoire. Une recherche coûte
+une dichotomie par segment puis la lecture des seuls groupes de lignes
+concernés ; une mise à jour coûte donc le delta plus une réécriture du cube
+(quelques Mo), jamais une relecture de l'historique. La fusion des segments,
+qui relit tout le registre, est laissée à la commande `compact`.
+
+    python -m dpe.refresh init donnees.parquet
+    python -m dpe.refresh update export_semaine.csv [--annulations annules.csv]
+"""
+import argparse
+import json
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dpe.cube import (COLONNES_SOURCE, CUBE_PATH, MESURES, aggregate, aggregate_histogrammes, compact, histogrammes_path,
+                      load_cube, load_histogrammes, merge, merge_histogrammes, save_cube, save_histogrammes)
+from dpe.quantiles import QUANTILES_PATH, Esquisses
+from dpe.schema import COLONNES_ADEME
+
+REGISTRE_PATH = Path("data/registre")
+
+# Lignes par groupe Parquet d'un segment : granularité des lectures ciblées
+TAILLE_GROUPE = 16_384
+
+# Au-delà, `update` invite à lancer `compact`, qui fusionne les segments pour garder des recherches rapides
+MAX_SEGMENTS = 64
+
+
+def cles_dpe(numeros) -> np.ndarray:
+    """Clé uint64 stable d'un numéro DPE (hash vectorisé de pandas)."""
+    return pd.util.hash_pandas_object(pd.Series(numeros, dtype="string"), index=False).to_numpy(dtype=np.uint64)
+
+
+def cles_remplacees(source: Path, batch_size=1_000_000) -> np.ndarray:
+    """Clés (triées) des DPE remplacés par un DPE plus récent de la base : première passe par blocs."""
+    from dpe.ingest import iter_batches
+
+    cles = []
+    for bloc in iter_batches(source, columns=["numero_dpe_remplace"], batch_size=batch_size):
+        numeros = bloc["numero_dpe_remplace"].astype("string").replace("", pd.NA).dropna()
+        cles.append(cles_dpe(numeros))
+    return np.unique(np.concatenate(cles)) if cles else np.empty(0, dtype=np.uint64)
+
+
+def en_vigueur(bloc: pd.DataFrame, remplaces: np.ndarray) -> np.ndarray:
+    """Masque des lignes du bloc qui ne sont pas remplacées (`remplaces` : rendu par `cles_remplacees`)."""
+    if not len(remplaces):
+        return np.ones(len(bloc), dtype=bool)
+    return ~np.isin(cles_dpe(bloc["numero_dpe"]), remplaces)
+
+
+class FichierSource:
+    """
+    Source de DPE adossée à des fichiers locaux (export ADEME CSV/Parquet), qui
+    tient lieu de l'API ADEME : `fetch` ne rend que les lignes reçues depuis le filigrane.
+    Toute autre source (API) n'a qu'à fournir la même méthode `fetch`.
+    """
+
+    def __init__(self, path: Path, annulations: Path = None):
+        self.path = Path(path)
+        self.annulations = Path(annulations) if annulations is not None else None
+
+    def _lire(self, path):
+        df = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path, dtype=str)
+        return df.rename(columns=COLONNES_ADEME)
+
+    def fetch(self, depuis=None):
+        """(DPE reçus depuis `depuis`, numéros DPE annulés depuis `depuis`)."""
+        dpe = self._lire(self.path)
+        dpe["date_reception"] = pd.to_datetime(dpe["date_reception"])
+        for col in ("conso", "ges", "surface"):
+            dpe[col] = pd.to_numeric(dpe[col], errors="coerce")
+        annules = pd.Series([], dtype="string")
+        if self.annulations is not None:
+            ann = self._lire(self.annulations)
+            ann["date_annulation"] = pd.to_datetime(ann["date_annulation"])
+            if depuis is not None:
+                ann = ann[ann["date_annulation"] >= depuis]
+            annules = ann["numero_dpe"].astype("string")
+        if depuis is not None:
+            dpe = dpe[dpe["date_reception"] >= depuis]
+        return dpe, annules
+
+
+class Registre:
+    """Dernière version connue de chaque DPE, en segments triés par clé."""
+
+    def __init__(self, dossier: Path = REGISTRE_PATH):
+        self.dossier = Path(dossier)
+        self.etat_path = self.dossier / "etat.json"
+        if self.etat_path.exists():
+            self.etat = json.loads(self.etat_path.read_text())
+        else:
+            self.etat = {"segments": [], "watermark": None}
+
+    @property
+    def watermark(self):
+        return pd.Timestamp(self.etat["watermark"]) if self.etat["watermark"] else None
+
+    def save_etat(self):
+        self.dossier.mkdir(parents=True, exist_ok=True)
+        tmp = self.etat_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.etat, indent=1))
+        tmp.replace(self.etat_path)
+
+    def add_segment(self, lignes: pd.DataFrame):
+        """Écrit un segment (lignes avec `cle` et `actif`), trié par clé."""
+        if lignes.empty:
+            return
+        self.dossier.mkdir(parents=True, exist_ok=True)
+        nom = f"segment_{len(self.etat['segments']) + 1:05d}"
+        while (self.dossier / f"{nom}.parquet").exists():
+            nom += "b"
+        lignes = lignes.sort_values("cle", kind="stable").reset_index(drop=True)
+        pq.write_table(pa.Table.from_pandas(lignes, preserve_index=False), self.dossier / f"{nom}.parquet",
+                       row_group_size=TAILLE_GROUPE, compression="zstd")
+        np.save(self.dossier / f"{nom}.cles.npy", lignes["cle"].to_numpy(dtype=np.uint64))
+        self.etat["segments"].append(nom)
+
+    def lookup(self, cles: np.ndarray) -> pd.DataFrame:
+        """
+        Dernière version enregistrée de chaque clé (active ou non).
+        Les segments sont parcourus du plus récent au plus ancien ; seuls les
+        groupes de lignes contenant une clé cherchée sont lus.
+        """
+        restantes = np.unique(cles)
+        trouvees = []
+        for nom in reversed(self.etat["segments"]):
+            if not len(restantes):
+                break
+            index = np.load(self.dossier / f"{nom}.cles.npy", mmap_mode="r")
+            if not len(index):
+                continue
+            pos = np.searchsorted(index, restantes)
+            pos_ok = np.minimum(pos, len(index) - 1)
+            touche = (pos < len(index)) & (np.asarray(index[pos_ok]) == restantes)
+            if not touche.any():
+                continue
+            lignes = pos[touche]
+            fichier = pq.ParquetFile(self.dossier / f"{nom}.parquet")
+            groupes = np.unique(lignes // TAILLE_GROUPE)
+            table = fichier.read_row_groups(groupes.tolist()).to_pandas()
+            # Position des lignes dans la concaténation des groupes lus
+            debut = {g: i * TAILLE_GROUPE for i, g in enumerate(groupes)}
+            trouvees.append(table.iloc[[debut[l // TAILLE_GROUPE] + l % TAILLE_GROUPE for l in lignes]])
+            restantes = restantes[~touche]
+        if not trouvees:
+            return pd.DataFrame(columns=["cle", "actif", *COLONNES_SOURCE])
+        return pd.concat(trouvees, ignore_index=True)
+
+    def compact(self):
+        """
+        Fusionne tous les segments en un seul (coût proportionnel à l'historique : à lancer rarement).
+        La dernière version de chaque clé est gardée, tombes comprises : un DPE retiré le reste.
+        """
+        anciens = list(self.etat["segments"])
+        if len(anciens) <= 1:
+            return
+        versions = pd.concat(
+            [pd.read_parquet(self.dossier / f"{nom}.parquet").assign(_ordre=i) for i, nom in enumerate(anciens)],
+            ignore_index=True,
+        )
+        versions = versions.sort_values("_ordre").drop_duplicates("cle", keep="last").drop(columns="_ordre")
+        self.etat["segments"] = []
+        self.add_segment(versions)
+        self.save_etat()
+        for nom in anciens:
+            (self.dossier / f"{nom}.parquet").unlink()
+            (self.dossier / f"{nom}.cles.npy").unlink()
+
+
+def _lignes_registre(dpe: pd.DataFrame, actif=True) -> pd.DataFrame:
+    lignes = dpe[list(COLONNES_SOURCE)].copy()
+    for dim in COLONNES_SOURCE:
+        if dim not in ("conso", "ges", "surface"):
+            lignes[dim] = lignes[dim].astype("string")
+    lignes.insert(0, "actif", actif)
+    lignes.insert(0, "cle", cles_dpe(dpe["numero_dpe"]))
+    return lignes
+
+
+def init(source: Path, registre: Registre = None, cube_path: Path = CUBE_PATH, batch_size=1_000_000,
+         quantiles_path: Path = QUANTILES_PATH):
+    """
+    Construit le cube et ses histogrammes, les esquisses de quantiles et le registre à partir de la base
+    complète (une seule fois). Les DPE remplacés sont inscrits au registre comme
+    inactifs, sans contribution, comme s'ils avaient été retirés par `update`.
+    """
+    from dpe.ingest import iter_batches
+
+    registre = registre or Registre()
+    remplaces = cles_remplacees(source, batch_size)
+    partiels, histogrammes, watermark, esquisses = [], [], None, Esquisses()
+    colonnes = ("numero_dpe", "date_reception") + COLONNES_SOURCE
+    for bloc in iter_batches(source, columns=colonnes, batch_size=batch_size):
+        actif = en_vigueur(bloc, remplaces)
+        partiels.append(aggregate(bloc[actif]))
+        histogrammes.append(aggregate_histogrammes(bloc[actif]))
+        if len(partiels) >= 8:
+            partiels, histogrammes = [merge(*partiels)], [merge_histogrammes(*histogrammes)]
+        esquisses = esquisses.fusionne(Esquisses.depuis(bloc[actif]))
+        registre.add_segment(_lignes_registre(bloc, actif))
+        watermark = max(filter(pd.notna, [watermark, bloc["date_reception"].max()]), default=None)
+    save_histogrammes(merge_histogrammes(*histogrammes), histogrammes_path(cube_path))
+    save_cube(compact(merge(*partiels)), cube_path)
+    esquisses.save(quantiles_path)
+    registre.etat["watermark"] = str(watermark) if watermark is not None else None
+    registre.save_etat()
+    return registre
+
+
+def update(source, registre: Registre = None, cube_path: Path = CUBE_PATH, quantiles_path: Path = QUANTILES_PATH) -> dict:
+    """
+    Applique au cube et à ses histogrammes (et aux esquisses de quantiles, si elles existent) les DPE reçus
+    depuis le filigrane. Idempotent : rejouer la même semaine retire puis rajoute les
+    mêmes contributions.
+    """
+    registre = registre or Registre()
+    dpe, annules = source.fetch(registre.watermark)
+    dpe = dpe.sort_values("date_reception", kind="stable").drop_duplicates("numero_dpe", keep="last")
+
+    remplaces = dpe["numero_dpe_remplace"].astype("string").replace("", pd.NA).dropna() \
+        if "numero_dpe_remplace" in dpe else pd.Series([], dtype="string")
+    retires = pd.concat([remplaces, annules.astype("string")], ignore_index=True).drop_duplicates()
+    cles_retirees = cles_dpe(retires)
+    cles_recues = cles_dpe(dpe["numero_dpe"])
+
+    # Dernière version de tous les DPE touchés : contributions précédentes à retirer du cube,
+    # et DPE retirés lors d'un passage précédent (tombes), qu'un renvoi ne rétablit pas
+    connus = registre.lookup(np.concatenate([cles_recues, cles_retirees]))
+    actif = connus["actif"].astype(bool)
+    precedents = connus[actif]
+    eteints = connus.loc[~actif, "cle"].to_numpy(dtype=np.uint64)
+    ignores = np.isin(cles_recues, eteints)
+    actifs = dpe[~np.isin(cles_recues, cles_retirees) & ~ignores]
+
+    moins = aggregate(precedents)
+    moins[list(MESURES)] *= -1
+    cube = merge(load_cube(cube_path), aggregate(actifs), moins)
+    moins = aggregate_histogrammes(precedents)
+    moins["n"] *= -1
+    histogrammes = merge_histogrammes(load_histogrammes(histogrammes_path(cube_path)), aggregate_histogrammes(actifs), moins)
+    save_histogrammes(histogrammes, histogrammes_path(cube_path))
+    save_cube(cube, cube_path)
+    if (Path(quantiles_path) / "quantiles.json").exists():
+        esquisses = Esquisses.open(quantiles_path, mmap=False)
+        esquisses.fusionne(Esquisses.depuis(actifs)).retire(Esquisses.depuis(precedents)).save(quantiles_path)
+
+    nouvelles = [_lignes_registre(actifs)]
+    if len(retires):
+        tombes = pd.DataFrame({"cle": cles_retirees, "actif": False})
+        nouvelles.append(tombes.reindex(columns=nouvelles[0].columns))
+    registre.add_segment(pd.concat(nouvelles, ignore_index=True).astype({"actif": bool}))
+    if len(dpe):
+        registre.etat["watermark"] = str(max(filter(pd.notna, [registre.watermark, dpe["date_reception"].max()])))
+    registre.save_etat()
+    if len(registre.etat["segments"]) > MAX_SEGMENTS:
+        warnings.warn(f"Registre de {len(registre.etat['segments'])} segments : lancer `python -m dpe.refresh compact`")
+    return {"recus": len(dpe), "retires": int(len(precedents)), "ajoutes": len(actifs),
+            "annules_ou_remplaces": len(retires), "deja_retires": int(ignores.sum())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mise à jour incrémentale du cube d'agrégats DPE.")
+    commandes = parser.add_subparsers(dest="commande", required=True)
+    p_init = commandes.add_parser("init", help="construction initiale depuis la base complète")
+    p_init.add_argument("source", type=Path)
+    p_update = commandes.add_parser("update", help="applique les DPE reçus depuis le dernier passage")
+    p_update.add_argument("fichier", type=Path, help="export ADEME (CSV/Parquet) couvrant au moins la période")
+    p_update.add_argument("--annulations", type=Path, help="CSV numero_dpe,date_annulation")
+    commandes.add_parser("compact", help="fusionne les segments du registre")
+    args = parser.parse_args()
+
+    if args.commande == "init":
+        registre = init(args.source)
+        print(f"Registre initialisé ({len(registre.etat['segments'])} segments), filigrane {registre.watermark}")
+    elif args.commande == "update":
+        print(update(FichierSource(args.fichier, args.annulations)))
+    else:
+        Registre().compact()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Scénarios de rénovation : quels travaux font sortir un logement de sa classe ?
+
+À partir d'un logement du simulateur, on énumère toutes les combinaisons de
+travaux sur les postes améliorables (isolation, chauffage, émetteurs, ECS),
+on les évalue en un seul appel au modèle et on étiquette le lot d'un coup
+(classes_dpe_codes), puis on retient pour chaque classe meilleure que
+l'actuelle le bouquet de travaux le moins cher qui l'atteint.
+
+Les coûts sont des ordres de grandeur (fourniture et pose, TTC) servant à
+classer les bouquets entre eux, pas des devis.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from dpe.classes import CLASSES, classes_prediction_codes
+
+# Poste -> {modalité visée: (coût fixe €, coût €/m² habitable)}
+LEVIERS = {
+    "iso_mur": {"Bonne": (0, 110), "Très bonne": (0, 160)},
+    "iso_toit": {"Bonne": (0, 35), "Très bonne": (0, 55)},
+    "iso_env": {"Bonne": (0, 60), "Très bonne": (0, 100)},
+    "generateur_chauff": {"Chaudière condensation": (6_000, 0), "PAC air/eau": (13_000, 0), "Poêle bois": (5_000, 0)},
+    "energie_chauff": {"Gaz naturel": (1_500, 0), "Électricité": (0, 0), "Bois": (0, 0)},
+    "emetteur": {"Radiateur bitube": (0, 35), "Plancher chauffant": (0, 90)},
+    "energie_ecs": {"Électricité": (2_500, 0), "Gaz": (2_000, 0)},
+}
+
+# Postes ordonnés (vocabulaire du pire au meilleur) : seules les améliorations sont proposées
+ORDONNES = ("iso_mur", "iso_toit", "iso_env")
+
+# Énergies possibles pour chaque générateur ; la combinaison saisie reste toujours admise
+ENERGIES_GENERATEUR = {
+    "Chaudière gaz standard": ("Gaz naturel",),
+    "Chaudière condensation": ("Gaz naturel", "Fioul"),
+    "PAC air/eau": ("Électricité",),
+    "Radiateur élec": ("Électricité",),
+    "Poêle bois": ("Bois",),
+}
+
+LIBELLES = {
+    "iso_mur": "Isolation des murs",
+    "iso_toit": "Isolation du plancher haut",
+    "iso_env": "Isolation de l'enveloppe",
+    "generateur_chauff": "Générateur de chauffage",
+    "energie_chauff": "Énergie de chauffage",
+    "emetteur": "Émetteurs",
+    "energie_ecs": "Énergie ECS",
+}
+
+
+def _options(nom, actuelle, vocabulaire):
+    """Modalités envisageables pour un poste : l'actuelle d'abord, puis les travaux possibles."""
+    cibles = [m for m in LEVIERS[nom] if m != actuelle]
+    if nom in ORDONNES:
+        rang = vocabulaire[nom].index(actuelle)
+        cibles = [m for m in cibles if vocabulaire[nom].index(m) > rang]
+    return [actuelle] + cibles
+
+
+def scenarios(valeurs: dict, vocabulaire) -> pd.DataFrame:
+    """
+    Toutes les combinaisons cohérentes de travaux pour le logement `valeurs` (ligne 0 : aucun travaux).
+    Colonnes : les postes, `travaux` (nombre de postes modifiés) et `cout` (€).
+    """
+    options = {nom: _options(nom, valeurs[nom], vocabulaire) for nom in LEVIERS}
+    grille = np.meshgrid(*(np.arange(len(o)) for o in options.values()), indexing="ij")
+    indices = {nom: g.ravel() for nom, g in zip(options, grille)}
+
+    # Un générateur ne fonctionne qu'avec certaines énergies
+    generateurs, energies = options["generateur_chauff"], options["energie_chauff"]
+    compatible = np.array([
+        [(g, e) == (generateurs[0], energies[0]) or e in ENERGIES_GENERATEUR.get(g, ()) for e in energies]
+        for g in generateurs
+    ])
+    garde = compatible[indices["generateur_chauff"], indices["energie_chauff"]]
+    indices = {nom: i[garde] for nom, i in indices.items()}
+
+    # Coût et nombre de postes calculés par option (l'option 0 est l'existant), puis répartis sur la grille
+    surface = float(valeurs["surface"])
+    travaux = np.zeros(garde.sum(), dtype=np.int8)
+    cout = np.zeros(garde.sum())
+    for nom, i in indices.items():
+        cout_option = np.array([0.0] + [fixe + par_m2 * surface for fixe, par_m2 in map(LEVIERS[nom].get, options[nom][1:])])
+        travaux += i > 0
+        cout += cout_option[i]
+    df = pd.DataFrame({nom: np.asarray(options[nom], dtype=object)[i] for nom, i in indices.items()})
+    return df.assign(travaux=travaux, cout=cout.round(-2))
+
+
+def evalue(modele, valeurs: dict):
+    """
+    Évalue tous les scénarios en un appel au modèle ; renvoie (scénarios + conso, ges, etiquette ; durées en ms).
+    """
+    t0 = time.perf_counter()
+    df = scenarios(valeurs, modele.vocabulaire)
+    X = modele.encoder.encode_frame(df.assign(**{nom: v for nom, v in valeurs.items() if nom not in LEVIERS}))
+    t1 = time.perf_counter()
+    pred = modele.predict(X)
+    t2 = time.perf_counter()
+    # Étiquetage sur les valeurs arrondies, comme l'affichage du simulateur
+    conso, ges = np.round(pred[:, 0]), np.round(pred[:, 1])
+    df = df.assign(conso=conso, ges=ges, etiquette=np.asarray(list(CLASSES))[classes_prediction_codes(conso, ges)])
+    t3 = time.perf_counter()
+    durees = {"enumeration_ms": (t1 - t0) * 1000, "prediction_ms": (t2 - t1) * 1000, "etiquetage_ms": (t3 - t2) * 1000}
+    return df, durees
+
+
+def meilleurs_parcours(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pour chaque classe meilleure que celle du logement (ligne 0), le bouquet le moins cher qui l'atteint
+    (à coût égal : le moins de postes, puis la plus faible consommation).
+    """
+    actuelle = CLASSES.index(df["etiquette"].iat[0])
+    rang = df["etiquette"].map(CLASSES.index)
+    ordre = df.assign(rang=rang).sort_values(["cout", "travaux", "conso"], kind="stable")
+    lignes = []
+    for cible in range(actuelle - 1, -1, -1):
+        atteint = ordre[ordre["rang"] <= cible]
+        if atteint.empty:
+            break
+        meilleur = atteint.iloc[0]
+        lignes.append({
+            "classe_visee": CLASSES[cible],
+            "classe_obtenue": meilleur["etiquette"],
+            "cout": meilleur["cout"],
+            "travaux": [f"{LIBELLES[nom]} : {meilleur[nom]}" for nom in LEVIERS if meilleur[nom] != df[nom].iat[0]],
+            "conso": meilleur["conso"],
+            "ges": meilleur["ges"],
+        })
+    return pd.DataFrame(lignes, columns=["classe_visee", "classe_obtenue", "cout", "travaux", "conso", "ges"])
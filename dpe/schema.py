@@ -0,0 +1,107 @@
+"""
+Schéma des données ADEME utilisées par le projet.
+
+Les colonnes de l'export « DPE Logements existants (depuis juillet 2021) » sont
+renommées en noms courts, identiques aux champs du formulaire du simulateur.
+"""
+
+# Colonne ADEME -> nom court utilisé dans le projet
+COLONNES_ADEME = {
+    "N°DPE": "numero_dpe",
+    "N°_DPE_remplacé": "numero_dpe_remplace",
+    "Date_réception_DPE": "date_reception",
+    "Etiquette_DPE": "etiquette_dpe",
+    "Etiquette_GES": "etiquette_ges",
+    "Conso_5_usages_par_m²_é_primaire": "conso",
+    "Emission_GES_5_usages_par_m²": "ges",
+    "Type_bâtiment": "type_bat",
+    "Surface_habitable_logement": "surface",
+    "Période_construction": "periode",
+    "Classe_altitude": "altitude",
+    "Zone_climatique_": "zone_clim",
+    "N°_département_(BAN)": "departement",
+    "N°_région_(BAN)": "region",
+    "Classe_inertie_bâtiment": "inertie",
+    "Qualité_isolation_murs": "iso_mur",
+    "Qualité_isolation_plancher_haut_toit_terrase": "iso_toit",
+    "Qualité_isolation_enveloppe": "iso_env",
+    "Type_installation_chauffage": "chauffage_type",
+    "Type_générateur_n°1_installation_n°1": "generateur_chauff",
+    "Type_énergie_principale_chauffage": "energie_chauff",
+    "Type_émetteur_installation_chauffage_n°1": "emetteur",
+    "Type_installation_ECS_(général)": "ecs_type",
+    "Type_énergie_principale_ECS": "energie_ecs",
+    "Type_énergie_n°1": "e1",
+    "Type_énergie_générateur_n°1_ECS": "e1_ecs",
+    "Type_énergie_n°2": "e2",
+    "Générateur_chauffage_principal_ECS": "gen_ecs",
+}
+
+# Mesures continues : stockées en float32
+NUMERIQUES = ("conso", "ges", "surface")
+
+# Identifiants : chaînes libres, jamais catégorielles
+IDENTIFIANTS = ("numero_dpe", "numero_dpe_remplace")
+
+DATES = ("date_reception",)
+
+# Tout le reste est une modalité répétée : stocké en catégoriel
+CATEGORIELLES = tuple(
+    nom for nom in COLONNES_ADEME.values()
+    if nom not in NUMERIQUES + IDENTIFIANTS + DATES
+)
+
+# Modalités proposées par le formulaire du simulateur, dans l'ordre d'affichage.
+# C'est aussi le vocabulaire des variables explicatives du modèle.
+VOCABULAIRE = {
+    "type_bat": ["Maison", "Appartement", "Immeuble"],
+    "periode": ["Avant 1948", "1949-1974", "1975-1988", "1989-1999", "2000-2005", "2006-2012", "Après 2013"],
+    "altitude": ["< 400m", "400-800m", "> 800m"],
+    "zone_clim": ["H1", "H2", "H3"],
+    "inertie": ["Très légère", "Légère", "Moyenne", "Lourde", "Très lourde"],
+    "iso_mur": ["Inconnue", "Non isolé", "Moyenne", "Bonne", "Très bonne"],
+    "iso_toit": ["Inconnue", "Non isolé", "Moyenne", "Bonne", "Très bonne"],
+    "iso_env": ["Insuffisante", "Moyenne", "Bonne", "Très bonne"],
+    "chauffage_type": ["Individuel", "Collectif"],
+    "generateur_chauff": ["Chaudière gaz standard", "Chaudière condensation", "PAC air/eau", "Radiateur élec", "Poêle bois"],
+    "energie_chauff": ["Électricité", "Gaz naturel", "Fioul", "Bois", "Réseau de chaleur"],
+    "emetteur": ["Radiateur bitube", "Radiateur monotube", "Plancher chauffant"],
+    "ecs_type": ["Individuel", "Collectif"],
+    "energie_ecs": ["Électricité", "Gaz", "Fioul"],
+    "e1": ["Aucune", "Électricité", "Gaz"],
+    "e1_ecs": ["Aucune", "Électricité", "Gaz"],
+    "e2": ["Aucune", "Bois", "Solaire"],
+    "gen_ecs": ["Indépendant", "Combiné"],
+}
+
+# Libellés des champs du formulaire, repris dans les explications du simulateur
+LIBELLES = {
+    "type_bat": "Type de bâtiment",
+    "surface": "Surface habitable",
+    "periode": "Période de construction",
+    "altitude": "Classe d'altitude",
+    "zone_clim": "Zone climatique",
+    "inertie": "Inertie du bâtiment",
+    "iso_mur": "Isolation murs",
+    "iso_toit": "Isolation plancher haut",
+    "iso_env": "Qualité isolation enveloppe",
+    "chauffage_type": "Type installation chauffage",
+    "generateur_chauff": "Générateur chauffage principal",
+    "energie_chauff": "Énergie chauffage principale",
+    "emetteur": "Type émetteur",
+    "ecs_type": "Type installation ECS",
+    "energie_ecs": "Énergie ECS",
+    "e1": "Type énergie n°1",
+    "e1_ecs": "Type énergie générateur n°1 ECS",
+    "e2": "Type énergie n°2",
+    "gen_ecs": "Générateur chauffage principal ECS",
+}
+
+# Variables explicatives du modèle (ordre des colonnes de la matrice) et cibles
+FEATURES = (
+    "type_bat", "surface", "periode", "altitude", "zone_clim",
+    "inertie", "iso_mur", "iso_toit", "iso_env",
+    "chauffage_type", "generateur_chauff", "energie_chauff", "emetteur", "ecs_type", "energie_ecs",
+    "e1", "e1_ecs", "e2", "gen_ecs",
+)
+CIBLES = ("conso", "ges")
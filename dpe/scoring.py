@@ -0,0 +1,132 @@
+"""
+Notation en masse d'un parc de logements avec le modèle du simulateur.
+
+Le CSV d'entrée est lu par lots : chaque lot est encodé comme le formulaire
+(mêmes colonnes, même vocabulaire ; noms courts de dpe.schema ou noms de
+l'export ADEME), les prédictions (conso, ges) sont réparties sur un pool de
+processus, puis l'étiquette DPE est calculée avec le double seuil et le lot est
+ajouté au fichier de sortie, dans l'ordre d'entrée. Chaque processus ouvre le
+modèle compilé mappé en mémoire : ils en partagent tous les pages.
+
+    python -m dpe.scoring parc.csv parc_note.csv --processes 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dpe.classes import CLASSES, classes_prediction_codes
+from dpe.model import MODEL_PATH, ModeleDPE
+from dpe.schema import COLONNES_ADEME
+
+TAILLE_LOT = 50_000
+COLONNES_PREDICTION = ("conso_pred", "ges_pred", "etiquette_dpe_pred")
+
+# Modèle du processus de travail, ouvert une fois par l'initialiseur du pool
+_MODELE = None
+
+
+def _init_worker(model_path):
+    global _MODELE
+    _MODELE = ModeleDPE.load(model_path)
+
+
+def _predict(X):
+    return _MODELE.predict(X)
+
+
+def iter_lots(source: Path, features, categorielles=(), taille_lot=TAILLE_LOT):
+    """Lots du CSV d'entrée, colonnes renommées en noms courts ; erreur si une caractéristique manque."""
+    entete = pd.read_csv(source, nrows=0).columns
+    noms = {col: COLONNES_ADEME.get(col, col) for col in entete}
+    manquantes = [nom for nom in features if nom not in noms.values()]
+    if manquantes:
+        raise ValueError(f"Colonnes absentes de {source} : {', '.join(manquantes)}")
+    # Les modalités sont lues telles quelles (« 1 » ne doit pas devenir 1.0)
+    dtypes = {col: "string" for col, nom in noms.items() if nom in categorielles}
+    for lot in pd.read_csv(source, dtype=dtypes, chunksize=taille_lot, low_memory=True):
+        yield lot.rename(columns=noms)
+
+
+def ajoute_predictions(lot: pd.DataFrame, pred: np.ndarray) -> pd.DataFrame:
+    """
+    Colonnes conso_pred, ges_pred et etiquette_dpe_pred à partir des prédictions (n, 2).
+    L'étiquette est celle des valeurs arrondies, comme dans le simulateur.
+    """
+    conso, ges = pred[:, 0], pred[:, 1]
+    return lot.assign(**{
+        COLONNES_PREDICTION[0]: conso,
+        COLONNES_PREDICTION[1]: ges,
+        COLONNES_PREDICTION[2]: np.asarray(list(CLASSES))[classes_prediction_codes(conso, ges)],
+    })
+
+
+def score_frame(modele: ModeleDPE, df: pd.DataFrame) -> pd.DataFrame:
+    """Note un DataFrame en mémoire, dans le processus courant."""
+    return ajoute_predictions(df, modele.predict_frame(df))
+
+
+def score_csv(source: Path, sortie: Path, model_path: Path = MODEL_PATH, processes=None, taille_lot=TAILLE_LOT) -> dict:
+    """
+    Note le CSV `source` et écrit `sortie` (colonnes d'entrée + prédictions) lot par lot.
+    `processes` vaut par défaut le nombre de cœurs ; 1 note dans le processus courant.
+    La mémoire est bornée par quelques lots en vol, pas par la taille du fichier.
+    """
+    source, sortie = Path(source), Path(sortie)
+    processes = processes or os.cpu_count()
+    # L'encodage et l'écriture restent dans ce processus : les workers ne reçoivent que des matrices float32
+    modele = ModeleDPE.load(model_path)
+    lots = iter_lots(source, modele.features, modele.vocabulaire, taille_lot)
+
+    t0 = time.perf_counter()
+    lignes = 0
+    tmp = sortie.with_name(sortie.name + ".tmp")
+
+    def ecrit(lot, pred, entete):
+        nonlocal lignes
+        ajoute_predictions(lot, pred).to_csv(tmp, mode="w" if entete else "a", header=entete, index=False, float_format="%.2f")
+        lignes += len(lot)
+
+    if processes == 1:
+        for i, lot in enumerate(lots):
+            ecrit(lot, modele.predict(modele.encoder.encode_frame(lot)), i == 0)
+    else:
+        with mp.get_context("spawn").Pool(processes, initializer=_init_worker, initargs=(str(model_path),)) as pool:
+            en_vol = deque()
+            for lot in lots:
+                en_vol.append((lot, pool.apply_async(_predict, (modele.encoder.encode_frame(lot),))))
+                # Deux lots en attente par processus suffisent à les occuper sans lire tout le fichier
+                if len(en_vol) >= 2 * processes:
+                    lot, resultat = en_vol.popleft()
+                    ecrit(lot, resultat.get(), lignes == 0)
+            while en_vol:
+                lot, resultat = en_vol.popleft()
+                ecrit(lot, resultat.get(), lignes == 0)
+    if lignes == 0:
+        pd.DataFrame(columns=list(COLONNES_PREDICTION)).to_csv(tmp, index=False)
+    tmp.replace(sortie)
+    secondes = time.perf_counter() - t0
+    return {"lignes": lignes, "secondes": secondes, "lignes_par_s": lignes / secondes if secondes else float("nan"),
+            "processes": processes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Note un parc de logements (CSV) avec le modèle du simulateur.")
+    parser.add_argument("source", type=Path, help="CSV avec les colonnes du formulaire du simulateur")
+    parser.add_argument("sortie", type=Path)
+    parser.add_argument("--modele", type=Path, default=MODEL_PATH)
+    parser.add_argument("--processes", type=int, default=None, help="par défaut, tous les cœurs")
+    parser.add_argument("--taille-lot", type=int, default=TAILLE_LOT)
+    args = parser.parse_args()
+    stats = score_csv(args.source, args.sortie, args.modele, args.processes, args.taille_lot)
+    print(f"{stats['lignes']:,} logements notés en {stats['secondes']:.1f} s "
+          f"({stats['lignes_par_s']:,.0f} lignes/s, {stats['processes']} processus) : {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
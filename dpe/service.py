@@ -0,0 +1,386 @@
+"""
+Service HTTP de notation : le modèle du simulateur sans l'interface Streamlit.
+
+Mêmes briques que app.py : encodage du formulaire (FeatureEncoder), modèle
+compilé mappé en mémoire et rechargé quand l'artefact change, cache de
+prédictions et file d'inférence par micro-lots pour les appels unitaires,
+étiquette calculée sur les valeurs arrondies comme à l'affichage du simulateur.
+
+    POST /v1/predict        un logement (objet JSON des champs du formulaire)
+    POST /v1/predict/batch  un lot : JSON (liste d'objets ou colonnes) ou
+                            Arrow IPC (application/vnd.apache.arrow.stream)
+    GET  /metrics           métriques au format texte Prometheus
+    GET  /healthz
+
+Serveur HTTP/1.1 de la bibliothèque standard (connexions keep-alive, un thread
+par connexion). `ClientLocal` appelle le service sans socket, pour les tests.
+
+    python -m dpe.service --port 8000
+"""
+import argparse
+import functools
+import io
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dpe.batching import FileInference
+from dpe.classes import CLASSES, classe_ges, classe_prediction, classes_dpe_codes, classes_prediction_codes
+from dpe.model import MODEL_PATH, ModeleDPE, empreinte_artefact
+from dpe.predictions import CachePredictions
+
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+PROMETHEUS = "text/plain; version=0.0.4"
+
+MAX_CORPS = 16 * 2**20
+MAX_LIGNES = 100_000
+# Lignes prédites à la fois dans un lot : la mémoire de travail d'une requête ne dépend pas de sa taille
+LOT_PREDICTION = 4096
+# Attente maximale d'une prédiction unitaire dans la file d'inférence (secondes)
+TIMEOUT_INFERENCE = 30.0
+ROUTES = ("/healthz", "/metrics", "/v1/predict", "/v1/predict/batch")
+BORNES_DUREE = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class ErreurRequete(Exception):
+    def __init__(self, statut, message):
+        super().__init__(message)
+        self.statut = statut
+
+
+class Metriques:
+    """Compteurs et histogrammes de durée par route, exposés au format texte Prometheus."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.requetes = {}
+        self.durees = {}
+        self.lignes = 0
+
+    def observe(self, route, statut, duree, lignes=0):
+        with self._verrou:
+            self.requetes[route, statut] = self.requetes.get((route, statut), 0) + 1
+            buckets, somme, n = self.durees.get(route, ([0] * len(BORNES_DUREE), 0.0, 0))
+            buckets = [b + (duree <= borne) for b, borne in zip(buckets, BORNES_DUREE)]
+            self.durees[route] = (buckets, somme + duree, n + 1)
+            self.lignes += lignes
+
+    def texte(self, extra=()):
+        with self._verrou:
+            lignes = ["# TYPE dpe_requetes_total counter"]
+            for (route, statut), n in sorted(self.requetes.items()):
+                lignes.append(f'dpe_requetes_total{{route="{route}",code="{statut}"}} {n}')
+            lignes.append("# TYPE dpe_duree_requete_secondes histogram")
+            for route, (buckets, somme, n) in sorted(self.durees.items()):
+                for borne, b in zip(BORNES_DUREE, buckets):
+                    lignes.append(f'dpe_duree_requete_secondes_bucket{{route="{route}",le="{borne}"}} {b}')
+                lignes.append(f'dpe_duree_requete_secondes_bucket{{route="{route}",le="+Inf"}} {n}')
+                lignes.append(f'dpe_duree_requete_secondes_sum{{route="{route}"}} {somme:.6f}')
+                lignes.append(f'dpe_duree_requete_secondes_count{{route="{route}"}} {n}')
+            lignes += ["# TYPE dpe_logements_notes_total counter", f"dpe_logements_notes_total {self.lignes}"]
+        return "\n".join(lignes + list(extra)) + "\n"
+
+
+class ServiceDPE:
+    """Logique du service, indépendante du transport : `handle` prend et rend des octets."""
+
+    def __init__(self, model_path: Path = MODEL_PATH, max_corps=MAX_CORPS, max_lignes=MAX_LIGNES,
+                 timeout_inference=TIMEOUT_INFERENCE):
+        self.model_path = Path(model_path)
+        self.max_corps = max_corps
+        self.max_lignes = max_lignes
+        self.timeout_inference = timeout_inference
+        self.cache = CachePredictions()
+        self.metriques = Metriques()
+        self._verrou = threading.Lock()
+        self._empreinte = None
+        self._modele = None
+        self._file = None
+        # File d'inférence -> requêtes en cours qui s'en servent
+        self._utilisateurs = {}
+
+    @contextmanager
+    def _courant(self):
+        """
+        Modèle et file d'inférence de l'artefact actuel, rechargés s'il a été réécrit.
+        Une file remplacée n'est fermée qu'une fois libérée par la dernière requête qui l'utilisait.
+        """
+        empreinte = empreinte_artefact(self.model_path)
+        with self._verrou:
+            if empreinte != self._empreinte:
+                modele = ModeleDPE.load(self.model_path)
+                ancienne, self._file = self._file, FileInference(modele.predict)
+                self._modele, self._empreinte = modele, empreinte
+                self._utilisateurs[self._file] = 0
+                if ancienne is not None and self._utilisateurs[ancienne] == 0:
+                    del self._utilisateurs[ancienne]
+                    ancienne.fermer()
+            modele, file, empreinte = self._modele, self._file, self._empreinte
+            self._utilisateurs[file] += 1
+        try:
+            yield modele, file, empreinte
+        finally:
+            with self._verrou:
+                self._utilisateurs[file] -= 1
+                fermer = file is not self._file and self._utilisateurs[file] == 0
+                if fermer:
+                    del self._utilisateurs[file]
+            if fermer:
+                file.fermer()
+
+    # --- routes ---
+
+    def predict_one(self, valeurs: dict) -> dict:
+        with self._courant() as (modele, file, empreinte):
+            manquants = [nom for nom in modele.features if nom not in valeurs]
+            if manquants:
+                raise ErreurRequete(400, f"Champs manquants : {', '.join(manquants)}")
+            try:
+                predict = functools.partial(file.predict, timeout=self.timeout_inference)
+                conso, ges, _ = self.cache.predict_one(modele, valeurs, empreinte, predict)
+            except (TypeError, ValueError) as erreur:
+                raise ErreurRequete(400, f"Valeur invalide : {erreur}")
+            except TimeoutError:
+                raise ErreurRequete(503, f"Pas de prédiction en {self.timeout_inference:.0f} s : service surchargé")
+        # Étiquette sur les valeurs arrondies, comme l'affichage du simulateur
+        etiquette = classe_prediction(conso, ges)
+        conso, ges = round(conso), round(ges)
+        return {"conso": conso, "ges": ges, "etiquette": etiquette, "etiquette_ges": classe_ges(ges)}
+
+    def predict_batch(self, df: pd.DataFrame) -> pd.DataFrame:
+        with self._courant() as (modele, _, _):
+            return self._predict_batch(modele, df)
+
+    def _predict_batch(self, modele, df):
+        if len(df) > self.max_lignes:
+            raise ErreurRequete(413, f"Lot de {len(df)} logements : maximum {self.max_lignes}")
+        manquants = [nom for nom in modele.features if nom not in df.columns]
+        if manquants:
+            raise ErreurRequete(400, f"Colonnes manquantes : {', '.join(manquants)}")
+        # Un lot est déjà un gros appel : il va directement au modèle, par tranches de LOT_PREDICTION
+        pred = np.empty((len(df), 2))
+        if len(df):
+            X = modele.encoder.encode_frame(df)
+            for debut in range(0, len(df), LOT_PREDICTION):
+                pred[debut:debut + LOT_PREDICTION] = modele.predict(X[debut:debut + LOT_PREDICTION])
+        conso, ges = np.round(pred[:, 0]), np.round(pred[:, 1])
+        # Étiquettes catégorielles : un dictionnaire de 7 lettres + un code par ligne en Arrow
+        return pd.DataFrame({
+            "conso": conso.astype(np.int32),
+            "ges": ges.astype(np.int32),
+            "etiquette": pd.Categorical.from_codes(classes_prediction_codes(conso, ges), categories=list(CLASSES)),
+            "etiquette_ges": pd.Categorical.from_codes(classes_dpe_codes(0, ges), categories=list(CLASSES)),
+        })
+
+    def metrics(self) -> str:
+        extra = []
+        c = self.cache.stats()
+        extra += ["# TYPE dpe_cache_hits_total counter", f"dpe_cache_hits_total {c['hits']}",
+                  "# TYPE dpe_cache_misses_total counter", f"dpe_cache_misses_total {c['misses']}",
+                  "# TYPE dpe_cache_entrees gauge", f"dpe_cache_entrees {c['entrees']}"]
+        if self._file is not None:
+            f = self._file.stats()
+            extra += ["# TYPE dpe_lots_inference_total counter", f"dpe_lots_inference_total {f['lots']}",
+                      "# TYPE dpe_lignes_inference_total counter", f"dpe_lignes_inference_total {f['lignes']}"]
+        if self._empreinte is not None:
+            extra += ["# TYPE dpe_modele_info gauge", f'dpe_modele_info{{empreinte="{self._empreinte}"}} 1']
+        return self.metriques.texte(extra)
+
+    # --- transport ---
+
+    def handle(self, methode, chemin, entetes, corps: bytes):
+        """Traite une requête ; renvoie (statut, type de contenu, corps)."""
+        t0 = time.perf_counter()
+        route, lignes = chemin.split("?", 1)[0], 0
+        try:
+            if "Content-Length" in entetes:
+                taille_corps(entetes, self.max_corps)
+            if len(corps) > self.max_corps:
+                raise ErreurRequete(413, f"Corps de {len(corps)} octets : maximum {self.max_corps}")
+            if route == "/healthz" and methode == "GET":
+                reponse = (200, JSON, b'{"statut": "ok"}')
+            elif route == "/metrics" and methode == "GET":
+                reponse = (200, PROMETHEUS, self.metrics().encode())
+            elif route == "/v1/predict" and methode == "POST":
+                valeurs = _lire_json(corps)
+                if not isinstance(valeurs, dict):
+                    raise ErreurRequete(400, "Objet JSON attendu")
+                reponse, lignes = (200, JSON, json.dumps(self.predict_one(valeurs)).encode()), 1
+            elif route == "/v1/predict/batch" and methode == "POST":
+                type_requete = _type(entetes.get("Content-Type", JSON))
+                df = _lire_lot(corps, type_requete)
+                resultat = self.predict_batch(df)
+                reponse, lignes = (200, *_ecrire_lot(resultat, _type(entetes.get("Accept") or type_requete))), len(df)
+            elif route in ROUTES:
+                raise ErreurRequete(405, f"Méthode {methode} non permise sur {route}")
+            else:
+                raise ErreurRequete(404, f"Route inconnue : {route}")
+        except ErreurRequete as erreur:
+            reponse = (erreur.statut, JSON, json.dumps({"erreur": str(erreur)}, ensure_ascii=False).encode())
+        except Exception as erreur:
+            reponse = (500, JSON, json.dumps({"erreur": f"{type(erreur).__name__} : {erreur}"}, ensure_ascii=False).encode())
+        self.metriques.observe(_route_metrique(route), reponse[0], time.perf_counter() - t0, lignes)
+        return reponse
+
+
+def taille_corps(entetes, max_corps) -> int:
+    """Taille annoncée par Content-Length (0 si absent) ; 400 si invalide ou négative, 413 au-delà de `max_corps`."""
+    brut = entetes.get("Content-Length")
+    if brut is None:
+        return 0
+    try:
+        taille = int(brut)
+    except ValueError:
+        raise ErreurRequete(400, f"Content-Length invalide : {brut!r}")
+    if taille < 0:
+        raise ErreurRequete(400, f"Content-Length négatif : {taille}")
+    if taille > max_corps:
+        raise ErreurRequete(413, f"Corps de {taille} octets : maximum {max_corps}")
+    return taille
+
+
+def _route_metrique(chemin):
+    # Les routes inconnues sont regroupées pour ne pas multiplier les séries de métriques
+    route = chemin.split("?", 1)[0]
+    return route if route in ROUTES else "autre"
+
+
+def _type(entete):
+    return entete.split(";", 1)[0].strip().lower()
+
+
+def _lire_json(corps):
+    try:
+        return json.loads(corps)
+    except ValueError as erreur:
+        raise ErreurRequete(400, f"JSON invalide : {erreur}")
+
+
+def _lire_lot(corps, type_contenu) -> pd.DataFrame:
+    """Lot de logements : liste d'objets JSON, objet de colonnes JSON, ou flux Arrow IPC."""
+    if type_contenu == ARROW:
+        import pyarrow as pa
+
+        try:
+            return pa.ipc.open_stream(corps).read_all().to_pandas()
+        except pa.ArrowInvalid as erreur:
+            raise ErreurRequete(400, f"Flux Arrow invalide : {erreur}")
+    if type_contenu != JSON:
+        raise ErreurRequete(415, f"Type de contenu non pris en charge : {type_contenu} (JSON ou Arrow IPC)")
+    donnees = _lire_json(corps)
+    if isinstance(donnees, dict):
+        donnees = donnees.get("logements", donnees)
+    try:
+        return pd.DataFrame(donnees)
+    except ValueError as erreur:
+        raise ErreurRequete(400, f"Lot invalide : {erreur}")
+
+
+def _ecrire_lot(df: pd.DataFrame, type_contenu):
+    if type_contenu == ARROW:
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tampon = io.BytesIO()
+        with pa.ipc.new_stream(tampon, table.schema) as flux:
+            flux.write_table(table)
+        return ARROW, tampon.getvalue()
+    # Réponse en colonnes : plus compacte qu'une liste d'objets
+    return JSON, json.dumps({nom: df[nom].tolist() for nom in df.columns}).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # En-têtes et corps partent en deux écritures : sans TCP_NODELAY, Nagle et l'ACK retardé
+    # du client ajoutent ~40 ms à chaque réponse d'une connexion keep-alive
+    disable_nagle_algorithm = True
+    service = None
+
+    def _repondre(self, methode):
+        try:
+            taille = taille_corps(self.headers, self.service.max_corps)
+        except ErreurRequete as erreur:
+            # Refus avant lecture : le corps n'est pas lu, la connexion est fermée
+            statut, type_contenu = erreur.statut, JSON
+            corps = json.dumps({"erreur": str(erreur)}, ensure_ascii=False).encode()
+            self.close_connection = True
+            self.service.metriques.observe(_route_metrique(self.path), statut, 0.0)
+        else:
+            statut, type_contenu, corps = self.service.handle(methode, self.path, self.headers, self.rfile.read(taille))
+        self.send_response(statut)
+        self.send_header("Content-Type", type_contenu)
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def do_GET(self):
+        self._repondre("GET")
+
+    def do_POST(self):
+        self._repondre("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Serveur(ThreadingHTTPServer):
+    # File d'attente de connexions plus longue que les 5 par défaut : des dizaines de clients
+    # qui se connectent en même temps ne doivent pas être refusés
+    request_queue_size = 128
+
+
+def serveur(service: ServiceDPE, hote="127.0.0.1", port=8000) -> ThreadingHTTPServer:
+    """Serveur HTTP/1.1 (keep-alive) pour `service` ; port 0 choisit un port libre."""
+    handler = type("Handler", (_Handler,), {"service": service})
+    httpd = _Serveur((hote, port), handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+class Reponse:
+    def __init__(self, statut, type_contenu, corps):
+        self.status_code, self.content_type, self.content = statut, type_contenu, corps
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ClientLocal:
+    """Client en processus : appelle `ServiceDPE.handle` directement, sans réseau."""
+
+    def __init__(self, service: ServiceDPE):
+        self.service = service
+
+    def get(self, chemin):
+        return Reponse(*self.service.handle("GET", chemin, {}, b""))
+
+    def post(self, chemin, json_=None, data=b"", content_type=JSON, accept=None, entetes=None):
+        if json_ is not None:
+            data = json.dumps(json_).encode()
+        entetes = {"Content-Type": content_type, **({"Accept": accept} if accept else {}), **(entetes or {})}
+        return Reponse(*self.service.handle("POST", chemin, entetes, data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP de notation DPE.")
+    parser.add_argument("--modele", type=Path, default=MODEL_PATH)
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    httpd = serveur(ServiceDPE(args.modele), args.hote, args.port)
+    print(f"Service DPE sur http://{args.hote}:{httpd.server_address[1]} (modèle {args.modele})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
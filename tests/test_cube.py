@@ -0,0 +1,52 @@
+"""
+Cube de la page Dataviz (dpe.cube) : les vues calculées par masque sur le cube et
+ses histogrammes creux valent les mêmes agrégations faites sur les DPE bruts filtrés.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import ademe_frame
+from dpe.classes import CLASSES
+from dpe.cube import (BORNES_SURFACE, COLONNES_GES, build_cube, crosstab, histogramme, histogrammes_path,
+                      load_histogrammes, masque_filtres, rollup, tranches)
+
+FILTRES = {"zone_clim": ["H1", "H3"], "type_bat": ["Appartement"], "periode": []}
+
+
+@pytest.fixture(scope="module")
+def donnees(tmp_path_factory):
+    dossier = tmp_path_factory.mktemp("cube")
+    brut = ademe_frame(5_000, noms_ademe=False)
+    brut.to_parquet(dossier / "dpe.parquet")
+    cube = build_cube(dossier / "dpe.parquet", dossier / "cube.parquet", batch_size=1_500)
+    histogrammes = load_histogrammes(histogrammes_path(dossier / "cube.parquet"))
+    filtres = brut["zone_clim"].isin(FILTRES["zone_clim"]) & brut["type_bat"].isin(FILTRES["type_bat"])
+    return cube, histogrammes, brut[filtres]
+
+
+def test_crosstab_et_rollup(donnees):
+    cube, _, brut = donnees
+    vue = masque_filtres(cube, FILTRES)
+    attendu = pd.crosstab(brut["departement"], brut["etiquette_dpe"]).reindex(columns=list(CLASSES), fill_value=0)
+    obtenu = crosstab(cube, "departement", vue)
+    pd.testing.assert_frame_equal(obtenu.sort_index(), attendu.sort_index(), check_names=False, check_dtype=False)
+
+    ges = rollup(cube, "periode", ("n", "conso_sum") + COLONNES_GES, vue).set_index("periode").sort_index()
+    assert ges["n"].to_dict() == brut["periode"].value_counts().to_dict()
+    np.testing.assert_allclose(ges["conso_sum"], brut.groupby("periode")["conso"].sum().sort_index(), rtol=1e-5)
+    assert ges[list(COLONNES_GES)].sum().sum() == brut["etiquette_ges"].isin(list(CLASSES)).sum()
+
+
+def test_histogrammes(donnees):
+    _, histogrammes, brut = donnees
+    vue = masque_filtres(histogrammes, FILTRES)
+    par_etiquette = histogramme(histogrammes, "surface", by="etiquette_dpe", masque=vue)
+    indices = tranches(brut["surface"], BORNES_SURFACE)
+    for lettre, effectifs in par_etiquette.iterrows():
+        attendu = np.bincount(indices[(brut["etiquette_dpe"] == lettre).to_numpy() & (indices >= 0)],
+                              minlength=len(BORNES_SURFACE))
+        np.testing.assert_array_equal(effectifs.to_numpy(), attendu)
+    total = histogramme(histogrammes, "surface", masque=vue)
+    np.testing.assert_array_equal(total.to_numpy(), par_etiquette.sum().to_numpy())
+    assert list(total.index) == list(BORNES_SURFACE)
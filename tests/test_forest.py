@@ -0,0 +1,49 @@
+"""
+Forêt compilée (dpe.forest) : mêmes prédictions que sklearn, et mémoire de travail
+d'un lot bornée indépendamment du nombre d'arbres.
+"""
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import ademe_frame
+from dpe.features import FeatureEncoder
+from dpe.forest import CompiledForest
+from dpe.model import FEATURES
+from dpe.schema import VOCABULAIRE
+
+
+@pytest.fixture(scope="module")
+def foret():
+    from sklearn.ensemble import RandomForestRegressor
+
+    df = ademe_frame(5_000, noms_ademe=False)
+    X = FeatureEncoder(FEATURES, VOCABULAIRE).encode_frame(df)
+    rf = RandomForestRegressor(n_estimators=200, max_depth=12, random_state=0, n_jobs=1)
+    rf.fit(X, df[["conso", "ges"]].to_numpy(dtype=np.float32))
+    return rf, CompiledForest.from_sklearn(rf)
+
+
+def _lot(lignes):
+    return FeatureEncoder(FEATURES, VOCABULAIRE).encode_frame(ademe_frame(lignes, seed=1, noms_ademe=False))
+
+
+def test_memes_predictions_que_sklearn(foret):
+    rf, compilee = foret
+    X = _lot(2_000)
+    np.testing.assert_allclose(compilee.predict(X), rf.predict(X), rtol=1e-9)
+
+
+def test_pic_memoire_par_lot(foret):
+    _, compilee = foret
+    X = _lot(50_000)
+    tracemalloc.start()
+    try:
+        compilee.predict(X)
+        _, pic = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # Quelques tableaux (n, sorties) et (n, 1) : loin des n x arbres x sorties x 8 octets (160 Mo)
+    # d'une moyenne sur toutes les feuilles à la fois
+    assert pic < 8 * len(X) * 2 * 8, f"pic de {pic / 2**20:.0f} Mo pour un lot de {len(X):,} lignes"
@@ -0,0 +1,178 @@
+"""
+Mise à jour incrémentale (dpe.refresh) : `init` suivi de `update` doit donner
+exactement le cube, ses histogrammes et les esquisses de quantiles d'une reconstruction complète
+(`build_cube`, `build_quantiles`) sur la base finale.
+
+La source est un export local au format ADEME (CSV), qui tient lieu de l'API :
+l'historique, chaque semaine et ses annulations sont des fichiers du dossier de test.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import ademe_frame
+from dpe.cube import CLES_HISTOGRAMMES, DIMENSIONS, MESURES, build_cube, histogrammes_path, load_cube, load_histogrammes
+from dpe.quantiles import Esquisses, build_quantiles
+from dpe.refresh import FichierSource, Registre, init, update
+from dpe.schema import COLONNES_ADEME
+
+LIGNES = 3_000
+# Plusieurs blocs : un DPE remplaçant peut précéder ou suivre celui qu'il remplace
+BLOC = 700
+
+
+def _ecrit(df, path):
+    """Écrit `df` (noms courts) comme un export ADEME."""
+    df.rename(columns={court: ademe for ademe, court in COLONNES_ADEME.items()}).to_csv(path, index=False)
+    return path
+
+
+def _historique(remplacements=0, seed=0):
+    """Base synthétique dont `remplacements` DPE remplacent d'autres DPE de la base."""
+    base = ademe_frame(LIGNES, seed=seed, noms_ademe=False)
+    idx = np.random.default_rng(seed).choice(LIGNES, size=2 * remplacements, replace=False)
+    base.loc[idx[:remplacements], "numero_dpe_remplace"] = base["numero_dpe"].to_numpy()[idx[remplacements:]]
+    return base
+
+
+def _semaine(base, numero, lignes=200):
+    """
+    Semaine `numero` : nouveaux DPE, dont certains remplacent un DPE de la base et un
+    autre un DPE de la même semaine, DPE de la base renvoyés corrigés, et annulations.
+    """
+    rng = np.random.default_rng(numero)
+    # DPE de la base encore en vigueur, et propres à la semaine : chaque semaine touche des DPE différents
+    remplaces = base["numero_dpe"].isin(base["numero_dpe_remplace"]).to_numpy()
+    candidats = np.flatnonzero(~remplaces & (np.arange(len(base)) % 4 == numero))
+    nouveaux = ademe_frame(lignes, seed=100 + numero, noms_ademe=False)
+    nouveaux["numero_dpe"] = f"S{numero}_" + nouveaux["numero_dpe"]
+    nouveaux["date_reception"] = f"2025-07-0{numero}"
+    idx = rng.choice(candidats, size=30, replace=False)
+    nouveaux.loc[nouveaux.index[:10], "numero_dpe_remplace"] = base["numero_dpe"].to_numpy()[idx[:10]]
+    nouveaux.loc[nouveaux.index[10], "numero_dpe_remplace"] = nouveaux["numero_dpe"].iloc[11]
+    corriges = base.iloc[idx[10:20]].copy()
+    corriges["conso"] = (corriges["conso"] * 0.8).round(1)
+    corriges["date_reception"] = f"2025-07-0{numero}"
+    annules = pd.DataFrame({"numero_dpe": base["numero_dpe"].to_numpy()[idx[20:]],
+                            "date_annulation": f"2025-07-0{numero}"})
+    return pd.concat([nouveaux, corriges], ignore_index=True), annules
+
+
+class Chantier:
+    """Dossier de test : historique initialisé, semaines appliquées, et reconstruction de référence."""
+
+    def __init__(self, dossier, base):
+        self.dossier = dossier
+        self.base = base
+        self.semaines = []
+        self.passages = 0
+        self.registre = Registre(dossier / "registre")
+        self.cube = dossier / "cube.parquet"
+        self.quantiles = dossier / "quantiles"
+        init(_ecrit(base, dossier / "historique.csv"), self.registre, self.cube, batch_size=BLOC,
+             quantiles_path=self.quantiles)
+
+    def update(self, semaine):
+        dpe, annules = semaine
+        self.passages += 1
+        source = FichierSource(_ecrit(dpe, self.dossier / f"semaine_{self.passages}.csv"),
+                               _ecrit(annules, self.dossier / f"annules_{self.passages}.csv"))
+        if not any(s is semaine for s in self.semaines):
+            self.semaines.append(semaine)
+        return update(source, self.registre, self.cube, self.quantiles)
+
+    def reference(self):
+        """Cube et esquisses reconstruits sur la base telle qu'elle serait publiée après les semaines appliquées."""
+        annules = set().union(*(set(a["numero_dpe"]) for _, a in self.semaines))
+        finale = pd.concat([self.base, *(dpe for dpe, _ in self.semaines)], ignore_index=True)
+        finale = finale.drop_duplicates("numero_dpe", keep="last")
+        finale = finale[~finale["numero_dpe"].isin(annules)]
+        source = _ecrit(finale, self.dossier / "reference.csv")
+        cube = build_cube(source, self.dossier / "reference_cube.parquet", batch_size=BLOC)
+        esquisses = build_quantiles(source, self.dossier / "reference_quantiles", batch_size=BLOC)
+        return cube, esquisses
+
+    def verifie(self):
+        cube, esquisses = self.reference()
+        _meme_cube(load_cube(self.cube), cube)
+        _memes_histogrammes(load_histogrammes(histogrammes_path(self.cube)),
+                            load_histogrammes(histogrammes_path(self.dossier / "reference_cube.parquet")))
+        np.testing.assert_array_equal(Esquisses.open(self.quantiles).effectifs, esquisses.effectifs)
+
+
+def _meme_cube(a, b):
+    cle = list(DIMENSIONS)
+    a = a.astype({d: "string" for d in cle}).set_index(cle).sort_index()[list(MESURES)]
+    b = b.astype({d: "string" for d in cle}).set_index(cle).sort_index()[list(MESURES)]
+    assert a.index.equals(b.index)
+    np.testing.assert_allclose(a.to_numpy(np.float64), b.to_numpy(np.float64), rtol=1e-4)
+
+
+def _memes_histogrammes(a, b):
+    cle = list(CLES_HISTOGRAMMES)
+    a = a.astype({c: "string" for c in cle if c != "tranche"}).set_index(cle).sort_index()["n"]
+    b = b.astype({c: "string" for c in cle if c != "tranche"}).set_index(cle).sort_index()["n"]
+    assert a.index.equals(b.index)
+    np.testing.assert_array_equal(a.to_numpy(), b.to_numpy())
+
+
+@pytest.fixture
+def chantier(tmp_path):
+    return lambda base: Chantier(tmp_path, base)
+
+
+def test_remplacement_dans_historique(chantier):
+    c = chantier(_historique(remplacements=40))
+    assert int(load_cube(c.cube)["n"].sum()) == LIGNES - 40
+    c.verifie()
+    c.update(_semaine(c.base, 1))
+    c.verifie()
+
+
+def test_remplacement_et_annulation_dans_delta(chantier):
+    c = chantier(_historique())
+    stats = c.update(_semaine(c.base, 1))
+    # Remplacés (10 de la base, 1 de la semaine) et annulés ; contributions retirées :
+    # 10 remplacés, 10 annulés et 10 renvoyés corrigés
+    assert stats["annules_ou_remplaces"] == 21
+    assert stats["retires"] == 30
+    c.verifie()
+    c.update(_semaine(c.base, 2))
+    c.verifie()
+
+
+def test_rejouer_la_semaine(chantier):
+    c = chantier(_historique(remplacements=40))
+    watermark = c.registre.etat["watermark"]
+    semaine = _semaine(c.base, 1)
+    c.update(semaine)
+    # Relance du même passage (filigrane à jour), puis semaine rejouée en entier
+    c.update(semaine)
+    c.registre.etat["watermark"] = watermark
+    c.update(semaine)
+    c.verifie()
+
+
+def test_renvoi_d_un_dpe_retire(chantier, monkeypatch):
+    import dpe.refresh
+
+    c = chantier(_historique(remplacements=40))
+    recus, annules = semaine = _semaine(c.base, 1)
+    c.update(semaine)
+    # Semaine 2 : les DPE remplacés ou annulés en semaine 1, et ceux remplacés dans l'historique, renvoyés
+    retires = pd.concat([recus["numero_dpe_remplace"], c.base["numero_dpe_remplace"], annules["numero_dpe"]]).dropna()
+    renvoyes = c.base[c.base["numero_dpe"].isin(retires)].copy()
+    renvoyes["date_reception"] = "2025-07-02"
+    stats = c.update((renvoyes, annules.iloc[:0]))
+    assert stats["deja_retires"] == len(renvoyes) == 60
+    assert stats["ajoutes"] == stats["retires"] == 0
+    c.verifie()
+    # La compaction garde les tombes ; `update` ne compacte plus lui-même, il le signale
+    c.registre.compact()
+    monkeypatch.setattr(dpe.refresh, "MAX_SEGMENTS", 1)
+    renvoyes["date_reception"] = "2025-07-03"
+    with pytest.warns(UserWarning, match="compact"):
+        stats = c.update((renvoyes, annules.iloc[:0]))
+    assert stats["deja_retires"] == len(renvoyes)
+    assert len(c.registre.etat["segments"]) == 2
+    c.verifie()
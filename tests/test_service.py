@@ -0,0 +1,90 @@
+"""
+Service de notation (dpe.service) : requêtes invalides ou trop grosses, par le
+client en processus (ClientLocal) et par le serveur HTTP réel.
+"""
+import http.client
+import json
+
+import pytest
+
+from benchmarks.synthetic import ademe_frame, formulaire, modele_synthetique
+from dpe.service import ClientLocal, ServiceDPE, serveur
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    dossier = tmp_path_factory.mktemp("modele") / "modele_dpe"
+    modele_synthetique(2_000, n_estimators=5, max_depth=6).export(dossier)
+    return ServiceDPE(dossier, max_corps=2**20, max_lignes=500)
+
+
+@pytest.fixture
+def client(service):
+    return ClientLocal(service)
+
+
+def _lot(n):
+    return ademe_frame(n, seed=3, noms_ademe=False).to_dict(orient="list")
+
+
+def test_requetes_valides(client):
+    assert client.get("/healthz").status_code == 200
+    reponse = client.post("/v1/predict", json_=formulaire())
+    assert reponse.status_code == 200 and reponse.json()["etiquette"] in "ABCDEFG"
+    reponse = client.post("/v1/predict/batch", json_=_lot(300))
+    assert reponse.status_code == 200 and len(reponse.json()["etiquette"]) == 300
+
+
+def test_lot_predit_par_tranches(client, service, monkeypatch):
+    import dpe.service
+
+    lot = _lot(300)
+    entier = client.post("/v1/predict/batch", json_=lot).json()
+    monkeypatch.setattr(dpe.service, "LOT_PREDICTION", 64)
+    assert client.post("/v1/predict/batch", json_=lot).json() == entier
+
+
+@pytest.mark.parametrize("valeur", ["abc", "-5", "12.5", ""])
+def test_content_length_invalide(client, valeur):
+    reponse = client.post("/v1/predict", json_=formulaire(), entetes={"Content-Length": valeur})
+    assert reponse.status_code == 400
+    assert "Content-Length" in reponse.json()["erreur"]
+
+
+def test_corps_trop_gros(client, service):
+    assert client.post("/v1/predict/batch", data=b" " * (service.max_corps + 1)).status_code == 413
+    reponse = client.post("/v1/predict", json_=formulaire(), entetes={"Content-Length": str(service.max_corps + 1)})
+    assert reponse.status_code == 413
+
+
+def test_lot_trop_grand(client, service):
+    # Quelques colonnes suffisent : le nombre de lignes est contrôlé en premier
+    reponse = client.post("/v1/predict/batch", json_={"surface": [50.0] * (service.max_lignes + 1)})
+    assert reponse.status_code == 413
+
+
+@pytest.mark.parametrize("corps, statut", [(b"{pas du json", 400), (b"[1, 2]", 400), (b"{}", 400)])
+def test_corps_invalide(client, corps, statut):
+    assert client.post("/v1/predict", data=corps).status_code == statut
+
+
+@pytest.mark.parametrize("valeur, statut", [("abc", 400), ("-5", 400), (str(10**9), 413)])
+def test_content_length_serveur_http(service, valeur, statut):
+    # Refus par le gestionnaire HTTP avant lecture du corps : réponse puis fermeture de la connexion
+    import threading
+
+    httpd = serveur(service, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        connexion = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=10)
+        connexion.putrequest("POST", "/v1/predict")
+        connexion.putheader("Content-Type", "application/json")
+        connexion.putheader("Content-Length", valeur)
+        connexion.endheaders()
+        reponse = connexion.getresponse()
+        assert reponse.status == statut
+        assert "erreur" in json.loads(reponse.read())
+        connexion.close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()